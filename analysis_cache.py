@@ -0,0 +1,244 @@
+"""
+analyze_sentence() 결과 캐시
+
+- 1단계: 프로세스 내 LRU (OrderedDict)
+- 2단계: 디스크 SQLite 저장소 (서버 재시작 후에도 유지)
+- 키: 정규화된 문장 + 설명 난이도 + 모델 + temperature + (스키마/프롬프트 해시)
+  → 프롬프트나 스키마가 바뀌면 예전 항목은 자연스럽게 무효화됨
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_sentence(sentence: str) -> str:
+    """앞뒤 공백 제거 + 연속 공백을 하나로 합친 문장 (캐시 키 용도)."""
+    return " ".join((sentence or "").split())
+
+
+def prompt_fingerprint(schema: dict, *prompt_parts: str) -> str:
+    """스키마 dict와 프롬프트 텍스트를 합쳐 짧은 해시로 만든다."""
+    h = hashlib.sha256()
+    h.update(json.dumps(schema, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    for part in prompt_parts:
+        h.update(b"\x00")
+        h.update((part or "").encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def make_cache_key(sentence: str, explanation_level: str, model: str,
+                   temperature: float, fingerprint: str) -> str:
+    raw = json.dumps(
+        [normalize_sentence(sentence), explanation_level, model, float(temperature), fingerprint],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def make_cache_scope(explanation_level: str, model: str, temperature: float, fingerprint: str) -> str:
+    """문장을 뺀 나머지 키 구성요소 (near-duplicate 색인에서 같은 조건끼리만 비교할 때 사용)."""
+    raw = json.dumps([explanation_level, model, float(temperature), fingerprint])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class AnalysisCache:
+    """
+    2단 캐시 (메모리 LRU -> SQLite).
+    여러 Streamlit 세션(스레드)에서 동시에 쓰므로 내부에서 lock으로 보호한다.
+    메모리에도 JSON 문자열로 들고 있다가 get()마다 새 dict로 풀어서 돌려준다
+    (한 호출자가 결과를 고쳐도 캐시나 다른 세션에 번지지 않음).
+    디스크 정리(TTL/개수 초과)는 evict_every번 저장마다, 마지막 사용 시각 갱신은
+    touch_batch개씩 모아서 한 번에 쓴다.
+    """
+
+    def __init__(self, db_path: str = "", max_memory_items: int = 512,
+                 max_disk_items: int = 50000, ttl_seconds: float = 7 * 24 * 3600,
+                 evict_every: int = 64, touch_batch: int = 64, touch_interval: float = 30.0):
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.ttl_seconds = ttl_seconds
+        self.evict_every = max(1, evict_every)
+        self.touch_batch = max(1, touch_batch)
+        self.touch_interval = touch_interval
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (created_at, value_json)
+        self._touched = {}            # key -> 디스크에 아직 안 쓴 last_access
+        self._last_flush = time.time()
+        self._writes_since_evict = 0
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "expired": 0,
+        }
+
+        self._db = None
+        if db_path:
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS analysis_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_access "
+                "ON analysis_cache(last_access)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_analysis_cache_created_at "
+                "ON analysis_cache(created_at)"
+            )
+            self._db.commit()
+
+    # ---------------------------
+    # 조회 / 저장
+    # ---------------------------
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                created_at, value = item
+                if self._is_expired(created_at, now):
+                    del self._memory[key]
+                    self._counters["expired"] += 1
+                else:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    self._touch(key, now)
+                    return json.loads(value)
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM analysis_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value_json, created_at = row
+                    if self._is_expired(created_at, now):
+                        self._db.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                        self._db.commit()
+                        self._counters["expired"] += 1
+                    else:
+                        self._put_memory(key, created_at, value_json)
+                        self._counters["disk_hits"] += 1
+                        self._touch(key, now)
+                        return json.loads(value_json)
+
+            self._counters["misses"] += 1
+            return None
+
+    def set(self, key: str, value: dict):
+        now = time.time()
+        value_json = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._put_memory(key, now, value_json)
+            self._counters["sets"] += 1
+            if self._db is not None:
+                self._touched.pop(key, None)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO analysis_cache (key, value, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, value_json, now, now),
+                )
+                self._writes_since_evict += 1
+                if self._writes_since_evict >= self.evict_every:
+                    self._evict_disk(now)
+                self._db.commit()
+
+    def flush(self):
+        """모아 둔 마지막 사용 시각 갱신을 디스크에 씀 (종료 전/모니터링용)."""
+        with self._lock:
+            if self._db is not None and self._touched:
+                self._flush_touched()
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM analysis_cache")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_items"] = len(self._memory)
+            if self._db is not None:
+                stats["disk_items"] = self._db.execute(
+                    "SELECT COUNT(*) FROM analysis_cache"
+                ).fetchone()[0]
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = (
+            (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        )
+        return stats
+
+    # ---------------------------
+    # 내부 헬퍼 (lock을 잡은 상태에서 호출)
+    # ---------------------------
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and (now - created_at) > self.ttl_seconds
+
+    def _put_memory(self, key: str, created_at: float, value_json: str):
+        self._memory[key] = (created_at, value_json)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _touch(self, key: str, now: float):
+        """디스크 항목의 last_access 갱신을 모아 둠 (읽을 때마다 UPDATE + commit 하지 않도록)."""
+        if self._db is None:
+            return
+        self._touched[key] = now
+        if len(self._touched) >= self.touch_batch or now - self._last_flush >= self.touch_interval:
+            self._flush_touched()
+            self._db.commit()
+
+    def _flush_touched(self):
+        self._db.executemany(
+            "UPDATE analysis_cache SET last_access = ? WHERE key = ?",
+            [(at, key) for key, at in self._touched.items()],
+        )
+        self._touched.clear()
+        self._last_flush = time.time()
+
+    def _evict_disk(self, now: float):
+        # LRU 순서가 맞도록 모아 둔 사용 시각부터 반영
+        self._writes_since_evict = 0
+        if self._touched:
+            self._flush_touched()
+        if self.ttl_seconds:
+            cur = self._db.execute(
+                "DELETE FROM analysis_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+            self._counters["expired"] += max(cur.rowcount, 0)
+
+        count = self._db.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+        overflow = count - self.max_disk_items
+        if overflow > 0:
+            # 가장 오래 안 쓰인 항목부터 삭제 (last_access 인덱스 사용, TTL 삭제는 created_at 인덱스)
+            self._db.execute(
+                "DELETE FROM analysis_cache WHERE key IN ("
+                "SELECT key FROM analysis_cache ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            )
+            self._counters["evictions"] += overflow
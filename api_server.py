@@ -0,0 +1,505 @@
+"""
+헤드리스 HTTP API (asyncio, Streamlit 없이 실행)
+
+사용 예:
+    python api_server.py --host 0.0.0.0 --port 8080
+    python api_server.py --port 8080 --reuse-port     # 같은 포트로 프로세스 여러 개 (코어 수만큼)
+
+LMS 연동 / 모바일 앱이 Streamlit 화면을 거치지 않고 분석, 추가 질문, 리포트 기능을 쓰기 위한 서버.
+표준 라이브러리 asyncio 위에 HTTP/1.1(keep-alive)만 구현했고, OpenAI 호출은 AsyncOpenAI로 보내
+이벤트 루프 하나에서 많은 요청을 동시에 기다린다 (세션마다 스레드를 두는 Streamlit과 달리).
+요청마다 독립이라(세션 상태 없음) 로드 밸런서 뒤에 프로세스/서버를 늘리는 것으로 수평 확장한다.
+
+- POST /v1/analyze   {"sentence", "level": "초급|중급|고급", "use_cache": true, "force_ai": false}
+    → {"result", "source": "precheck|ai", "diff": {"original_html", "corrected_html"}}
+- POST /v1/followup  {"question", "sentence", "corrected", "level", "use_cache": true}
+    → {"answer"}
+  (analyze / followup 공통, 선택) "learner_id", "phone4", "class_id": OpenAI 호출 순서를 학습자/반별로
+  공정하게 나누는 단위 (없으면 클라이언트 주소) / "priority": "batch"면 다른 요청보다 뒤로
+  → 한 학습자가 기다리는 요청이 너무 많거나 차례가 오래 안 오면 429 (+ Retry-After)
+- POST /v1/report    {"session_id", "learner_id", "phone4", "level", "sentence", "result",
+                      "score", "details", "followup_qa"}
+    → 202 {"queued", "session_id"} (n8n 전송은 리포트 아웃박스가 백그라운드에서)
+- GET  /healthz, GET /metrics (Prometheus 텍스트)
+
+본문에 "stream": true 를 넣거나 Accept: text/event-stream 이면 server-sent events로 응답
+  - analyze : field {"key", "value"} / item {"key", "index", "value"} / escalate {"reason"}
+              이벤트 뒤 done (JSON 응답과 같은 내용)
+  - followup: delta {"text"} 이벤트 뒤 done {"answer"}
+  - 실패하면 error {"error", "status"} 이벤트로 끝남
+동시에 처리 중인 요청이 API_MAX_INFLIGHT를 넘으면 바로 503 (+ Retry-After) → 다른 서버로 보내도록.
+요청 1건은 API_REQUEST_TIMEOUT초 안에 끝나지 않으면 504 (스트리밍이면 error 이벤트).
+"""
+import argparse
+import asyncio
+import json
+import signal
+import sys
+import time
+import traceback
+import uuid
+
+import coach_core
+from diff_engine import highlight_diff
+from metrics import REGISTRY
+from precheck import precheck_sentence
+from learner_store import make_learner_key
+from resilience import CircuitOpenError
+from scheduler import PRIORITY_BATCH, Requester, SchedulerBusy
+
+MAX_BODY_BYTES = 64 * 1024
+MAX_TEXT_CHARS = 4000
+KEEPALIVE_SECONDS = 15.0
+LEVEL_LABELS = ("초급", "중급", "고급")
+REASONS = {
+    200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error",
+    502: "Bad Gateway", 503: "Service Unavailable", 504: "Gateway Timeout",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str, headers: dict = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def as_http_error(exc: Exception) -> HttpError:
+    """처리 중 난 예외 → 응답 상태 코드."""
+    if isinstance(exc, HttpError):
+        return exc
+    if isinstance(exc, asyncio.TimeoutError):
+        return HttpError(504, "제한 시간 안에 처리하지 못했습니다.")
+    if isinstance(exc, SchedulerBusy):
+        return HttpError(429, str(exc), {"Retry-After": str(max(1, int(exc.retry_in)))})
+    if isinstance(exc, CircuitOpenError):
+        return HttpError(503, str(exc), {"Retry-After": str(max(1, int(exc.retry_in)))})
+    if isinstance(exc, ValueError):
+        # 모델 응답을 구간별 복구로도 살리지 못함
+        return HttpError(502, f"AI 응답을 처리하지 못했습니다: {exc}")
+    traceback.print_exc(file=sys.stderr)
+    return HttpError(502, f"AI 서버 호출에 실패했습니다. ({type(exc).__name__})")
+
+
+class Request:
+    __slots__ = ("method", "path", "version", "headers", "body")
+
+    def __init__(self, method: str, path: str, version: str, headers: dict, body: bytes):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def json(self) -> dict:
+        try:
+            data = json.loads(self.body or b"{}")
+        except ValueError:
+            raise HttpError(400, "본문이 올바른 JSON이 아닙니다.")
+        if not isinstance(data, dict):
+            raise HttpError(400, "본문은 JSON object여야 합니다.")
+        return data
+
+    def wants_stream(self, body: dict) -> bool:
+        return bool(body.get("stream")) or "text/event-stream" in self.headers.get("accept", "")
+
+
+async def read_request(reader: asyncio.StreamReader):
+    """요청 1건을 읽음. 연결이 정상적으로 끝났으면 None."""
+    try:
+        line = await reader.readline()
+        if not line:
+            return None
+        parts = line.decode("latin-1").split()
+        if len(parts) != 3:
+            raise HttpError(400, "잘못된 요청 줄입니다.")
+        method, target, version = parts
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+            if len(headers) > 100:
+                raise HttpError(400, "헤더가 너무 많습니다.")
+    except (ValueError, asyncio.LimitOverrunError):
+        raise HttpError(400, "요청 줄/헤더가 너무 깁니다.")
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HttpError(411, "Content-Length가 있는 본문만 받습니다.")
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HttpError(400, "Content-Length가 올바르지 않습니다.")
+    if length < 0 or length > MAX_BODY_BYTES:
+        raise HttpError(413, f"본문은 {MAX_BODY_BYTES}바이트까지 받습니다.")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method.upper(), target.split("?", 1)[0], version.upper(), headers, body)
+
+
+def _head(status: int, headers: dict) -> bytes:
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def send_body(writer: asyncio.StreamWriter, status: int, body: bytes, content_type: str,
+                    keep_alive: bool, headers: dict = None):
+    head = {
+        "Content-Type": content_type,
+        "Content-Length": str(len(body)),
+        "Connection": "keep-alive" if keep_alive else "close",
+        **(headers or {}),
+    }
+    writer.write(_head(status, head) + body)
+    await writer.drain()
+
+
+async def send_json(writer: asyncio.StreamWriter, status: int, obj, keep_alive: bool,
+                    headers: dict = None):
+    body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    await send_body(writer, status, body, "application/json; charset=utf-8", keep_alive, headers)
+
+
+class EventStream:
+    """server-sent events 응답 (chunked 전송이라 끝난 뒤에도 연결을 재사용할 수 있음)."""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+
+    async def start(self, keep_alive: bool):
+        self.writer.write(_head(200, {
+            "Content-Type": "text/event-stream; charset=utf-8",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # 앞단 nginx가 모아서 보내지 않도록
+            "Transfer-Encoding": "chunked",
+            "Connection": "keep-alive" if keep_alive else "close",
+        }))
+        await self.writer.drain()
+
+    async def send(self, event: str, data):
+        payload = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+        self.writer.write(f"{len(payload):x}\r\n".encode("latin-1") + payload + b"\r\n")
+        await self.writer.drain()
+
+    async def close(self):
+        self.writer.write(b"0\r\n\r\n")
+        await self.writer.drain()
+
+
+def _text(body: dict, key: str, required: bool = True) -> str:
+    value = body.get(key, "")
+    if not isinstance(value, str):
+        raise HttpError(400, f"{key}: 문자열이어야 합니다.")
+    value = value.strip()
+    if required and not value:
+        raise HttpError(400, f"{key}: 값이 필요합니다.")
+    if len(value) > MAX_TEXT_CHARS:
+        raise HttpError(400, f"{key}: {MAX_TEXT_CHARS}자까지 받습니다.")
+    return value
+
+
+def _level(body: dict) -> str:
+    level = body.get("level") or "중급"
+    if level not in LEVEL_LABELS:
+        raise HttpError(400, f"level: {', '.join(LEVEL_LABELS)} 중 하나여야 합니다.")
+    return level
+
+
+def _requester(body: dict) -> Requester:
+    """
+    입장 스케줄러에 알릴 요청자.
+    학습자 id가 없으면 익명 흐름 하나로 묶음 (프록시 뒤에서는 접속 주소가 모두 같으므로 주소로 나누지 않음).
+    """
+    learner_id = _text(body, "learner_id", required=False)
+    learner = make_learner_key(learner_id, _text(body, "phone4", required=False)) if learner_id else ""
+    priority = body.get("priority")
+    if priority not in (None, "batch"):
+        raise HttpError(400, 'priority: "batch"만 지정할 수 있습니다.')
+    return Requester(learner, _text(body, "class_id", required=False),
+                     priority=PRIORITY_BATCH if priority == "batch" else None)
+
+
+def analysis_body(sentence: str, result: dict, source: str) -> dict:
+    original_html, corrected_html = highlight_diff(sentence, result["corrected_sentence"])
+    return {
+        "result": result,
+        "source": source,
+        "diff": {"original_html": original_html, "corrected_html": corrected_html},
+    }
+
+
+class ApiServer:
+    def __init__(self, max_inflight: int = 256, request_timeout: float = 90.0):
+        self.max_inflight = max_inflight
+        self.request_timeout = request_timeout
+        self.inflight = 0
+        self.routes = {
+            ("POST", "/v1/analyze"): self.analyze,
+            ("POST", "/v1/followup"): self.followup,
+            ("POST", "/v1/report"): self.report,
+            ("GET", "/healthz"): self.health,
+            ("GET", "/metrics"): self.metrics,
+        }
+
+    # ---------------------------
+    # 연결 / 요청 처리
+    # ---------------------------
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), KEEPALIVE_SECONDS)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                    break
+                except HttpError as e:
+                    await send_json(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if request is None or not await self.dispatch(request, writer):
+                    break
+        except ConnectionError:
+            pass  # 클라이언트가 먼저 끊음
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def dispatch(self, request: Request, writer: asyncio.StreamWriter) -> bool:
+        """요청 1건 처리. 연결을 계속 쓸 수 있으면 True."""
+        started = time.perf_counter()
+        handler = self.routes.get((request.method, request.path))
+        route = request.path if handler is not None else "unknown"
+        status = 500
+        try:
+            if handler is None:
+                known_path = any(path == request.path for _, path in self.routes)
+                raise HttpError(405 if known_path else 404, "지원하지 않는 경로/메서드입니다.")
+            if request.method == "POST" and self.inflight >= self.max_inflight:
+                raise HttpError(503, "요청이 많아 잠시 후 다시 시도해 주세요.", {"Retry-After": "1"})
+            self.inflight += 1
+            try:
+                status = await handler(request, writer)
+            finally:
+                self.inflight -= 1
+        except HttpError as e:
+            status = e.status
+            await send_json(writer, e.status, {"error": str(e)}, request.keep_alive, e.headers)
+        finally:
+            REGISTRY.inc("api_requests_total", route=route, status=str(status))
+            REGISTRY.observe("api_request_seconds", time.perf_counter() - started, route=route)
+        return request.keep_alive
+
+    async def respond(self, request: Request, writer: asyncio.StreamWriter, stream: bool,
+                      result_fn, events_fn) -> int:
+        """
+        JSON 요청이면 await result_fn() 결과를 한 번에,
+        스트리밍 요청이면 events_fn()이 내놓는 (이벤트 이름, 데이터)를 SSE로 보낸다.
+        """
+        if not stream:
+            try:
+                body = await asyncio.wait_for(result_fn(), self.request_timeout)
+            except Exception as e:
+                raise as_http_error(e)
+            await send_json(writer, 200, body, request.keep_alive)
+            return 200
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.request_timeout
+        events = events_fn()
+        sse = EventStream(writer)
+        await sse.start(request.keep_alive)
+        status = 200
+        try:
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(events.__anext__(), deadline - loop.time())
+                except StopAsyncIteration:
+                    break
+                await sse.send(event, data)
+        except ConnectionError:
+            raise  # 클라이언트가 끊음 → finally에서 업스트림 스트림도 닫힘
+        except Exception as e:
+            error = as_http_error(e)
+            status = error.status
+            await sse.send("error", {"error": str(error), "status": status})
+        finally:
+            await events.aclose()
+        await sse.close()
+        return status
+
+    # ---------------------------
+    # 엔드포인트
+    # ---------------------------
+    async def analyze(self, request: Request, writer: asyncio.StreamWriter) -> int:
+        body = request.json()
+        sentence = _text(body, "sentence")
+        level = _level(body)
+        use_cache = bool(body.get("use_cache", True))
+        requester = _requester(body)
+
+        # app.py와 같이: 로컬 규칙 검사가 "오류 없음"을 확신하면 모델을 부르지 않음
+        pre = precheck_sentence(sentence)
+        if (
+            not body.get("force_ai")
+            and pre.no_errors
+            and pre.confidence >= coach_core.SETTINGS.get("PRECHECK_SKIP_CONFIDENCE", 1.01)
+        ):
+            quick = analysis_body(sentence, pre.to_result(), "precheck")
+
+            async def quick_result():
+                return quick
+
+            async def quick_events():
+                yield "done", quick
+
+            return await self.respond(request, writer, request.wants_stream(body),
+                                      quick_result, quick_events)
+
+        async def result():
+            return analysis_body(
+                sentence,
+                await coach_core.analyze_sentence_async(sentence, level, use_cache, requester),
+                "ai",
+            )
+
+        async def events():
+            async for event in coach_core.analyze_sentence_astream(sentence, level, use_cache,
+                                                                   requester):
+                if event[0] == "field":
+                    yield "field", {"key": event[1], "value": event[2]}
+                elif event[0] == "item":
+                    yield "item", {"key": event[1], "index": event[2], "value": event[3]}
+                elif event[0] == "escalate":
+                    yield "escalate", {"reason": event[1]}
+                elif event[0] == "done":
+                    yield "done", analysis_body(sentence, event[1], "ai")
+
+        return await self.respond(request, writer, request.wants_stream(body), result, events)
+
+    async def followup(self, request: Request, writer: asyncio.StreamWriter) -> int:
+        body = request.json()
+        question = _text(body, "question")
+        sentence = _text(body, "sentence")
+        corrected = _text(body, "corrected")
+        level = _level(body)
+        use_cache = bool(body.get("use_cache", True))
+        requester = _requester(body)
+
+        async def result():
+            return {"answer": await coach_core.answer_followup_async(
+                question, sentence, corrected, level, use_cache, requester
+            )}
+
+        async def events():
+            parts = []
+            async for piece in coach_core.answer_followup_astream(
+                question, sentence, corrected, level, use_cache, requester
+            ):
+                parts.append(piece)
+                yield "delta", {"text": piece}
+            yield "done", {"answer": "".join(parts).strip()}
+
+        return await self.respond(request, writer, request.wants_stream(body), result, events)
+
+    async def report(self, request: Request, writer: asyncio.StreamWriter) -> int:
+        body = request.json()
+        result = body.get("result")
+        if not isinstance(result, dict) or not isinstance(result.get("corrected_sentence"), str):
+            raise HttpError(400, "result: 분석 결과(object)가 필요합니다.")
+        if not coach_core.SETTINGS.get("N8N_WEBHOOK_URL"):
+            raise HttpError(503, "N8N_WEBHOOK_URL이 설정되지 않아 전송할 수 없습니다.")
+        session_id = _text(body, "session_id", required=False) or uuid.uuid4().hex
+        details = body.get("details")
+        followup_qa = body.get("followup_qa")
+        payload = coach_core.build_report_payload(
+            session_id,
+            _text(body, "learner_id", required=False),
+            _text(body, "phone4", required=False),
+            _level(body),
+            _text(body, "sentence"),
+            result,
+            score=body.get("score") if isinstance(body.get("score"), int) else None,
+            details=details if isinstance(details, list) else None,
+            followup_qa=followup_qa if isinstance(followup_qa, list) else None,
+        )
+        # 웹훅 응답을 기다리지 않고 로컬 아웃박스에 저장 → 백그라운드에서 전송/재시도
+        queued = coach_core.get_report_outbox().enqueue(payload)
+        await send_json(writer, 202, {"queued": queued, "session_id": session_id}, request.keep_alive)
+        return 202
+
+    async def health(self, request: Request, writer: asyncio.StreamWriter) -> int:
+        await send_json(writer, 200, {
+            "status": "ok",
+            "inflight": self.inflight,
+            "breaker": coach_core.resilience_stats()["breaker_state"],
+            "queued": coach_core.scheduler_stats()["queued"],
+        }, request.keep_alive)
+        return 200
+
+    async def metrics(self, request: Request, writer: asyncio.StreamWriter) -> int:
+        await send_body(writer, 200, REGISTRY.to_prometheus().encode("utf-8"),
+                        "text/plain; version=0.0.4; charset=utf-8", request.keep_alive)
+        return 200
+
+
+REGISTRY.describe("api_requests_total", "HTTP API requests by route and status")
+REGISTRY.describe("api_request_seconds", "HTTP API request latency including streaming (seconds)")
+
+
+async def serve(host: str, port: int, reuse_port: bool = False):
+    settings = coach_core.SETTINGS
+    api = ApiServer(
+        max_inflight=settings.get("API_MAX_INFLIGHT", 256),
+        request_timeout=settings.get("API_REQUEST_TIMEOUT", 90.0),
+    )
+    server = await asyncio.start_server(
+        api.handle_connection, host, port, reuse_port=reuse_port or None, backlog=1024
+    )
+    print(f"AI Grammar Coach API: http://{host}:{port}", file=sys.stderr)
+
+    # SIGTERM(배포/축소)을 받으면 새 연결을 받지 않고, 처리 중인 요청이 끝날 때까지 기다림
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+    async with server:
+        await stop.wait()
+        server.close()
+        deadline = loop.time() + api.request_timeout
+        while api.inflight and loop.time() < deadline:
+            await asyncio.sleep(0.1)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="AI Grammar Coach HTTP API")
+    parser.add_argument("--host", default="127.0.0.1", help="바인드 주소")
+    parser.add_argument("--port", type=int, default=8080, help="포트")
+    parser.add_argument("--reuse-port", action="store_true",
+                        help="SO_REUSEPORT: 같은 포트로 여러 프로세스를 띄워 코어를 나눠 씀")
+    args = parser.parse_args(argv)
+
+    settings = coach_core.load_settings()
+    if not settings["OPENAI_API_KEY"]:
+        print("OPENAI_API_KEY가 설정되지 않았습니다. (.env 또는 환경변수)", file=sys.stderr)
+        return 2
+    coach_core.configure(settings)
+    asyncio.run(serve(args.host, args.port, args.reuse_port))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,26 @@
 
-import os, json, time, uuid, requests, difflib, html
+import functools, os, time, uuid
 import streamlit as st
+
+# rerun 1회(스크립트 전체 실행)에 걸린 시간 측정 시작
+_rerun_started = time.perf_counter()
+
+import coach_core
+from diff_engine import DIFF_CSS, diff_panel_html
+from essay import analyze_essay
+from learner_store import make_learner_key
+from metrics import REGISTRY, LatencyWindow
+from precheck import precheck_sentence
+from resilience import CircuitOpenError
+from scheduler import PRIORITY_BATCH, Requester
+from session_store import GradedAnswer, QAItem, SessionRecord
+from coach_core import (
+    analyze_sentence,
+    analyze_sentence_parallel,
+    analyze_sentence_stream,
+    answer_followup_stream,
+)
+
 os.environ["N8N_WEBHOOK_URL"] = "https://nyseo2735.app.n8n.cloud/webhook/grammar-report"
 
 # 최대 추가 질문 개수
@@ -9,39 +29,27 @@ MAX_FOLLOWUP = 5
 # ---------------------------
 # 1) 안전한 키 로드: st.secrets -> .env -> os.environ
 # ---------------------------
-OPENAI_API_KEY = None
-try:
-    OPENAI_API_KEY = st.secrets.get("OPENAI_API_KEY", None)
-except Exception:
-    OPENAI_API_KEY = None
+@st.cache_resource
+def get_settings() -> dict:
+    """secrets/.env 읽기는 프로세스당 한 번만 (rerun마다 반복하지 않음)."""
+    settings = coach_core.load_settings(st.secrets)
+    coach_core.configure(settings)
+    # METRICS_PORT / METRICS_JSONL_PATH가 설정돼 있으면 지표 내보내기 스레드 시작
+    coach_core.start_metrics_exporter()
+    return settings
+
+
+@st.cache_resource
+def get_rerun_timer() -> LatencyWindow:
+    """모든 세션이 공유하는 rerun 소요시간 기록."""
+    return LatencyWindow(maxlen=1000)
 
-if not OPENAI_API_KEY:
-    try:
-        from dotenv import load_dotenv, find_dotenv
-        load_dotenv(find_dotenv())
-    except Exception:
-        pass
-    OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
-
-N8N_WEBHOOK_URL = None
-try:
-    N8N_WEBHOOK_URL = st.secrets.get("N8N_WEBHOOK_URL", None)
-except Exception:
-    N8N_WEBHOOK_URL = None
-if not N8N_WEBHOOK_URL:
-    N8N_WEBHOOK_URL = os.environ.get("N8N_WEBHOOK_URL", "")
-
-# N8N_WEBHOOK_URL 로드 직후 보정
-if N8N_WEBHOOK_URL:
-    N8N_WEBHOOK_URL = N8N_WEBHOOK_URL.strip()
-
-OPENAI_MODEL = None
-try:
-    OPENAI_MODEL = st.secrets.get("OPENAI_MODEL", None)
-except Exception:
-    OPENAI_MODEL = None
-if not OPENAI_MODEL:
-    OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4.1-mini")  # 필요 시 secrets에서 바꿔주세요
+
+SETTINGS = get_settings()
+
+OPENAI_API_KEY = SETTINGS["OPENAI_API_KEY"]
+N8N_WEBHOOK_URL = SETTINGS["N8N_WEBHOOK_URL"]
+OPENAI_MODEL = SETTINGS["OPENAI_MODEL"]  # 필요 시 secrets에서 바꿔주세요
 
 if not OPENAI_API_KEY:
     st.error("OPENAI_API_KEY가 설정되지 않았습니다. (Streamlit Secrets 또는 .env)")
@@ -53,6 +61,7 @@ if not OPENAI_API_KEY:
 # ---------------------------
 st.set_page_config(page_title="AI Grammar Coach", page_icon="📝")
 st.title("AI Grammar Coach")
+st.markdown(DIFF_CSS, unsafe_allow_html=True)  # 하이라이트(gc-del / gc-ins) 스타일
 
 # 등록 상태
 registered = st.session_state.get("registered", False)
@@ -61,6 +70,7 @@ with st.sidebar:
     st.header("학습자 정보")
     learner_id = st.text_input("이름 또는 ID", max_chars=50, placeholder="예: nayoung")
     phone4 = st.text_input("휴대폰 뒤 4자리", max_chars=4, placeholder="예: 1234")
+    class_id = st.text_input("반 / 클래스 (선택)", max_chars=30, placeholder="예: 3-2")
 
     # ✅ 여기 난이도는 '문장의 수준'이 아니라 'AI 설명 난이도'
     level = st.selectbox(
@@ -73,6 +83,23 @@ with st.sidebar:
         "AI가 설명·해설을 얼마나 쉽게/깊게 해 줄지 정하는 옵션입니다."
     )
 
+    analysis_mode = st.radio(
+        "분석 방식",
+        ["스트리밍", "병렬", "기본"],
+        index=0,
+        help=(
+            "스트리밍: 교정 문장 → 설명 → 퀴즈 순서로 생성되는 대로 보여줍니다.\n\n"
+            "병렬: 설명과 퀴즈를 동시에 생성해 전체 대기 시간을 줄입니다.\n\n"
+            "기본: 전체 결과가 완성된 뒤 한 번에 보여줍니다."
+        ),
+    )
+
+    essay_mode = st.checkbox(
+        "에세이 모드 (여러 문장 나눠서 분석)",
+        value=False,
+        help="글을 문장별로 나눠 고칠 필요가 있는 문장만 동시에 분석하고, 결과를 하나로 합쳐 보여줍니다.",
+    )
+
     register_clicked = st.button("등록", type="primary")
 
     if register_clicked:
@@ -104,284 +131,181 @@ user_sentence = st.text_area(
 analyze = st.button("분석하기", type="primary", disabled=not registered)
 
 # ---------------------------
-# 3) 구조화 출력 스키마 (Responses API의 JSON 스키마)
-# ---------------------------
-schema = {
-  "name": "GrammarCoachOutput",
-  "schema": {
-    "type": "object",
-    "additionalProperties": False,
-    "properties": {
-      "corrected_sentence": {"type": "string"},
-      "level": {"type": "string", "enum": ["beginner", "intermediate", "advanced"]},
-      "explanations": {
-        "type": "array",
-        "minItems": 1,
-        "items": {
-          "type": "object",
-          "additionalProperties": False,
-          "properties": {
-            "step": {"type": "integer"},
-            "focus": {"type": "string"},
-            "what_is_wrong": {"type": "string"},
-            "why": {"type": "string"},
-            "better_alternatives": {
-              "type": "array",
-              "items": {"type": "string"},
-              "minItems": 0
-            },
-            "nuance": {"type": "string"}
-          },
-          # 🔴 strict 모드 규칙: properties에 있는 키 전부를 required에 포함
-          "required": [
-            "step",
-            "focus",
-            "what_is_wrong",
-            "why",
-            "better_alternatives",
-            "nuance"
-          ]
-        }
-      },
-      "quizzes": {
-        "type": "array",
-        "minItems": 5,
-        "items": {
-          "type": "object",
-          "additionalProperties": False,
-          "properties": {
-            "id": {"type": "string"},
-            "type": {"type": "string", "enum": ["mcq", "fill"]},
-            "difficulty": {"type": "string", "enum": ["beginner", "intermediate", "advanced"]},
-            "question": {"type": "string"},
-            "options": {
-              "type": "array",
-              "items": {"type": "string"},
-              "minItems": 0
-            },
-            "answer": {"type": "string"},
-            "rationale": {"type": "string"}
-          },
-          # 🔴 여기에서도 모든 키를 required에 포함
-          "required": [
-            "id",
-            "type",
-            "difficulty",
-            "question",
-            "options",
-            "answer",
-            "rationale"
-          ]
-        }
-      }
-    },
-    "required": ["corrected_sentence", "level", "explanations", "quizzes"]
-  }
-}
-
-# ---------------------------
-# 4) OpenAI 호출 함수
+# 3) 화면 렌더링 헬퍼 (스키마/OpenAI 호출은 coach_core.py)
 # ---------------------------
-from openai import OpenAI
-client = OpenAI(api_key=OPENAI_API_KEY, timeout=30)
-
-# difflib 기반 하이라이트 함수 전체 붙여넣기
-def highlight_diff(orig: str, corrected: str):
-    """
-    원문(orig)과 교정문(corrected)를 단어 단위 diff 방식으로 비교해
-    - 원문에서 삭제/바뀐 부분: 빨간 배경 + 볼드
-    - 교정문에서 새로 추가/바뀐 부분: 초록 배경 + 볼드
-    로 표시한 HTML을 반환
-    """
-    import difflib, html
-
-    orig_tokens = orig.split()
-    corr_tokens = corrected.split()
-
-    sm = difflib.SequenceMatcher(a=orig_tokens, b=corr_tokens)
+def render_diff_panel(orig: str, corrected: str):
+    """입력 문장 / 교정 문장을 2단으로 나란히 하이라이트 표시 (HTML은 diff_engine에서 메모이즈)."""
+    st.markdown(diff_panel_html(orig, corrected), unsafe_allow_html=True)
 
-    highlighted_orig = []
-    highlighted_corr = []
 
-    for tag, i1, i2, j1, j2 in sm.get_opcodes():
-        if tag == "equal":
-            highlighted_orig.extend(html.escape(w) for w in orig_tokens[i1:i2])
-            highlighted_corr.extend(html.escape(w) for w in corr_tokens[j1:j2])
-
-        elif tag == "delete":
-            for w in orig_tokens[i1:i2]:
-                highlighted_orig.append(
-                    f"<span style='background-color:#ffe6e6; font-weight:bold;'>{html.escape(w)}</span>"
-                )
-
-        elif tag == "insert":
-            for w in corr_tokens[j1:j2]:
-                highlighted_corr.append(
-                    f"<span style='background-color:#e6ffe6; font-weight:bold;'>{html.escape(w)}</span>"
-                )
-
-        elif tag == "replace":
-            for w in orig_tokens[i1:i2]:
-                highlighted_orig.append(
-                    f"<span style='background-color:#ffe6e6; font-weight:bold;'>{html.escape(w)}</span>"
-                )
-            for w in corr_tokens[j1:j2]:
-                highlighted_corr.append(
-                    f"<span style='background-color:#e6ffe6; font-weight:bold;'>{html.escape(w)}</span>"
-                )
+def record_learner_event(kind: str, result: dict, **kwargs):
+    """분석/채점/추가 질문을 로컬 학습 기록에 저장 (실패해도 학습 화면은 계속)."""
+    try:
+        getattr(coach_core.get_learner_store(), f"record_{kind}")(
+            make_learner_key(learner_id, phone4),
+            class_id.strip() or SETTINGS["DEFAULT_CLASS_ID"],
+            learner_id.strip(),
+            result,
+            **kwargs,
+        )
+    except Exception as e:
+        st.caption(f"학습 기록 저장 실패: {e}")
 
-    return " ".join(highlighted_orig), " ".join(highlighted_corr)
 
-def analyze_sentence(sentence: str, explanation_level_label: str):
+def make_requester(priority: int = None, wait_slot=None) -> Requester:
     """
-    explanation_level_label:
-      - 사용자가 사이드바에서 고른 '설명 난이도' (초급/중급/고급)
-      - 문장 자체 난이도가 아니라, 설명/해설을 얼마나 쉽게/깊게 할지에 대한 옵션
-    """
-    level_map = {"초급": "beginner", "중급": "intermediate", "고급": "advanced"}
-    explanation_level = level_map.get(explanation_level_label, "intermediate")
-
-    # 설명 난이도에 따른 언어 설정
-    if explanation_level == "beginner":
-        language_instruction = """
-        For beginner-level explanation:
-        - All explanation fields (what_is_wrong, why, better_alternatives, nuance, rationale)
-          must be written mainly in Korean.
-        - Use short, simple Korean sentences that Korean adult learners can easily understand.
-        - Include short English example sentences where helpful, but keep the explanation text in Korean.
-        """
-    else:
-        language_instruction = """
-        For intermediate/advanced-level explanation:
-        - Explanations can be primarily in English, but you may add short Korean glosses if helpful.
-        """
-
-    system_prompt = f"""
-    You are an expert English grammar tutor for Korean EFL learners.
-    Return JSON strictly conforming to the provided schema.
-
-    The learner chooses an *explanation level* (beginner / intermediate / advanced)
-    that controls how simple or detailed your explanations should be.
-    Explanation level parameter = {explanation_level}.
-
-    Independently from that, you must also:
-      - Estimate the difficulty of the learner's sentence itself
-        (beginner / intermediate / advanced),
-      - And store that judgment in the JSON field "level".
-        This "level" is **your own assessment of the sentence difficulty**.
-
-    Use the sentence difficulty in "level" as the main reference for:
-      - The overall difficulty of the quizzes you generate,
-      - And the "difficulty" field of each quiz item.
-
-    {language_instruction}
-
-    For explanations:
-      - step-by-step
-      - identify error spans exactly
-      - explain why it's wrong
-      - provide multiple better alternatives
-      - include nuance (meaning/register) where relevant
-
-    For quizzes (5–8 items):
-      - mix mcq and fill
-      - target the exact issues in the input
-      - Base difficulty primarily on your own sentence-difficulty judgment ("level").
-      - Mix quiz difficulties according to the sentence level:
-        * If sentence level = beginner:
-            - roughly half of the items should be beginner level
-            - the remaining items should be intermediate level
-        * If sentence level = intermediate:
-            - the majority of items should be intermediate level
-            - include some easier (beginner) and some harder (advanced) items
-        * If sentence level = advanced:
-            - the majority of items should be advanced level
-            - include some intermediate items
-      - Set each quiz item's "difficulty" field (beginner / intermediate / advanced)
-        to your estimate of that quiz item's difficulty.
-      - Include 1–2 transfer items (new sentences using the same rule).
+    OpenAI 입장 스케줄러에 알릴 요청자 (학습자 키 + 반, 반끼리 → 반 안의 학습자끼리 공정하게 나눔).
+    wait_slot: 차례를 기다리는 동안 대기 순서를 보여줄 st.empty() (스크립트 스레드에서 부를 때만)
     """
+    def on_wait(position: int):
+        wait_slot.caption(f"⏳ 요청이 많아 차례를 기다리는 중입니다... (대기 {position}번째)")
+
+    return Requester(
+        make_learner_key(learner_id, phone4),
+        class_id.strip() or SETTINGS["DEFAULT_CLASS_ID"],
+        priority=priority,
+        on_wait=on_wait if wait_slot is not None else None,
+    )
 
-    user_prompt = f"""
-    Learner sentence: {sentence}
-
-    Requested explanation level (controls explanation style, NOT sentence level):
-      {explanation_level}
-
-    Task:
-      1) Correct the sentence.
-      2) Provide layered explanations at the requested explanation level.
-      3) Generate quizzes (5-8) with immediate keys.
-      4) In the JSON output field "level", write **your assessment of the difficulty
-         of the learner's sentence** (beginner / intermediate / advanced).
-      5) Use that sentence difficulty to set the overall difficulty of the quizzes
-         and the "difficulty" field of each quiz item.
-
-    Output must be valid JSON only.
-    """
 
-    # Chat Completions API + JSON Schema 강제
-    chat = client.chat.completions.create(
-        model=OPENAI_MODEL or "gpt-4.1-mini",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        response_format={
-            "type": "json_schema",
-            "json_schema": {
-                "name": "GrammarCoachOutput",
-                "schema": schema["schema"],
-                "strict": True,
-            },
-        },
-        temperature=0.2,
+def render_learner_progress(days: int = 30):
+    """사이드바: 내 학습 기록 요약 (로컬 집계만 읽으므로 수 ms)."""
+    summary = coach_core.get_learner_store().learner_summary(
+        make_learner_key(learner_id, phone4), days=days
     )
+    totals = summary["totals"]
+    with st.expander(f"📈 내 학습 기록 (최근 {days}일)"):
+        if not totals["analyses"] and not totals["gradings"]:
+            st.caption("아직 기록이 없습니다.")
+            return
+        avg = summary["avg_score_rate"]
+        st.markdown(
+            f"- 분석 {totals['analyses']}회 · 퀴즈 {totals['gradings']}회"
+            + (f" (평균 정답률 {avg * 100:.0f}%)" if avg is not None else "")
+        )
+        if summary["focus"]:
+            st.markdown("- 자주 틀린 주제: " + ", ".join(
+                f"{t['tag']} {t['errors']}회" for t in summary["focus"][:3]
+            ))
+        if summary["weakest"]:
+            st.markdown("- 약한 규칙: " + ", ".join(
+                f"{t['tag']} {t['correct_rate'] * 100:.0f}%" for t in summary["weakest"][:3]
+            ))
+        if len(summary["trend"]) >= 2:
+            st.line_chart(
+                {"정답률": [t["score_rate"] for t in summary["trend"]]}, height=120
+            )
 
-    content = chat.choices[0].message.content
-    return json.loads(content)
 
-def answer_followup(question: str, sentence: str, corrected: str, level_label: str) -> str:
-    """추가 질문에 대해 한국어로 짧게 답변."""
-    level_map = {"초급": "beginner", "중급": "intermediate", "고급": "advanced"}
-    lvl = level_map.get(level_label, "intermediate")
+def explanation_markdown(exp: dict) -> str:
+    """단계별 설명 1개의 본문 (expander 안에 markdown 1번으로 보냄)."""
+    lines = [f"- **어디가 문제?** {exp['what_is_wrong']}", f"- **왜 틀렸나**: {exp['why']}"]
+    if exp.get("better_alternatives"):
+        lines.append("- **더 좋은 표현**:")
+        lines.extend(f"  - {alt}" for alt in exp["better_alternatives"])
+    if exp.get("nuance"):
+        lines.append(f"- **뉘앙스**: {exp['nuance']}")
+    return "\n".join(lines)
 
-    system_prompt = """
-    You are a friendly English grammar tutor for Korean adult learners.
-    - Always answer in Korean.
-    - Keep the explanation concise (약 3~6문장).
-    - Use clear, simple Korean.
-    - 필요하면 간단한 영어 예문 1~2개를 포함하세요.
-    """
 
-    user_prompt = f"""
-    학습자의 영어 문장: {sentence}
-    교정된 문장: {corrected}
-    설정된 설명 난이도 옵션: {lvl}
+def render_explanation(exp: dict, body: str = None):
+    """단계별 설명 1개를 expander로 표시."""
+    with st.expander(f"Step {exp['step']} · {exp['focus']}"):
+        st.markdown(body if body is not None else explanation_markdown(exp))
 
-    아래는 학습자의 추가 질문입니다. 한국어로 이해하기 쉽게 설명해 주세요.
+def render_precheck_preview(sentence: str, pre):
+    """로컬 사전 검사의 예비 교정 결과 (AI 분석이 끝나기 전까지 표시)."""
+    st.caption("⚡ 빠른 검사 결과 (예비 교정) — AI 분석이 끝나면 자동으로 바뀝니다.")
+    render_diff_panel(sentence, pre.corrected)
+    for issue in pre.issues:
+        st.markdown(f"- **{issue.focus}**: {issue.message}")
 
-    추가 질문:
-    {question}
+def run_streaming_analysis(sentence: str, level_label: str, pre=None):
     """
-
-    chat = client.chat.completions.create(
-        model=OPENAI_MODEL or "gpt-4.1-mini",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        temperature=0.4,
-    )
-    return chat.choices[0].message.content.strip()
+    스트리밍으로 분석하면서 완성되는 부분부터 바로 화면에 그린다.
+    끝나면 임시 화면을 지우고 전체 결과(dict)를 반환 → 아래 일반 렌더링이 이어받음.
+    pre: precheck_sentence() 결과가 있으면 교정 문장이 오기 전까지 예비 교정을 보여줌
+    """
+    live = st.empty()
+    with live.container():
+        st.divider()
+        st.subheader("교정 결과 (생성 중...)")
+        diff_slot = st.empty()
+        if pre is not None and pre.issues:
+            with diff_slot.container():
+                render_precheck_preview(sentence, pre)
+        else:
+            diff_slot.info("교정 문장을 생성하고 있습니다...")
+        status_slot = st.empty()
+        st.markdown("### 단계별 설명")
+        exp_slot = st.empty()
+        exp_box = exp_slot.container()
+        st.markdown("### 퀴즈 (생성 중)")
+        quiz_slot = st.empty()
+        quiz_box = quiz_slot.container()
+
+        result = None
+        requester = make_requester(wait_slot=status_slot)
+        for event in analyze_sentence_stream(sentence, level_label, requester=requester):
+            if requester.on_wait is not None:
+                status_slot.empty()  # 차례가 와서 생성이 시작됨 → 대기 안내 지우기
+                requester.on_wait = None
+            if event[0] == "escalate":
+                # 빠른 모델 결과가 검사를 통과하지 못함 -> 지금까지 그린 것을 지우고 다시 받음
+                status_slot.info("더 정확한 모델로 다시 분석하고 있습니다...")
+                diff_slot.info("교정 문장을 생성하고 있습니다...")
+                exp_box = exp_slot.container()
+                quiz_box = quiz_slot.container()
+            elif event[0] == "field" and event[1] == "corrected_sentence":
+                with diff_slot.container():
+                    render_diff_panel(sentence, event[2])
+            elif event[0] == "item" and event[1] == "explanations":
+                with exp_box:
+                    render_explanation(event[3])
+            elif event[0] == "item" and event[1] == "quizzes":
+                with quiz_box:
+                    st.caption(f"{event[2] + 1}. {event[3].get('question', '')}")
+            elif event[0] == "done":
+                result = event[1]
+
+    live.empty()
+    return result
 
 # ---------------------------
-# 5) 렌더링 & 즉시 채점
+# 4) 렌더링 & 즉시 채점
 # ---------------------------
-session_id = st.session_state.get("session_id") or str(uuid.uuid4())
-st.session_state["session_id"] = session_id
+# 세션 id를 주소(?sid=...)에 남겨 두면 새로고침/서버 재시작 뒤에도 같은 세션으로 복원된다
+# (주소가 공유/기록되어도 남의 기록이 보이지 않도록, 처음 분석한 학습자로 등록했을 때만 복원)
+session_id = st.session_state.get("session_id")
+if not session_id:
+    sid = st.query_params.get("sid", "")
+    session_id = sid if sid.isalnum() and 16 <= len(sid) <= 64 else uuid.uuid4().hex
+    st.session_state["session_id"] = session_id
+if st.query_params.get("sid") != session_id:
+    st.query_params["sid"] = session_id
+
+# 세션에는 결과 id와 채점/질문 기록만 (결과 본문은 세션들이 함께 쓰는 저장소에 한 번만)
+session_store = coach_core.get_session_store()
+result_store = coach_core.get_result_store()
+learner_key = make_learner_key(learner_id, phone4) if registered else ""
+session = session_store.get(session_id)
+own_session = session.visible_to(learner_key)
+if not own_session:
+    if registered:
+        # 다른 학습자의 세션 주소 → 새 세션으로 시작
+        session_id = uuid.uuid4().hex
+        st.session_state["session_id"] = session_id
+        st.query_params["sid"] = session_id
+        session = session_store.get(session_id)
+        own_session = True
+    else:
+        # 등록 전: 주소는 그대로 두고(같은 학습자로 등록하면 복원) 내용은 보여 주지 않음
+        session = SessionRecord(session_id)
+result = result_store.get(session.result_id)  # 이전 분석 결과 유지
 
-result = st.session_state.get("result")  # 이전 분석 결과 유지
+# 빠른 검사 결과 화면의 [AI로 자세히 분석하기] 버튼 → 사전 검사 생략하고 다시 분석
+force_ai = st.session_state.pop("force_ai", False)
+analyze = analyze or force_ai
 
 if analyze:
     if not st.session_state.get("registered", False):
@@ -389,157 +313,225 @@ if analyze:
     elif not user_sentence.strip():
         st.warning("문장을 입력하세요.")
     else:
-        with st.spinner("분석 중..."):
+        # 1단계: 로컬 규칙 검사 (수 ms) — "오류 없음"이 확실하면 LLM 호출 생략
+        pre = precheck_sentence(user_sentence)
+        result_source = "ai"
+        if essay_mode:
+            progress = st.progress(0.0, text="문장별로 나눠 분석 중...")
+
+            def on_progress(done: int, total: int):
+                progress.progress(
+                    done / total if total else 1.0,
+                    text=f"문장별로 나눠 분석 중... ({done}/{total})",
+                )
+
+            try:
+                # 문장 여러 개를 한꺼번에 보내므로 일괄 작업 우선순위로 (다른 학습자의 질문/분석이 먼저)
+                result = analyze_essay(
+                    user_sentence,
+                    level,
+                    functools.partial(
+                        analyze_sentence_parallel if analysis_mode == "병렬" else analyze_sentence,
+                        requester=make_requester(PRIORITY_BATCH),
+                    ),
+                    max_workers=SETTINGS["ESSAY_CONCURRENCY"],
+                    skip_confidence=SETTINGS["PRECHECK_SKIP_CONFIDENCE"],
+                    on_progress=on_progress,
+                )
+            except CircuitOpenError as e:
+                st.warning(f"지금은 분석 요청이 많아 잠시 쉬고 있어요. {e}")
+                st.stop()
+            except Exception as e:
+                st.error(f"분석 중 오류: {e}")
+                st.stop()
+            progress.empty()
+        elif (
+            not force_ai
+            and pre.no_errors
+            and pre.confidence >= SETTINGS["PRECHECK_SKIP_CONFIDENCE"]
+        ):
+            result = pre.to_result()
+            result_source = "precheck"
+        elif analysis_mode == "스트리밍":
             try:
-                result = analyze_sentence(user_sentence, level)
-                st.session_state["result"] = result
+                result = run_streaming_analysis(user_sentence, level, pre)
+            except CircuitOpenError as e:
+                # 업스트림 장애 중: 재시도 폭주를 막기 위해 안내만 하고 멈춤
+                st.warning(f"지금은 분석 요청이 많아 잠시 쉬고 있어요. {e}")
+                st.stop()
             except Exception as e:
                 st.error(f"분석 중 오류: {e}")
                 st.stop()
+        else:
+            analyze_fn = analyze_sentence_parallel if analysis_mode == "병렬" else analyze_sentence
+            preview = st.empty()
+            if pre.issues:
+                with preview.container():
+                    render_precheck_preview(user_sentence, pre)
+            wait_slot = st.empty()
+            with st.spinner("분석 중..."):
+                try:
+                    result = analyze_fn(user_sentence, level,
+                                        requester=make_requester(wait_slot=wait_slot))
+                except CircuitOpenError as e:
+                    st.warning(f"지금은 분석 요청이 많아 잠시 쉬고 있어요. {e}")
+                    st.stop()
+                except Exception as e:
+                    st.error(f"분석 중 오류: {e}")
+                    st.stop()
+            preview.empty()
+            wait_slot.empty()
+        # 이전 결과의 채점 내역은 새 결과와 맞지 않으므로 비움
+        session = session_store.update(
+            session_id, owner=learner_key, result_id=result_store.put(result) if result else "",
+            result_source=result_source, sentence=user_sentence, graded=(),
+        )
+        record_learner_event("analysis", result, source=result_source)
 
-if result:
-    st.divider()
-    st.subheader("교정 결과")
+# ---------------------------
+# 5) 결과 화면: 구간별 fragment
+# ---------------------------
+# 퀴즈 채점 / 추가 질문 / 리포트 전송은 각자의 fragment만 다시 실행한다.
+# (app.py 전체를 다시 돌리지 않으므로 설명 expander, diff 패널을 다시 그리거나 보내지 않음)
+AI_LEVEL_KO = {"beginner": "초급", "intermediate": "중급", "advanced": "고급"}
 
-    # AI가 판단한 문장 난이도만 표시
-    ai_level_en = result.get("level", "intermediate")
-    ai_level_ko_map = {
-        "beginner": "초급",
-        "intermediate": "중급",
-        "advanced": "고급",
-    }
-    ai_level_ko = ai_level_ko_map.get(ai_level_en, ai_level_en)
 
-    st.markdown(
-        f"**AI가 판단한 문장 난이도:** {ai_level_ko} ({ai_level_en})"
-    )
+def timed_fragment(name: str):
+    """st.fragment + 실행 시간 기록 (fragment만 다시 실행될 때도 지표에 남도록)."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                REGISTRY.observe(
+                    "streamlit_fragment_seconds", time.perf_counter() - started, fragment=name
+                )
+        return st.fragment(wrapper)
+    return decorator
 
-    col1, col2 = st.columns(2)
 
-    # 하이라이트된 문장 HTML 생성
-    orig_html, corr_html = highlight_diff(
-        user_sentence,
-        result["corrected_sentence"]
-    )
+@st.cache_resource(max_entries=500, show_spinner=False)
+def result_view(result_id: str) -> dict:
+    """
+    결과 1개의 화면용 문자열(설명 markdown 등)을 한 번만 만들어 둠.
+    결과 id 기준이라 같은 결과를 보는 세션들이 함께 쓴다 (세션마다 복사본을 들고 있지 않음).
+    """
+    result = result_store.get(result_id)
+    return {
+        "explanations": [(exp, explanation_markdown(exp)) for exp in result["explanations"]],
+        "quiz_titles": [
+            f"**{idx}. [난이도: {AI_LEVEL_KO.get(q.get('difficulty', ''), q.get('difficulty', ''))}] "
+            f"{q['question']}**"
+            for idx, q in enumerate(result.get("quizzes") or [], start=1)
+        ],
+    }
 
-    with col1:
-        st.markdown("**입력 문장**")
-        st.markdown(
-            f"<div style='padding:0.75rem; border-radius:0.5rem; "
-            f"background-color:#f8f9fa; line-height:1.6;'>{orig_html}</div>",
-            unsafe_allow_html=True,
-        )
 
-    with col2:
-        st.markdown("**교정 문장**")
+@timed_fragment("correction")
+def correction_fragment(result: dict, sentence: str, result_source: str):
+    ai_level_en = result.get("level", "intermediate")
+    if result_source == "precheck":
+        st.success("⚡ 빠른 검사에서 문법 오류를 찾지 못했습니다.")
+        if st.button("AI로 자세히 분석하기"):
+            st.session_state["force_ai"] = True
+            st.rerun()  # 앱 전체를 다시 실행해 AI 분석
+    else:
         st.markdown(
-            f"<div style='padding:0.75rem; border-radius:0.5rem; "
-            f"background-color:#f0fff4; line-height:1.6;'>{corr_html}</div>",
-            unsafe_allow_html=True,
+            f"**AI가 판단한 문장 난이도:** {AI_LEVEL_KO.get(ai_level_en, ai_level_en)} ({ai_level_en})"
         )
 
+    render_diff_panel(sentence, result["corrected_sentence"])
+
+    # 에세이 모드: 문장별 교정 결과
+    if result.get("sentences"):
+        source_label = {"ai": "AI 분석", "precheck": "빠른 검사 · 오류 없음", "duplicate": "앞 문장과 동일",
+                        "error": "분석 실패"}
+        st.markdown("### 문장별 교정")
+        if result.get("failed"):
+            st.warning(
+                f"{result['failed']}개 문장은 분석하지 못해 원문 그대로 두었습니다. "
+                "'분석하기'를 다시 누르면 분석이 끝난 문장은 저장된 결과를 쓰고 실패한 문장만 다시 분석합니다."
+            )
+        for sent in result["sentences"]:
+            changed = sent["sentence"].strip() != sent["corrected_sentence"].strip()
+            failed = sent["source"] == "error"
+            icon = "⚠️" if failed else "✏️" if changed else "✅"
+            with st.expander(
+                f"{icon} 문장 {sent['index']} · {source_label.get(sent['source'], sent['source'])}",
+                expanded=changed or failed,
+            ):
+                if failed:
+                    st.caption(f"오류: {sent.get('error', '')}")
+                render_diff_panel(sent["sentence"], sent["corrected_sentence"])
+
+
+@timed_fragment("explanations")
+def explanations_fragment(result_id: str):
     st.markdown("### 단계별 설명")
-    for exp in result["explanations"]:
-        with st.expander(f"Step {exp['step']} · {exp['focus']}"):
-            st.markdown(f"- **어디가 문제?** {exp['what_is_wrong']}")
-            st.markdown(f"- **왜 틀렸나**: {exp['why']}")
-            if exp.get("better_alternatives"):
-                st.markdown("- **더 좋은 표현**:")
-                for alt in exp["better_alternatives"]:
-                    st.markdown(f"  - {alt}")
-            if exp.get("nuance"):
-                st.markdown(f"- **뉘앙스**: {exp['nuance']}")
+    for exp, body in result_view(result_id)["explanations"]:
+        render_explanation(exp, body)
+
 
+@timed_fragment("quiz")
+def quiz_fragment(result: dict, result_id: str):
     st.markdown("### 퀴즈 풀이 (즉시 채점)")
 
-    quizzes = result.get("quizzes") if result else []
+    quizzes = result.get("quizzes") or []
     if not quizzes:
         st.info("퀴즈가 생성되지 않았습니다.")
+        return
+
+    quiz_titles = result_view(result_id)["quiz_titles"]
+    # 선택만으로는 rerun 발생 X, Submit 때만 처리 (이 fragment만 다시 실행)
+    with st.form("quiz_form", clear_on_submit=False):
+        answers = {}
+        for q, title in zip(quizzes, quiz_titles):
+            st.markdown(title)
+            key = f"q_{q['id']}"
+            if q["type"] == "mcq" and q.get("options") is not None:
+                answers[key] = st.radio("선택", q["options"], key=key, index=None)
+            else:
+                answers[key] = st.text_input("정답 입력", key=key)
+
+        submitted = st.form_submit_button("채점하기")
+
+    if submitted:
+        # 채점 (세션에는 문항 번호/내 답/정답 여부만 저장, 질문/해설은 결과에서 다시 만듦)
+        graded = []
+        for idx, q in enumerate(quizzes):
+            key = f"q_{q['id']}"
+            user_ans = (answers.get(key) or "").strip()
+            correct = (q.get("answer") or "").strip()
+            graded.append(GradedAnswer(idx, user_ans, user_ans.lower() == correct.lower()))
+
+        # 문항별 정답률 → 퀴즈 은행의 문항 품질 통계
+        coach_core.record_quiz_attempts(
+            [(quizzes[g.quiz_index], g.is_correct) for g in graded if g.user_answer]
+        )
+
+        session = session_store.update(session_id, graded=tuple(graded))
+        record_learner_event("grading", result, details=session.details(result))
     else:
-        # 퀴즈 난이도(문항별)를 한국어로 표시하기 위한 매핑
-        quiz_level_ko_map = {
-            "beginner": "초급",
-            "intermediate": "중급",
-            "advanced": "고급",
-        }
-
-
-        # 선택만으로는 rerun 발생 X, Submit 때만 처리
-        with st.form("quiz_form", clear_on_submit=False):
-            answers = {}
-            # enumerate로 번호 생성
-            for idx, q in enumerate(quizzes, start=1):
-                diff_en = q.get("difficulty", "")
-                diff_ko = quiz_level_ko_map.get(diff_en, diff_en)
-
-                st.markdown(
-                    f"**{idx}. [난이도: {diff_ko}] {q['question']}**"
-                )
-                key = f"q_{q['id']}"
-                if q["type"] == "mcq" and q.get("options") is not None:
-                    choice = st.radio("선택", q["options"], key=key, index=None)
-                    answers[key] = choice
-                else:
-                    ans = st.text_input("정답 입력", key=key)
-                    answers[key] = ans
-
-            submitted = st.form_submit_button("채점하기")
-
-        if submitted:
-            score = 0
-            total = len(quizzes)
-            details = []
-
-            # 채점 + 세부 정보 저장
-            for idx, q in enumerate(quizzes, start=1):
-                key = f"q_{q['id']}"
-                user_ans = (answers.get(key) or "").strip()
-                correct = (q.get("answer") or "").strip()
-                is_correct = (user_ans.lower() == correct.lower())
-
-                if is_correct:
-                    score += 1
-
-                details.append({
-                    "no": idx,  # 번호 저장
-                    "id": q["id"],
-                    "question": q["question"],
-                    "user_answer": user_ans,
-                    "correct_answer": correct,
-                    "is_correct": is_correct,
-                    "rationale": q.get("rationale", "")
-                })
-
-            # 점수 표시
-            st.success(f"점수: {score} / {total}")
-
-            # 정답 전체 요약 표시
-            st.markdown("#### 문항별 정답 확인")
-
-            for d in details:
-                icon = "✅" if d["is_correct"] else "❌"
-                user_display = d["user_answer"] or "(무응답)"
-
-                st.markdown(
-                    f"**{d['no']}. {icon}**  "
-                    f"(내 답: `{user_display}` / 정답: `{d['correct_answer']}`)"
-                )
+        session = session_store.get(session_id)
 
-            # 필요 시, 자세한 해설은 접어서 보여줄 수도 있음 (선택)
-            # for d in details:
-            #     with st.expander(f"{d['no']}. 해설 보기"):
-            #         st.markdown(f"- 질문: {d['question']}")
-            #         st.markdown(f"- 내 답: `{d['user_answer'] or '(무응답)'}`")
-            #         st.markdown(f"- 정답: `{d['correct_answer']}`")
-            #         if d["rationale"]:
-            #             st.markdown(f"- 해설: {d['rationale']}")
+    details = session.details(result)
+    if details:
+        st.success(f"점수: {session.score} / {len(details)}")
 
-            # 세션에 저장
-            st.session_state["last_score"] = score
-            st.session_state["last_details"] = details
+        # 정답 전체 요약 표시 (한 번에 보냄)
+        st.markdown("#### 문항별 정답 확인")
+        st.markdown("  \n".join(
+            f"**{d['no']}. {'✅' if d['is_correct'] else '❌'}**  "
+            f"(내 답: `{d['user_answer'] or '(무응답)'}` / 정답: `{d['correct_answer']}`)"
+            for d in details
+        ))
 
-    # 추가 질문 섹션 (최대 MAX_FOLLOWUP개)
 
+@timed_fragment("followup")
+def followup_fragment(result: dict, sentence: str, level_label: str):
+    """추가 질문 섹션 (최대 MAX_FOLLOWUP개). 입력/전송은 이 fragment만 다시 실행."""
     st.markdown("### 추가 질문 (선택)")
     st.caption(
         f"문법 설명이나 퀴즈에 대해 더 궁금한 점이 있으면 적어 보세요. "
@@ -547,7 +539,7 @@ if result:
         "AI가 한국어로 간단히 설명해 줍니다."
     )
 
-    qa_history = st.session_state.get("qa_history") or []
+    qa_history = session_store.get(session_id).qa
     max_reached = len(qa_history) >= MAX_FOLLOWUP
 
     # 직전 실행에서 '입력창 초기화' 플래그가 켜져 있으면 먼저 비우고 플래그 해제
@@ -575,82 +567,93 @@ if result:
         elif not followup_q.strip():
             st.warning("질문을 입력해 주세요.")
         else:
-            with st.spinner("추가 설명을 생성하고 있습니다..."):
+            question = followup_q.strip()
+            label = f"Q{len(qa_history) + 1}. {question[:40]}"
+            # 캐시에 없으면 답변이 만들어지는 대로 바로 보여줌 (스피너로 기다리지 않음)
+            with st.expander(label, expanded=True):
+                st.markdown(f"**질문:** {question}")
+                answer_box = st.empty()
+                answer_box.markdown("**답변:** ▌")
                 try:
-                    answer_text = answer_followup(
+                    answer_text = ""
+                    for piece in answer_followup_stream(
                         followup_q,
-                        user_sentence,
+                        sentence,
                         result["corrected_sentence"],
-                        level
-                    )
-                    qa_item = {
-                        "question": followup_q.strip(),
-                        "answer": answer_text,
-                        "ts": int(time.time())
-                    }
-                    qa_history.append(qa_item)
-
+                        level_label,
+                        requester=make_requester(wait_slot=answer_box),
+                    ):
+                        answer_text += piece
+                        answer_box.markdown(f"**답변:** {answer_text}▌")
+                    answer_text = answer_text.strip()
+                    answer_box.markdown(f"**답변:** {answer_text}")
+
+                    qa_item = QAItem(question, answer_text, int(time.time()))
                     # 혹시라도 실수로 MAX_FOLLOWUP을 넘지 않도록 한 번 더 방어
-                    if len(qa_history) > MAX_FOLLOWUP:
-                        qa_history = qa_history[:MAX_FOLLOWUP]
-
-                    st.session_state["qa_history"] = qa_history
+                    session_store.update(session_id, qa=(qa_history + (qa_item,))[:MAX_FOLLOWUP])
                     st.session_state["clear_followup_q"] = True
-                    st.success("답변이 생성되었습니다. 아래에서 확인해 주세요.")
+                    record_learner_event("followup", result)
 
-                    # 바로 한 번 rerun 돌려서 비워진 입력창을 보여주기
-                    rerun_fn = getattr(st, "rerun", None) or getattr(st, "experimental_rerun", None)
-                    if rerun_fn:
-                        rerun_fn()
+                    # 이 fragment만 한 번 더 실행해서 비워진 입력창을 보여주기
+                    st.rerun(scope="fragment")
 
+                except CircuitOpenError as e:
+                    answer_box.empty()
+                    st.warning(f"지금은 질문 요청이 많아 잠시 쉬고 있어요. {e}")
                 except Exception as e:
+                    answer_box.empty()
                     st.error(f"추가 질문 처리 중 오류: {e}")
 
     if qa_history:
         st.markdown("#### 지금까지의 질문 & 답변")
         for i, qa in enumerate(qa_history, start=1):
             label = (
-                f"Q{i}. {qa['question'][:40]}"
-                if len(qa["question"]) > 40
-                else f"Q{i}. {qa['question']}"
+                f"Q{i}. {qa.question[:40]}"
+                if len(qa.question) > 40
+                else f"Q{i}. {qa.question}"
             )
             with st.expander(label):
-                st.markdown(f"**질문:** {qa['question']}")
-                st.markdown(f"**답변:** {qa['answer']}")
+                st.markdown(f"**질문:** {qa.question}  \n**답변:** {qa.answer}")
+
 
-    # 리포트 전송
+@timed_fragment("report")
+def report_fragment(result: dict, sentence: str, level_label: str):
     st.markdown("### 리포트 전송")
     st.caption("클릭 시 n8n으로 익명화된 학습 리포트가 전송/저장됩니다.")
     if st.button("리포트 보내기"):
-        payload = {
-            "session_id": session_id,
-            "learner_id": learner_id or "anonymous",
-            "phone4": phone4 or "",
-            "level": level,
-            "ai_level": ai_level_en,
-            "input_sentence": user_sentence,
-            "corrected_sentence": result["corrected_sentence"],
-            "score": st.session_state.get("last_score"),
-            "details": st.session_state.get("last_details"),
-            "followup_qa": st.session_state.get("qa_history", []),
-            "ts": int(time.time())
-        }
+        session = session_store.get(session_id)
+        payload = coach_core.build_report_payload(
+            session_id, learner_id, phone4, level_label, sentence, result,
+            score=session.score,
+            details=session.details(result) or None,
+            followup_qa=session.qa_history(),
+        )
 
         if not N8N_WEBHOOK_URL:
             st.error("N8N_WEBHOOK_URL이 설정되지 않아 전송할 수 없습니다.")
         else:
+            # 웹훅 응답을 기다리지 않고 로컬 아웃박스에 저장 → 백그라운드에서 전송/재시도
             try:
-                r = requests.post(N8N_WEBHOOK_URL, json=payload, timeout=30)
-                if r.status_code < 300:
-                    st.success("리포트가 전송되었습니다.")
-                else:
-                    st.error(f"리포트 전송 실패: {r.status_code} {r.text[:200]}")
+                coach_core.get_report_outbox().enqueue(payload)
+                st.success("리포트가 저장되었습니다. 잠시 후 자동으로 전송됩니다.")
             except Exception as e:
-                st.error(f"리포트 전송 오류: {e}")
+                st.error(f"리포트 저장 오류: {e}")
 
-if st.button("🔄 새 문장 분석하기"):
-    for k in ["result", "last_score", "last_details", "qa_history", "followup_q"]:
-        st.session_state.pop(k, None)
+
+if result:
+    # 새로고침/재시작으로 복원된 세션이면 입력창이 비어 있으므로 분석했던 문장을 씀
+    analyzed_sentence = session.sentence or user_sentence
+    st.divider()
+    st.subheader("교정 결과")
+    correction_fragment(result, analyzed_sentence, session.result_source)
+    explanations_fragment(session.result_id)
+    quiz_fragment(result, session.result_id)
+    followup_fragment(result, analyzed_sentence, level)
+    report_fragment(result, analyzed_sentence, level)
+
+if st.button("🔄 새 문장 분석하기") and own_session:
+    session_store.update(session_id, result_id="", result_source="", sentence="", graded=(), qa=())
+    st.session_state.pop("followup_q", None)
 
     rerun_fn = getattr(st, "rerun", None) or getattr(st, "experimental_rerun", None)
     if rerun_fn:
@@ -660,3 +663,78 @@ if st.button("🔄 새 문장 분석하기"):
 
 # 하단 안내
 st.caption("ⓘ 본 서비스는 OpenAI Responses API를 사용합니다.")
+
+# rerun 소요시간 기록 (st.stop()으로 중간에 끝난 실행은 제외)
+if registered:
+    with st.sidebar:
+        render_learner_progress()
+
+rerun_timer = get_rerun_timer()
+rerun_elapsed = time.perf_counter() - _rerun_started
+rerun_timer.observe(rerun_elapsed)
+REGISTRY.observe("streamlit_rerun_seconds", rerun_elapsed)
+if SETTINGS.get("SHOW_PERF_STATS"):
+    perf = rerun_timer.summary()
+    st.caption(
+        f"⏱ rerun {perf['count']}회 · p50 {perf['p50_ms']:.1f}ms · "
+        f"p95 {perf['p95_ms']:.1f}ms · p99 {perf['p99_ms']:.1f}ms"
+    )
+    outbox = coach_core.get_report_outbox().stats()
+    st.caption(
+        f"📮 리포트 대기 {outbox['queue_depth']}건 · dead-letter {outbox['dead_letters']}건 · "
+        f"전송 지연 p95 {outbox['delivery_latency']['p95_ms'] / 1000:.1f}s"
+    )
+    usage = coach_core.usage_totals()
+    if usage["prompt_tokens"]:
+        st.caption(
+            f"🧮 API 호출 {usage['calls']}회 · 입력 {usage['prompt_tokens']:,} 토큰 "
+            f"(prefix 캐시 {usage['cached_tokens'] / usage['prompt_tokens'] * 100:.0f}%) · "
+            f"출력 {usage['completion_tokens']:,} 토큰"
+        )
+    tiers = coach_core.routing_stats()["tiers"]
+    if tiers:
+        st.caption("🔀 " + " · ".join(
+            f"{name}: {t['calls']}회 (승격 {t['escalation_rate'] * 100:.0f}%, "
+            f"p95 {t['latency']['p95_ms'] / 1000:.1f}s, ${t['cost_usd']:.4f})"
+            for name, t in tiers.items()
+        ))
+    repairs = coach_core.repair_stats()
+    if repairs:
+        st.caption(
+            f"🩹 응답 부분 복구: 로컬 {repairs.get('local', 0)}회 · "
+            f"설명 재생성 {repairs.get('explain', 0)}회 · 퀴즈 재생성 {repairs.get('quizzes', 0)}회"
+        )
+    hedging = coach_core.hedging_stats()
+    if hedging["hedged"]:
+        st.caption(
+            f"🪢 느린 응답에 헤지 요청 {hedging['hedged']}회 (먼저 도착 {hedging['hedge_wins']}회) · "
+            f"추가 요청 {hedging['hedge_ratio'] * 100:.1f}%"
+        )
+    admission = coach_core.scheduler_stats()
+    if admission["waited"] or admission["rejected"] or admission["timeouts"]:
+        st.caption(
+            f"🚦 호출 순서 대기 {admission['waited']}회 · 연타/과다 요청 거절 {admission['rejected']}회 · "
+            f"대기 시간 초과 {admission['timeouts']}회 · 지금 대기 {sum(admission['queued'].values())}건"
+        )
+    flights = coach_core.coalescing_stats()["sync"]
+    if flights["followers"]:
+        st.caption(
+            f"🔗 동시에 들어온 같은 분석 {flights['followers']}건을 진행 중이던 요청과 합침 "
+            f"(모델 호출 {flights['leaders']}회, 재시도 {flights['retries']}회)"
+        )
+    bank = coach_core.quiz_bank_stats()
+    if bank["items"]:
+        st.caption(
+            f"🏦 퀴즈 은행 {bank['items']}문항 · 주제 {bank['tags']}개 · "
+            f"재사용 {bank['picks']}회 ({bank['picked_items']}문항)"
+        )
+    followup = coach_core.get_followup_cache().stats()
+    st.caption(
+        f"💬 추가 질문 캐시 {followup['entries']}건 · 적중률 {followup['hit_ratio'] * 100:.0f}% "
+        f"(유사 질문 {followup['similar_hits']}회)"
+    )
+    sessions = session_store.stats()
+    st.caption(
+        f"🗂 메모리의 세션 {sessions['hot']}개 · 내보냄 {sessions['evicted']}회 · "
+        f"디스크에서 복원 {sessions['restored']}회"
+    )
@@ -0,0 +1,182 @@
+"""
+문장 일괄 분석 CLI (Streamlit 없이 실행)
+
+사용 예:
+    python batch_analyze.py worksheet.csv -o results.jsonl --level 중급 --concurrency 8
+
+- 입력: CSV (sentence 열, 선택적으로 id / level 열) 또는 JSONL ({"sentence": ..., "id": ...})
+- 출력: 결과를 한 줄씩 JSONL로 바로 기록 (실패한 행은 <출력>.errors.jsonl)
+- 재시작: 출력 파일에 이미 있는 id는 건너뜀 → 중단된 작업을 다시 돈을 내지 않고 이어서 실행
+- 처리량: 진행 중/완료 후 문장/초, 토큰/초를 stderr로 출력
+- OpenAI 호출은 일괄 작업 우선순위로 (같은 프로세스의 화면 분석/추가 질문이 먼저, scheduler.py)
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import coach_core
+from scheduler import PRIORITY_BATCH, Requester
+
+
+def read_rows(path: str, column: str):
+    """입력 파일에서 (row_id, sentence, level_label|None)을 순서대로 읽는다."""
+    if path.lower().endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                row = json.loads(line)
+                yield str(row.get("id", line_no)), row.get(column, ""), row.get("level")
+    else:
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            for row_no, row in enumerate(csv.DictReader(f), start=1):
+                yield str(row.get("id") or row_no), row.get(column, ""), row.get("level") or None
+
+
+def load_checkpoint(output_path: str) -> set:
+    """출력 JSONL에서 이미 끝난 id 목록을 읽는다. (중간에 잘린 마지막 줄은 무시)"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "rb") as f:
+        data = f.read()
+    for line in data.decode("utf-8", errors="replace").splitlines():
+        try:
+            done.add(str(json.loads(line)["id"]))
+        except (ValueError, KeyError, TypeError):
+            continue
+    # 비정상 종료로 마지막 줄이 잘렸다면 줄바꿈을 붙여 다음 기록과 섞이지 않게 함
+    if data and not data.endswith(b"\n"):
+        with open(output_path, "ab") as f:
+            f.write(b"\n")
+    return done
+
+
+class JsonlWriter:
+    """여러 스레드에서 한 줄씩 안전하게 추가 기록 (기록마다 flush → 체크포인트 역할)."""
+
+    def __init__(self, path: str):
+        self._f = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, obj: dict):
+        line = json.dumps(obj, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._f.write(line)
+            self._f.flush()
+            os.fsync(self._f.fileno())
+
+    def close(self):
+        self._f.close()
+
+
+def format_throughput(done: int, elapsed: float, tokens: int) -> str:
+    elapsed = max(elapsed, 1e-9)
+    return (
+        f"{done}개 완료 · {elapsed:.1f}s · "
+        f"{done / elapsed:.2f} 문장/s · {tokens / elapsed:.1f} 토큰/s"
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="AI Grammar Coach 문장 일괄 분석")
+    parser.add_argument("input", help="입력 CSV 또는 JSONL 파일")
+    parser.add_argument("-o", "--output", required=True, help="결과 JSONL 파일 (이어쓰기)")
+    parser.add_argument("--column", default="sentence", help="문장이 들어있는 열/필드 이름")
+    parser.add_argument("--level", default="중급", choices=["초급", "중급", "고급"],
+                        help="기본 설명 난이도 (행에 level이 있으면 그 값을 우선)")
+    parser.add_argument("--concurrency", type=int, default=4, help="동시에 보낼 최대 요청 수")
+    parser.add_argument("--mode", default="basic", choices=["basic", "parallel"],
+                        help="basic: analyze_sentence / parallel: analyze_sentence_parallel")
+    parser.add_argument("--no-cache", action="store_true", help="분석 결과 캐시를 사용하지 않음")
+    parser.add_argument("--progress-every", type=int, default=10, help="진행 상황 출력 간격(문장 수)")
+    args = parser.parse_args(argv)
+
+    settings = coach_core.load_settings()
+    if not settings["OPENAI_API_KEY"]:
+        print("OPENAI_API_KEY가 설정되지 않았습니다. (.env 또는 환경변수)", file=sys.stderr)
+        return 2
+    coach_core.configure(settings)
+
+    analyze_fn = (
+        coach_core.analyze_sentence_parallel if args.mode == "parallel"
+        else coach_core.analyze_sentence
+    )
+    requester = Requester("batch", "batch", priority=PRIORITY_BATCH)
+
+    done_ids = load_checkpoint(args.output)
+    if done_ids:
+        print(f"체크포인트: 이미 완료된 {len(done_ids)}개 행은 건너뜁니다.", file=sys.stderr)
+
+    writer = JsonlWriter(args.output)
+    error_writer = JsonlWriter(args.output + ".errors.jsonl")
+    counters = {"ok": 0, "error": 0}
+    usage_before = coach_core.usage_totals()
+    started = time.perf_counter()
+
+    def work(row_id: str, sentence: str, level_label: str):
+        t0 = time.perf_counter()
+        try:
+            result = analyze_fn(sentence, level_label, use_cache=not args.no_cache, requester=requester)
+        except Exception as e:
+            error_writer.write({"id": row_id, "sentence": sentence, "level": level_label,
+                                "error": f"{type(e).__name__}: {e}"})
+            return False
+        writer.write({"id": row_id, "sentence": sentence, "level": level_label,
+                      "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+                      "result": result})
+        return True
+
+    def report(final: bool = False):
+        usage = coach_core.usage_totals()
+        tokens = usage["total_tokens"] - usage_before["total_tokens"]
+        msg = format_throughput(counters["ok"], time.perf_counter() - started, tokens)
+        prompt = usage["prompt_tokens"] - usage_before["prompt_tokens"]
+        if prompt:
+            cached = usage["cached_tokens"] - usage_before["cached_tokens"]
+            msg += f" · 입력 토큰 캐시 적중 {cached / prompt * 100:.0f}%"
+        if counters["error"]:
+            msg += f" · 실패 {counters['error']}개"
+        print(("완료: " if final else "진행: ") + msg, file=sys.stderr)
+
+    # 입력 전체를 한 번에 올리지 않도록, 진행 중인 작업 수를 concurrency로 제한
+    concurrency = max(1, args.concurrency)
+    in_flight = set()
+
+    def collect(futures):
+        for f in futures:
+            counters["ok" if f.result() else "error"] += 1
+            finished = counters["ok"] + counters["error"]
+            if args.progress_every and finished % args.progress_every == 0:
+                report()
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for row_id, sentence, row_level in read_rows(args.input, args.column):
+                if row_id in done_ids or not (sentence or "").strip():
+                    continue
+                if len(in_flight) >= concurrency:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                in_flight.add(pool.submit(work, row_id, sentence, row_level or args.level))
+            finished, in_flight = wait(in_flight)
+            collect(finished)
+    except KeyboardInterrupt:
+        print("중단됨 - 다시 실행하면 완료된 행 이후부터 이어서 처리합니다.", file=sys.stderr)
+        return 130
+    finally:
+        writer.close()
+        error_writer.close()
+
+    report(final=True)
+    return 1 if counters["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
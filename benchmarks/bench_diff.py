@@ -0,0 +1,104 @@
+"""
+highlight_diff 벤치마크 (기존 difflib 버전 vs diff_engine)
+
+    python benchmarks/bench_diff.py
+
+짧은 문장 / 단락 / 수천 단어 에세이에서 1회 평균 시간을 비교한다.
+diff_engine 쪽은 메모이즈를 끄고(cache_clear) 순수 계산 시간을 잰다.
+"""
+import difflib
+import html
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import diff_engine  # noqa: E402
+
+WORDS = (
+    "she he they we go went goes school yesterday today book books read reads the a an "
+    "to of in on at with and but because very really teacher student friend morning "
+    "evening play played plays study studied studies happy tired busy city country"
+).split()
+
+
+def legacy_highlight_diff(orig: str, corrected: str):
+    """리팩터링 전 coach_core.highlight_diff (비교 기준)."""
+    orig_tokens = orig.split()
+    corr_tokens = corrected.split()
+    sm = difflib.SequenceMatcher(a=orig_tokens, b=corr_tokens)
+    highlighted_orig, highlighted_corr = [], []
+    for tag, i1, i2, j1, j2 in sm.get_opcodes():
+        if tag == "equal":
+            highlighted_orig.extend(html.escape(w) for w in orig_tokens[i1:i2])
+            highlighted_corr.extend(html.escape(w) for w in corr_tokens[j1:j2])
+        if tag in ("delete", "replace"):
+            for w in orig_tokens[i1:i2]:
+                highlighted_orig.append(
+                    f"<span style='background-color:#ffe6e6; font-weight:bold;'>{html.escape(w)}</span>"
+                )
+        if tag in ("insert", "replace"):
+            for w in corr_tokens[j1:j2]:
+                highlighted_corr.append(
+                    f"<span style='background-color:#e6ffe6; font-weight:bold;'>{html.escape(w)}</span>"
+                )
+    return " ".join(highlighted_orig), " ".join(highlighted_corr)
+
+
+def make_pair(rng: random.Random, n_words: int, edit_rate: float = 0.08):
+    """n_words 단어짜리 글과, 그중 edit_rate 비율을 고친 '교정문'."""
+    words = []
+    for i in range(n_words):
+        words.append(rng.choice(WORDS))
+        if i % 12 == 11:
+            words[-1] += "."
+    corrected = []
+    for w in words:
+        r = rng.random()
+        if r < edit_rate / 3:
+            continue  # 삭제
+        if r < 2 * edit_rate / 3:
+            corrected.append(rng.choice(WORDS))  # 교체
+            continue
+        corrected.append(w)
+        if r < edit_rate:
+            corrected.append(rng.choice(WORDS))  # 삽입
+    return " ".join(words), " ".join(corrected)
+
+
+def bench(fn, pairs, repeat: int, clear=None) -> float:
+    """1회 평균 시간(ms)."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for orig, corr in pairs:
+            if clear:
+                clear()
+            fn(orig, corr)
+    return (time.perf_counter() - start) / (repeat * len(pairs)) * 1000
+
+
+def main():
+    rng = random.Random(42)
+    cases = [
+        ("문장 (8단어)", 8, 200, 20),
+        ("단락 (120단어)", 120, 20, 10),
+        ("에세이 (2,000단어)", 2000, 3, 3),
+        ("에세이 (5,000단어)", 5000, 2, 2),
+    ]
+    print(f"{'입력':<18}{'difflib(ms)':>14}{'diff_engine(ms)':>18}{'메모이즈 적중(ms)':>20}")
+    for label, n_words, n_pairs, repeat in cases:
+        pairs = [make_pair(rng, n_words) for _ in range(n_pairs)]
+        legacy = bench(legacy_highlight_diff, pairs, repeat)
+        new = bench(diff_engine.highlight_diff, pairs, repeat,
+                    clear=diff_engine.highlight_diff.cache_clear)
+        diff_engine.highlight_diff.cache_clear()
+        for orig, corr in pairs:
+            diff_engine.highlight_diff(orig, corr)
+        memo = bench(diff_engine.highlight_diff, pairs, repeat)
+        print(f"{label:<18}{legacy:>14.3f}{new:>18.3f}{memo:>20.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+오프라인 부하 테스트 (가짜 OpenAI 호환 서버 + 가짜 n8n 웹훅)
+
+    python benchmarks/bench_load.py
+    python benchmarks/bench_load.py --concurrency 1,8,32 --requests 64 --latency 0.5 --error-rate 0.05
+    python benchmarks/bench_load.py --json bench_load.json     # 결과를 파일로 남겨 배포 전후 비교
+    python benchmarks/bench_load.py --slow-rate 0.03 --slow-latency 3 --hedge-budget 0   # 헤지 끄고 비교
+
+시나리오 (동시 실행 수를 늘려 가며):
+  - analyze_sentence (기본 / 병렬 / 캐시 적중), answer_followup
+  - highlight_diff (CPU만 사용)
+  - 리포트 아웃박스: enqueue → 가짜 n8n 전송 완료까지
+  - app.py 전체 rerun (Streamlit AppTest): 세션별 rerun 지연시간과 세션당 메모리
+
+결과: 처리량(req/s), p50/p95/p99 지연시간(ms), 실패 수, (AppTest) 세션당 메모리(KB)
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import coach_core  # noqa: E402
+import diff_engine  # noqa: E402
+from metrics import percentile  # noqa: E402
+from fake_servers import FakeOpenAIServer, FakeWebhookServer  # noqa: E402
+
+APP_PATH = os.path.join(os.path.dirname(__file__), "..", "app.py")
+
+SENTENCES = [
+    "She go to school yesterday.",
+    "He don't like apples.",
+    "I have seen him yesterday.",
+    "They was very happy at the party.",
+    "My brother play soccer every weekend.",
+    "We goes to the library after class.",
+    "She can sings very well.",
+    "I am agree with you.",
+]
+QUESTIONS = [
+    "왜 go 대신 went를 쓰나요?",
+    "현재완료는 언제 쓰나요?",
+    "does와 do는 어떻게 구분하나요?",
+]
+
+
+def run_load(fn, inputs: list, concurrency: int) -> dict:
+    """inputs를 concurrency개 스레드로 처리하면서 건별 지연시간과 실패를 잰다."""
+    latencies, errors = [], []
+
+    def one(arg):
+        t0 = time.perf_counter()
+        try:
+            fn(arg)
+        except Exception as e:
+            errors.append(type(e).__name__)
+            return
+        latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, inputs))
+    elapsed = time.perf_counter() - started
+
+    values = sorted(latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": len(inputs),
+        "errors": len(errors),
+        "error_types": sorted(set(errors)),
+        "throughput_rps": len(values) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(values, 0.50) * 1000,
+        "p95_ms": percentile(values, 0.95) * 1000,
+        "p99_ms": percentile(values, 0.99) * 1000,
+    }
+
+
+def bench_outbox(n_reports: int, timeout: float = 120.0) -> dict:
+    """리포트 n개를 한꺼번에 넣고, 가짜 n8n에 모두 전송될 때까지 걸린 시간."""
+    outbox = coach_core.get_report_outbox()
+    before = outbox.stats()["delivered"]
+    started = time.perf_counter()
+    for i in range(n_reports):
+        outbox.enqueue({"session_id": f"bench-{i}", "sentence": SENTENCES[i % len(SENTENCES)],
+                        "score": i % 7, "followup_qa": []})
+    enqueue_ms = (time.perf_counter() - started) * 1000 / max(1, n_reports)
+    while outbox.stats()["delivered"] - before < n_reports:
+        if time.perf_counter() - started > timeout:
+            break
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    stats = outbox.stats()
+    delivered = stats["delivered"] - before
+    return {
+        "reports": n_reports,
+        "delivered": delivered,
+        "enqueue_ms": enqueue_ms,
+        "throughput_rps": delivered / elapsed if elapsed else 0.0,
+        "delivery_p95_ms": stats["delivery_latency"]["p95_ms"],
+        "dead_letters": stats["dead_letters"],
+    }
+
+
+def _find(widgets, label):
+    for w in widgets:
+        if w.label == label:
+            return w
+    raise LookupError(f"위젯을 찾지 못했습니다: {label}")
+
+
+def bench_apptest(n_sessions: int, secrets: dict, timeout: float = 120.0, idle_reruns: int = 5) -> dict:
+    """
+    AppTest로 app.py를 세션 n개만큼 실제로 실행 (등록 → 문장 분석 → 추가 질문).
+    세션 객체를 모두 붙잡아 둔 채 tracemalloc으로 늘어난 메모리를 재서 세션당 메모리를 낸다.
+    마지막으로 모든 세션을 돌아가며 idle_reruns번씩 설명 난이도만 바꿔 rerun해서
+    LLM 호출 없는 rerun 시간(idle)이 세션 수에 따라 늘지 않는지 본다.
+    """
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return {"skipped": "streamlit이 설치되어 있지 않습니다."}
+
+    reruns = {"initial": [], "register": [], "analyze": [], "followup": [], "idle": []}
+    failures = []
+    sessions = []
+
+    def timed_run(at, step):
+        t0 = time.perf_counter()
+        at.run(timeout=timeout)
+        reruns[step].append(time.perf_counter() - t0)
+        if at.exception:
+            failures.append(f"{step}: {at.exception[0].value}")
+
+    tracemalloc.start()
+    base_mem = tracemalloc.get_traced_memory()[0]
+    for i in range(n_sessions):
+        at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        for key, value in secrets.items():
+            at.secrets[key] = value
+        timed_run(at, "initial")
+
+        at.sidebar.text_input[0].input(f"bench{i}")
+        at.sidebar.text_input[1].input("1234")
+        _find(at.sidebar.button, "등록").click()
+        timed_run(at, "register")
+
+        at.text_area[0].input(SENTENCES[i % len(SENTENCES)])
+        _find(at.button, "분석하기").click()
+        timed_run(at, "analyze")
+
+        if any(w.label == "질문 보내기" for w in at.button):
+            _find(at.text_area, "추가 질문 입력").input(QUESTIONS[i % len(QUESTIONS)])
+            _find(at.button, "질문 보내기").click()
+            timed_run(at, "followup")
+        sessions.append(at)
+    used = tracemalloc.get_traced_memory()[0] - base_mem
+    tracemalloc.stop()
+
+    levels = ["초급", "중급", "고급"]
+    for r in range(idle_reruns):
+        for at in sessions:
+            at.sidebar.selectbox[0].select(levels[r % len(levels)])
+            timed_run(at, "idle")
+
+    result = {"sessions": n_sessions, "failures": failures[:5],
+              "memory_per_session_kb": used / 1024 / max(1, n_sessions)}
+    for step, values in reruns.items():
+        values.sort()
+        result[f"{step}_p50_ms"] = percentile(values, 0.50) * 1000
+        result[f"{step}_p95_ms"] = percentile(values, 0.95) * 1000
+    return result
+
+
+def print_rows(title: str, rows: list):
+    print(f"\n[{title}]")
+    print(f"{'동시성':>6}{'요청':>7}{'실패':>6}{'req/s':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    for r in rows:
+        print(f"{r['concurrency']:>6}{r['requests']:>7}{r['errors']:>6}{r['throughput_rps']:>10.1f}"
+              f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="가짜 OpenAI/n8n 서버를 상대로 한 오프라인 부하 테스트")
+    parser.add_argument("--concurrency", default="1,4,16", help="쉼표로 구분한 동시 실행 수 목록")
+    parser.add_argument("--requests", type=int, default=32, help="동시성 단계마다 보낼 요청 수")
+    parser.add_argument("--latency", type=float, default=0.2, help="가짜 LLM 첫 토큰 지연(초)")
+    parser.add_argument("--tokens-per-sec", type=float, default=400.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="500 응답 비율")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="429 응답 비율")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="첫 토큰이 유난히 늦는 요청 비율")
+    parser.add_argument("--slow-latency", type=float, default=3.0, help="느린 요청의 첫 토큰 지연(초)")
+    parser.add_argument("--hedge-budget", type=float, default=None,
+                        help="HEDGE_BUDGET_RATIO (0이면 헤지 끔, 생략하면 설정값)")
+    parser.add_argument("--webhook-latency", type=float, default=0.02)
+    parser.add_argument("--reports", type=int, default=200, help="아웃박스 시나리오 리포트 수")
+    parser.add_argument("--sessions", type=int, default=5, help="AppTest 세션 수 (0이면 생략)")
+    parser.add_argument("--idle-reruns", type=int, default=5, help="AppTest 세션마다 LLM 호출 없이 rerun할 횟수")
+    parser.add_argument("--json", default="", help="결과를 저장할 JSON 파일 경로")
+    args = parser.parse_args()
+
+    levels = [int(x) for x in args.concurrency.split(",") if x.strip()]
+    llm = FakeOpenAIServer(latency=args.latency, tokens_per_sec=args.tokens_per_sec,
+                           error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                           slow_rate=args.slow_rate, slow_latency=args.slow_latency).start()
+    hook = FakeWebhookServer(latency=args.webhook_latency).start()
+    workdir = tempfile.mkdtemp(prefix="grammar-coach-bench-")
+
+    overrides = {
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_BASE_URL": llm.base_url,
+        "N8N_WEBHOOK_URL": hook.url,
+        "ANALYSIS_CACHE_PATH": os.path.join(workdir, "analysis_cache.sqlite3"),
+        "REPORT_OUTBOX_PATH": os.path.join(workdir, "report_outbox.sqlite3"),
+        "QUIZ_BANK_PATH": os.path.join(workdir, "quiz_bank.sqlite3"),
+        "LEARNER_DB_PATH": os.path.join(workdir, "learner_history.sqlite3"),
+        "SESSION_DB_PATH": os.path.join(workdir, "sessions.sqlite3"),
+    }
+    settings = coach_core.load_settings()
+    settings.update(overrides)
+    if args.hedge_budget is not None:
+        settings["HEDGE_BUDGET_RATIO"] = args.hedge_budget
+    coach_core.configure(settings)
+
+    rng = random.Random(7)
+    results = {"config": vars(args), "scenarios": {}}
+
+    def scenario(name, fn, make_input):
+        rows = []
+        for c in levels:
+            inputs = [make_input(i) for i in range(args.requests)]
+            rows.append(run_load(fn, inputs, c))
+        results["scenarios"][name] = rows
+        print_rows(name, rows)
+
+    level_labels = ["초급", "중급", "고급"]
+    scenario(
+        "analyze_sentence (캐시 없음)",
+        lambda a: coach_core.analyze_sentence(a[0], a[1], use_cache=False),
+        lambda i: (SENTENCES[i % len(SENTENCES)], level_labels[i % 3]),
+    )
+    scenario(
+        "analyze_sentence_parallel (캐시 없음)",
+        lambda a: coach_core.analyze_sentence_parallel(a[0], a[1], use_cache=False),
+        lambda i: (SENTENCES[i % len(SENTENCES)], level_labels[i % 3]),
+    )
+    for s in SENTENCES:
+        coach_core.analyze_sentence(s, "중급")
+    scenario(
+        "analyze_sentence (캐시 적중)",
+        lambda a: coach_core.analyze_sentence(a, "중급"),
+        lambda i: SENTENCES[i % len(SENTENCES)],
+    )
+    scenario(
+        "answer_followup (캐시 없음)",
+        lambda a: coach_core.answer_followup(a[0], a[1], a[1], "중급", use_cache=False),
+        lambda i: (QUESTIONS[i % len(QUESTIONS)], SENTENCES[i % len(SENTENCES)]),
+    )
+
+    essay_words = " ".join(rng.choice(SENTENCES) for _ in range(150))
+    essay_pair = (essay_words, essay_words.replace(" go ", " went ").replace(" don't ", " doesn't "))
+
+    def diff_once(pair):
+        diff_engine.highlight_diff.__wrapped__(*pair)
+
+    scenario("highlight_diff (문장, 메모이즈 없이)", diff_once,
+             lambda i: (SENTENCES[i % len(SENTENCES)], SENTENCES[(i + 1) % len(SENTENCES)]))
+    scenario("highlight_diff (에세이 ~1,000단어)", diff_once, lambda i: essay_pair)
+
+    outbox = bench_outbox(args.reports)
+    results["scenarios"]["report_outbox"] = outbox
+    print(f"\n[리포트 아웃박스 → 가짜 n8n]\n  {outbox['delivered']}/{outbox['reports']}건 전송 · "
+          f"enqueue {outbox['enqueue_ms']:.2f}ms/건 · {outbox['throughput_rps']:.1f} 건/s · "
+          f"전송 지연 p95 {outbox['delivery_p95_ms']:.0f}ms · dead-letter {outbox['dead_letters']}")
+
+    if args.sessions:
+        secrets = dict(overrides)
+        app = bench_apptest(args.sessions, secrets, idle_reruns=args.idle_reruns)
+        results["scenarios"]["apptest"] = app
+        print("\n[app.py 전체 rerun (AppTest)]")
+        for key, value in app.items():
+            print(f"  {key}: {value:.1f}" if isinstance(value, float) else f"  {key}: {value}")
+
+    results["fake_llm"] = dict(llm.counters)
+    results["fake_webhook"] = dict(hook.counters)
+    results["usage"] = coach_core.usage_totals()
+    hedging = coach_core.hedging_stats()
+    results["hedging"] = {k: v for k, v in hedging.items() if k != "limits"}
+    print(f"\n가짜 LLM 요청 {llm.counters['requests']}건 (주입 오류 {llm.counters['errors_injected']}, "
+          f"느린 응답 {llm.counters['slow_injected']}) · 헤지 {hedging['hedged']}회 "
+          f"(이김 {hedging['hedge_wins']}, 예산 초과 {hedging['denied']}) · "
+          f"웹훅 {hook.counters['requests']}건 {hook.counters['bytes']:,} bytes")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    coach_core.get_report_outbox().stop()
+    llm.stop()
+    hook.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+벤치마크용 로컬 가짜 서버 (표준 라이브러리만 사용)
+
+- FakeOpenAIServer: OpenAI 호환 POST /v1/chat/completions
+  · response_format의 JSON 스키마를 보고 스키마에 맞는 JSON을 만들어 돌려줌
+    (GrammarCoachOutput / 병렬 분석용 부분 스키마 모두)
+  · response_format이 없으면(추가 질문) 한국어 텍스트 답변
+  · stream=True면 SSE chunk로, include_usage면 마지막에 usage chunk
+  · corrected_sentence는 precheck 규칙 검사기의 교정 결과
+  · 첫 토큰까지 지연(latency), 초당 토큰 수(tokens_per_sec), 오류 주입(error_rate / rate_limit_rate)
+- FakeWebhookServer: n8n 웹훅 대신 받기만 하는 서버 (요청 수 / 바이트 수 / 실패 주입)
+
+    python benchmarks/fake_servers.py --port 18080     # 단독 실행 (app.py를 OPENAI_BASE_URL로 연결)
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from precheck import precheck_sentence  # noqa: E402
+
+_SENTENCE_RE = re.compile(r"Learner sentence:\s*(.+)")
+_CORRECTED_RE = re.compile(r"Corrected sentence:\s*(.+)")
+
+
+def build_from_schema(node: dict, ctx: dict, path: str = ""):
+    """JSON 스키마(코치가 쓰는 부분집합)를 만족하는 값을 하나 만든다."""
+    kind = node.get("type")
+    if kind == "object":
+        obj = {
+            key: build_from_schema(sub, ctx, key)
+            for key, sub in node.get("properties", {}).items()
+        }
+        if obj.get("options") and "answer" in obj:
+            obj["answer"] = ctx["rng"].choice(obj["options"])  # 객관식 정답은 보기 중 하나
+        return obj
+    if kind == "array":
+        count = max(node.get("minItems", 0), 1 if path in ("explanations", "better_alternatives") else 0)
+        if path == "options":
+            count = 4
+        items = []
+        for i in range(count):
+            ctx["index"] = i + 1
+            items.append(build_from_schema(node.get("items", {}), ctx, path))
+        return items
+    if kind == "integer":
+        return ctx.get("index", 1)
+    if "enum" in node:
+        return ctx["rng"].choice(node["enum"])
+    if path == "corrected_sentence":
+        return ctx["corrected"]
+    if path == "id":
+        return f"q{ctx.get('index', 1)}"
+    if path == "type":
+        return "mcq"
+    if path == "focus" and ctx.get("focuses"):
+        return ctx["focuses"][(ctx.get("index", 1) - 1) % len(ctx["focuses"])]
+    return ctx["rng"].choice(ctx["phrases"])
+
+
+PHRASES = [
+    "과거를 나타내는 부사(yesterday)가 있으므로 동사를 과거형으로 바꿔야 합니다.",
+    "She went to school yesterday.",
+    "주어가 3인칭 단수이면 현재형 동사에 -s를 붙입니다.",
+    "went",
+    "Use the simple past for finished actions at a specific time.",
+]
+
+FOLLOWUP_ANSWER = (
+    "좋은 질문이에요. yesterday처럼 이미 끝난 과거 시점을 말할 때는 동사를 과거형으로 씁니다. "
+    "그래서 go가 아니라 went를 써야 자연스럽습니다. 예: I went to the park yesterday. "
+    "현재 습관을 말할 때만 go / goes를 씁니다."
+)
+
+
+class FakeOpenAIServer:
+    def __init__(self, port: int = 0, latency: float = 0.3, tokens_per_sec: float = 200.0,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, slow_rate: float = 0.0,
+                 slow_latency: float = 5.0, seed: int = 0):
+        """
+        latency: 요청을 받고 첫 토큰까지의 지연(초)
+        slow_rate / slow_latency: 이 확률로 첫 토큰 지연을 slow_latency초로 (꼬리 지연 흉내)
+        tokens_per_sec: 출력 속도 (토큰 ≈ 4글자). 0이면 지연 없이 한 번에
+        error_rate / rate_limit_rate: 500 / 429(Retry-After: 0)를 돌려줄 확률
+        """
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "streams": 0, "errors_injected": 0, "slow_injected": 0}
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _roll(self):
+        with self._lock:
+            self.counters["requests"] += 1
+            r = self._rng.random()
+            if r < self.error_rate:
+                self.counters["errors_injected"] += 1
+                return 500
+            if r < self.error_rate + self.rate_limit_rate:
+                self.counters["errors_injected"] += 1
+                return 429
+            return 200
+
+    def _first_token_delay(self) -> float:
+        with self._lock:
+            if self._rng.random() < self.slow_rate:
+                self.counters["slow_injected"] += 1
+                return self.slow_latency
+        return self.latency
+
+    def build_content(self, body: dict) -> str:
+        user_text = "\n".join(
+            m.get("content", "") for m in body.get("messages", []) if m.get("role") == "user"
+        )
+        fmt = body.get("response_format") or {}
+        if fmt.get("type") != "json_schema":
+            return FOLLOWUP_ANSWER
+        # 교정문/설명 주제는 로컬 규칙 검사기로 그럴듯하게 (하이라이트 diff, 퀴즈 은행 태그가 실제처럼 동작하도록)
+        m = _SENTENCE_RE.search(user_text)
+        pre = precheck_sentence(m.group(1).strip()) if m else None
+        focuses = [issue.focus for issue in pre.issues] if pre else []
+        m = _CORRECTED_RE.search(user_text)
+        if m:
+            corrected = m.group(1).strip()
+        else:
+            corrected = pre.corrected if pre else "She went home."
+        with self._lock:
+            rng = random.Random(self._rng.random())
+        ctx = {"rng": rng, "phrases": PHRASES, "corrected": corrected, "focuses": focuses}
+        payload = build_from_schema(fmt["json_schema"]["schema"], ctx)
+        return json.dumps(payload, ensure_ascii=False)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, obj: dict, headers: dict = None):
+                data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+
+                status = server._roll()
+                if status != 200:
+                    self._send_json(
+                        status,
+                        {"error": {"message": "injected error", "type": "server_error"}},
+                        {"Retry-After": "0"} if status == 429 else None,
+                    )
+                    return
+
+                content = server.build_content(body)
+                prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", [])) // 4
+                completion_tokens = max(1, len(content) // 4)
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                    # 고정 system 프롬프트 부분은 prefix 캐시에 걸렸다고 가정
+                    "prompt_tokens_details": {"cached_tokens": (prompt_tokens // 2 // 128) * 128},
+                }
+                time.sleep(server._first_token_delay())
+                if body.get("stream"):
+                    with server._lock:
+                        server.counters["streams"] += 1
+                    self._stream(body, content, usage)
+                else:
+                    if server.tokens_per_sec:
+                        time.sleep(completion_tokens / server.tokens_per_sec)
+                    self._send_json(200, {
+                        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model", "fake"),
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": content},
+                            "finish_reason": "stop",
+                        }],
+                        "usage": usage,
+                    })
+
+            def _stream(self, body: dict, content: str, usage: dict):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                base = {
+                    "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                }
+
+                def send(obj):
+                    data = f"data: {json.dumps(obj, ensure_ascii=False)}\n\n".encode("utf-8")
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+
+                piece = 16  # 한 chunk ≈ 4토큰
+                delay = (piece / 4) / server.tokens_per_sec if server.tokens_per_sec else 0
+                for i in range(0, len(content), piece):
+                    send(dict(base, choices=[{
+                        "index": 0,
+                        "delta": {"content": content[i:i + piece]},
+                        "finish_reason": None,
+                    }]))
+                    if delay:
+                        time.sleep(delay)
+                send(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    send(dict(base, choices=[], usage=usage))
+                data = b"data: [DONE]\n\n"
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+class FakeWebhookServer:
+    def __init__(self, port: int = 0, latency: float = 0.05, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "reports": 0, "bytes": 0, "errors_injected": 0}
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/webhook/grammar-report"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length)
+                time.sleep(server.latency)
+                with server._lock:
+                    server.counters["requests"] += 1
+                    server.counters["bytes"] += len(raw)
+                    fail = server._rng.random() < server.error_rate
+                    if fail:
+                        server.counters["errors_injected"] += 1
+                if not fail:
+                    if self.headers.get("Content-Encoding") == "gzip":
+                        raw = gzip.decompress(raw)
+                    body = json.loads(raw or b"{}")
+                    with server._lock:
+                        server.counters["reports"] += len(body) if isinstance(body, list) else 1
+                status = 503 if fail else 200
+                data = b'{"ok": false}' if fail else b'{"ok": true}'
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="로컬 가짜 OpenAI / n8n 서버")
+    parser.add_argument("--port", type=int, default=18080, help="OpenAI 호환 서버 포트")
+    parser.add_argument("--webhook-port", type=int, default=18081)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    llm = FakeOpenAIServer(args.port, args.latency, args.tokens_per_sec,
+                           args.error_rate, args.rate_limit_rate).start()
+    hook = FakeWebhookServer(args.webhook_port).start()
+    print(f"OPENAI_BASE_URL={llm.base_url}")
+    print(f"N8N_WEBHOOK_URL={hook.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        llm.stop()
+        hook.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2086 @@
+"""
+AI Grammar Coach 핵심 로직 (Streamlit 없이 import 가능)
+
+- 설정 로드 (Streamlit secrets -> .env -> os.environ)
+- 구조화 출력 스키마 / 프롬프트
+- OpenAI 호출 (기본 / 스트리밍 / 병렬 분석, 추가 질문 답변 + 답변 캐시)
+- 응답 구간별 검사 + 망가진 구간만 다시 생성 (section_repair.py)
+- 퀴즈 은행: 생성된 퀴즈를 주제별로 모아 두고 다시 사용 (quiz_bank.py)
+- 학습 기록 저장소: 분석/채점/질문 기록과 학습자·반별 집계 (learner_store.py)
+- 교정 전후 하이라이트 diff (diff_engine.py)
+- 같은 분석이 동시에 여러 번 요청되면 한 번만 호출 (single_flight.py)
+- 최근 지연시간 기반 적응형 타임아웃 + 느린 호출에 헤지 요청 (hedging.py)
+- RPM/TPM 한도 안에서 학습자/반별로 공정하게 호출 순서를 정하는 입장 스케줄러 (scheduler.py)
+- asyncio 버전 분석/추가 질문 (AsyncOpenAI, api_server.py에서 사용)
+
+app.py(Streamlit UI), batch_analyze.py(CLI), api_server.py(HTTP API)가 함께 사용한다.
+"""
+import asyncio, contextvars, copy, os, json, threading, time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from analysis_cache import AnalysisCache, make_cache_key, make_cache_scope, prompt_fingerprint
+from followup_cache import FollowupCache, make_followup_scope
+from quiz_bank import QuizBank, bank_items
+from learner_store import LearnerStore
+from session_store import ResultStore, SessionStore
+from precheck import precheck_sentence
+from near_dup import NearDuplicateIndex
+from stream_json import StreamingObjectParser
+from schema_validate import slice_object_schema
+from section_repair import RepairPlan, SectionValidators, salvage_json
+from resilience import CircuitBreaker, ResilientCaller
+from report_outbox import ReportOutbox
+from metrics import REGISTRY, MetricsExporter, percentile
+from model_router import RoutingLog, check_analysis, escalation_reason
+from single_flight import AsyncSingleFlight, LeaderCancelled, SingleFlight
+from hedging import HedgeBudget, Hedger, LatencyTracker
+from scheduler import (
+    PRIORITY_ANALYSIS, PRIORITY_INTERACTIVE, FairScheduler, Requester, estimate_tokens,
+)
+
+# ---------------------------
+# 1) 설정 로드: (Streamlit secrets) -> .env -> os.environ
+# ---------------------------
+DEFAULT_MODEL = "gpt-4.1-mini"
+
+
+def load_setting(name: str, default: str = "", secrets=None) -> str:
+    """secrets(st.secrets 등 .get()이 있는 객체)에 있으면 그 값을, 없으면 환경변수를 사용."""
+    value = None
+    if secrets is not None:
+        try:
+            value = secrets.get(name, None)
+        except Exception:
+            value = None
+    if not value:
+        value = os.environ.get(name, default)
+    return value
+
+
+def load_settings(secrets=None) -> dict:
+    """앱/CLI에서 쓰는 설정을 한 번에 읽어 dict로 반환."""
+    try:
+        from dotenv import load_dotenv, find_dotenv
+        load_dotenv(find_dotenv(usecwd=True))
+    except Exception:
+        pass
+
+    return {
+        "OPENAI_API_KEY": load_setting("OPENAI_API_KEY", "", secrets),
+        "OPENAI_MODEL": load_setting("OPENAI_MODEL", DEFAULT_MODEL, secrets),
+        # 모델 캐스케이드: 분석을 이 (싼/빠른) 모델로 먼저 하고, 검사 실패나 아래 문장 난이도면
+        # OPENAI_MODEL로 다시 요청 (비우면 캐스케이드 없이 OPENAI_MODEL만 사용)
+        "OPENAI_CHEAP_MODEL": load_setting("OPENAI_CHEAP_MODEL", "", secrets).strip(),
+        "CASCADE_ESCALATE_LEVELS": tuple(
+            x.strip() for x in load_setting("CASCADE_ESCALATE_LEVELS", "advanced", secrets).split(",")
+            if x.strip()
+        ),
+        # OpenAI 호환 서버 주소 (비우면 기본 api.openai.com; 벤치마크용 가짜 서버 등)
+        "OPENAI_BASE_URL": load_setting("OPENAI_BASE_URL", "", secrets),
+        # N8N_WEBHOOK_URL 로드 직후 보정
+        "N8N_WEBHOOK_URL": (load_setting("N8N_WEBHOOK_URL", "", secrets) or "").strip(),
+        # 분석 결과 캐시 (SQLite 파일 경로 / 유효기간(초))
+        "ANALYSIS_CACHE_PATH": load_setting(
+            "ANALYSIS_CACHE_PATH", ".cache/analysis_cache.sqlite3", secrets
+        ),
+        "ANALYSIS_CACHE_TTL": int(load_setting("ANALYSIS_CACHE_TTL", str(7 * 24 * 3600), secrets)),
+        # 거의 같은 문장 재사용 허용 거리 (0이면 정규화 후 완전 일치만, 0보다 커도 단어가 다르면 재사용 안 함)
+        "NEAR_DUP_MAX_DISTANCE": float(load_setting("NEAR_DUP_MAX_DISTANCE", "0", secrets)),
+        # 추가 질문 답변 캐시: 비슷한 질문으로 볼 최소 유사도
+        # (1이면 정규화 후 완전 일치만, 낮추면 영어 단어/내용어가 같은 질문끼리만 비교 — 0.7 이상 권장)
+        "FOLLOWUP_MIN_SIMILARITY": float(load_setting("FOLLOWUP_MIN_SIMILARITY", "1", secrets)),
+        # 추가 질문 답변 캐시에 들고 있을 최대 질문 수 (넘으면 가장 오래 안 쓴 것부터 지움)
+        "FOLLOWUP_CACHE_MAX_ENTRIES": int(load_setting("FOLLOWUP_CACHE_MAX_ENTRIES", "20000", secrets)),
+        # 퀴즈 은행 (SQLite 경로 / 은행에서 꺼낼 최소 문항 수(0이면 재사용 안 함) / 그래도 모델에게 받을 문항 수)
+        "QUIZ_BANK_PATH": load_setting("QUIZ_BANK_PATH", ".cache/quiz_bank.sqlite3", secrets),
+        "QUIZ_BANK_MIN_ITEMS": int(load_setting("QUIZ_BANK_MIN_ITEMS", "4", secrets)),
+        "QUIZ_BANK_MODEL_ITEMS": int(load_setting("QUIZ_BANK_MODEL_ITEMS", "2", secrets)),
+        # 학습 기록 저장소 (SQLite 경로, 비우면 메모리에만) / 학습자 기본 반(class)
+        "LEARNER_DB_PATH": load_setting("LEARNER_DB_PATH", ".cache/learner_history.sqlite3", secrets),
+        "DEFAULT_CLASS_ID": load_setting("DEFAULT_CLASS_ID", "default", secrets).strip() or "default",
+        # 세션 저장소 (SQLite 경로, 비우면 메모리에만 / 메모리에 둘 최대 세션 수 / 유휴 세션을 내보낼 시간(초)
+        #  / 메모리에 둘 최대 분석 결과 수)
+        "SESSION_DB_PATH": load_setting("SESSION_DB_PATH", ".cache/sessions.sqlite3", secrets),
+        "SESSION_MAX_HOT": int(load_setting("SESSION_MAX_HOT", "500", secrets)),
+        "SESSION_IDLE_SECONDS": float(load_setting("SESSION_IDLE_SECONDS", "900", secrets)),
+        "RESULT_CACHE_MAX_HOT": int(load_setting("RESULT_CACHE_MAX_HOT", "2000", secrets)),
+        # 에세이 모드에서 동시에 분석할 최대 문장 수
+        "ESSAY_CONCURRENCY": int(load_setting("ESSAY_CONCURRENCY", "4", secrets)),
+        # n8n 리포트 아웃박스 (전송 대기열 SQLite 경로 / 묶음 크기 / gzip 여부)
+        "REPORT_OUTBOX_PATH": load_setting("REPORT_OUTBOX_PATH", ".cache/report_outbox.sqlite3", secrets),
+        "N8N_BATCH_SIZE": int(load_setting("N8N_BATCH_SIZE", "1", secrets)),
+        "N8N_GZIP": str(load_setting("N8N_GZIP", "", secrets)).lower() in ("1", "true", "yes"),
+        # 로컬 사전 검사가 "오류 없음"을 이 신뢰도 이상으로 판단하면 LLM 호출 생략 (1 초과면 항상 호출)
+        # 기본은 끔: 규칙이 못 보는 오류를 "오류 없음"으로 보여 주지 않도록, 실제 학습자 문장으로 검증한 뒤에 켬
+        "PRECHECK_SKIP_CONFIDENCE": float(load_setting("PRECHECK_SKIP_CONFIDENCE", "1.01", secrets)),
+        # 지표 내보내기: Prometheus /metrics 포트 (0이면 끔) / JSONL 파일 경로와 기록 주기(초)
+        "METRICS_PORT": int(load_setting("METRICS_PORT", "0", secrets)),
+        "METRICS_JSONL_PATH": load_setting("METRICS_JSONL_PATH", "", secrets),
+        "METRICS_JSONL_INTERVAL": float(load_setting("METRICS_JSONL_INTERVAL", "60", secrets)),
+        # HTTP API (api_server.py): 동시에 처리할 최대 요청 수(넘으면 503) / 요청 1건의 제한 시간(초)
+        #  / OpenAI 호출 1건의 제한 시간(초) / OpenAI keep-alive 연결 풀 크기
+        "API_MAX_INFLIGHT": int(load_setting("API_MAX_INFLIGHT", "256", secrets)),
+        "API_REQUEST_TIMEOUT": float(load_setting("API_REQUEST_TIMEOUT", "90", secrets)),
+        "OPENAI_TIMEOUT": float(load_setting("OPENAI_TIMEOUT", "30", secrets)),
+        "OPENAI_MAX_CONNECTIONS": int(load_setting("OPENAI_MAX_CONNECTIONS", "100", secrets)),
+        # 적응형 타임아웃 / 헤지 요청 (hedging.py): OpenAI 호출 타임아웃 = 최근 p99 × 배수
+        #  (OPENAI_TIMEOUT_MIN ~ OPENAI_TIMEOUT 사이, 배수 0이면 항상 OPENAI_TIMEOUT)
+        #  / 이 분위수 시간이 지나도 응답이 없으면 같은 요청을 하나 더 보냄
+        #  / 추가 요청 예산 (전체 호출 대비 비율, 0이면 헤지 안 함) / 적응형으로 바꾸기 전 최소 표본 수
+        "ADAPTIVE_TIMEOUT_MULTIPLIER": float(load_setting("ADAPTIVE_TIMEOUT_MULTIPLIER", "3", secrets)),
+        "OPENAI_TIMEOUT_MIN": float(load_setting("OPENAI_TIMEOUT_MIN", "5", secrets)),
+        "HEDGE_QUANTILE": float(load_setting("HEDGE_QUANTILE", "0.95", secrets)),
+        "HEDGE_BUDGET_RATIO": float(load_setting("HEDGE_BUDGET_RATIO", "0.05", secrets)),
+        "HEDGE_MIN_SAMPLES": int(load_setting("HEDGE_MIN_SAMPLES", "20", secrets)),
+        # 입장 스케줄러 (scheduler.py): OpenAI 분당 요청 수 / 토큰 수 한도 (기본 0 = 제한 없음,
+        #  계정의 실제 한도에 맞춰 켬) / 한꺼번에 쓸 수 있는 양(초 단위 분량) / 학습자 한 명이 동시에 기다릴 수 있는 요청 수
+        #  / 이보다 오래 기다리면 "잠시 후 다시 시도" (초)
+        "OPENAI_RPM": float(load_setting("OPENAI_RPM", "0", secrets)),
+        "OPENAI_TPM": float(load_setting("OPENAI_TPM", "0", secrets)),
+        "SCHEDULER_BURST_SECONDS": float(load_setting("SCHEDULER_BURST_SECONDS", "10", secrets)),
+        "SCHEDULER_MAX_QUEUED": int(load_setting("SCHEDULER_MAX_QUEUED", "3", secrets)),
+        "SCHEDULER_MAX_WAIT": float(load_setting("SCHEDULER_MAX_WAIT", "60", secrets)),
+        # 화면 하단에 rerun 소요시간 등 성능 지표 표시 여부
+        "SHOW_PERF_STATS": str(load_setting("SHOW_PERF_STATS", "", secrets)).lower() in ("1", "true", "yes"),
+    }
+
+
+# configure()로 채워지는 프로세스 전역 상태
+# (Streamlit은 rerun마다 app.py만 다시 실행하고 이 모듈은 다시 import하지 않으므로 유지됨)
+SETTINGS = {}
+_client = None
+_async_client = None
+_http_session = None
+_analysis_cache = None
+_near_dup_index = None
+_followup_cache = None
+_quiz_bank = None
+_learner_store = None
+_result_store = None
+_session_store = None
+_report_outbox = None
+_metrics_exporter = None
+_hedger = None
+_scheduler = None
+_state_lock = threading.Lock()
+_usage_totals = {
+    "calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "total_tokens": 0,
+}
+_usage_log = deque(maxlen=2000)  # 호출별 기록 (최근 2000건)
+
+
+def configure(settings: dict):
+    """설정을 적용. 값이 바뀐 경우에만 클라이언트/캐시를 새로 만든다."""
+    global SETTINGS, _client, _async_client, _analysis_cache, _near_dup_index, _followup_cache, _report_outbox
+    global _metrics_exporter, _quiz_bank, _learner_store, _result_store, _session_store, _hedger
+    global _scheduler
+    with _state_lock:
+        if settings == SETTINGS:
+            return
+        SETTINGS = dict(settings)
+        _client = None
+        _async_client = None
+        if _analysis_cache is not None:
+            _analysis_cache.flush()
+        _analysis_cache = None
+        _near_dup_index = None
+        _followup_cache = None
+        _quiz_bank = None
+        _learner_store = None
+        _result_store = None
+        _session_store = None
+        if _report_outbox is not None:
+            _report_outbox.stop()
+            _report_outbox = None
+        if _metrics_exporter is not None:
+            _metrics_exporter.stop()
+            _metrics_exporter = None
+        if _hedger is not None:
+            _hedger.shutdown()
+            _hedger = None
+        _scheduler = None
+
+
+def _ensure_configured():
+    if not SETTINGS:
+        configure(load_settings())
+
+
+def get_model() -> str:
+    _ensure_configured()
+    return SETTINGS.get("OPENAI_MODEL") or DEFAULT_MODEL
+
+
+def get_client():
+    """OpenAI 클라이언트 (프로세스당 1개, 처음 쓸 때 생성)."""
+    global _client
+    _ensure_configured()
+    with _state_lock:
+        if _client is None:
+            from openai import OpenAI
+            from openai import DefaultHttpxClient
+            import httpx
+            # 재시도는 아래 ResilientCaller가 담당하므로 SDK 자체 재시도는 끔
+            # 여러 세션이 같은 keep-alive 연결 풀을 재사용하도록 풀 크기를 넉넉히
+            _client = OpenAI(
+                api_key=SETTINGS.get("OPENAI_API_KEY"),
+                base_url=SETTINGS.get("OPENAI_BASE_URL") or None,
+                timeout=SETTINGS.get("OPENAI_TIMEOUT", 30),
+                max_retries=0,
+                http_client=DefaultHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=SETTINGS.get("OPENAI_MAX_CONNECTIONS", 100),
+                        max_keepalive_connections=20,
+                    ),
+                ),
+            )
+        return _client
+
+
+def get_async_client():
+    """
+    AsyncOpenAI 클라이언트 (프로세스당 1개). 한 이벤트 루프에서 여러 요청이 같은 연결 풀을 쓴다.
+    (api_server.py처럼 이벤트 루프 하나에서만 사용)
+    """
+    global _async_client
+    _ensure_configured()
+    with _state_lock:
+        if _async_client is None:
+            from openai import AsyncOpenAI
+            from openai import DefaultAsyncHttpxClient
+            import httpx
+            max_connections = SETTINGS.get("OPENAI_MAX_CONNECTIONS", 100)
+            _async_client = AsyncOpenAI(
+                api_key=SETTINGS.get("OPENAI_API_KEY"),
+                base_url=SETTINGS.get("OPENAI_BASE_URL") or None,
+                timeout=SETTINGS.get("OPENAI_TIMEOUT", 30),
+                max_retries=0,
+                http_client=DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=max_connections,
+                        max_keepalive_connections=max_connections,
+                    ),
+                ),
+            )
+        return _async_client
+
+
+def get_http_session():
+    """n8n 웹훅 등 외부 HTTP 호출용 requests.Session (keep-alive 연결 풀 공유)."""
+    global _http_session
+    with _state_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=20)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
+
+
+def get_analysis_cache() -> AnalysisCache:
+    """rerun/세션/스레드 간에 공유되는 분석 결과 캐시 (프로세스당 1개)."""
+    global _analysis_cache
+    _ensure_configured()
+    with _state_lock:
+        if _analysis_cache is None:
+            _analysis_cache = AnalysisCache(
+                db_path=SETTINGS.get("ANALYSIS_CACHE_PATH", ""),
+                ttl_seconds=SETTINGS.get("ANALYSIS_CACHE_TTL", 7 * 24 * 3600),
+            )
+        return _analysis_cache
+
+
+def _charge_attempt():
+    """업스트림 요청 1건(재시도/헤지 포함)을 입장 스케줄러에 과금 (지금 들어와 있는 입장이 있으면 그쪽으로)."""
+    admission = _admission.get()
+    if admission is not None:
+        admission[0].record(admission[1])
+    elif _scheduler is not None:
+        _scheduler.consume(1)
+
+
+# 모든 OpenAI 호출이 공유하는 재시도/서킷 브레이커 (프로세스당 1개)
+_resilient_caller = ResilientCaller(
+    max_attempts=4,
+    base_delay=0.5,
+    max_delay=20.0,
+    breaker=CircuitBreaker(error_threshold=0.5, min_calls=10, window_seconds=60, cooldown_seconds=30),
+    on_attempt=_charge_attempt,
+)
+
+
+def get_hedger() -> Hedger:
+    """
+    OpenAI 호출의 적응형 타임아웃 + 헤지 요청 (프로세스당 1개).
+    지연시간 기록은 configure()로 설정이 바뀌면 처음부터 다시 쌓는다.
+    """
+    global _hedger
+    _ensure_configured()
+    with _state_lock:
+        if _hedger is None:
+            _hedger = Hedger(
+                LatencyTracker(
+                    min_samples=SETTINGS.get("HEDGE_MIN_SAMPLES", 20),
+                    hedge_quantile=SETTINGS.get("HEDGE_QUANTILE", 0.95),
+                    timeout_multiplier=SETTINGS.get("ADAPTIVE_TIMEOUT_MULTIPLIER", 3.0),
+                    min_timeout=SETTINGS.get("OPENAI_TIMEOUT_MIN", 5.0),
+                    max_timeout=SETTINGS.get("OPENAI_TIMEOUT", 30.0),
+                ),
+                HedgeBudget(ratio=SETTINGS.get("HEDGE_BUDGET_RATIO", 0.05)),
+                max_workers=SETTINGS.get("OPENAI_MAX_CONNECTIONS", 100),
+                on_attempt=_charge_attempt,
+            )
+        return _hedger
+
+
+def _hedge_key(op: str, kwargs: dict) -> tuple:
+    """지연시간을 따로 재는 단위: (작업, 모델, 스트림 여부). 스트림은 첫 바이트까지만 잰다."""
+    return (op, kwargs.get("model", ""), bool(kwargs.get("stream")))
+
+
+def _hedge_loser_usage(op: str, kwargs: dict):
+    """헤지에서 진 쪽도 비용은 나가므로 사용량에 남김 (스트림은 바로 닫으므로 사용량을 모름)."""
+    model = kwargs.get("model", "")
+    return lambda chat: _record_usage(getattr(chat, "usage", None), f"{op}_hedged", model)
+
+
+def create_completion(op: str = "", **kwargs):
+    """
+    client.chat.completions.create()를 재시도/백오프/서킷 브레이커 + 적응형 타임아웃/헤지로 감싼 것.
+    op: 지연시간을 따로 재는 작업 이름 (_record_usage의 kind와 같은 값)
+    """
+    hedger = get_hedger()
+    key = _hedge_key(op, kwargs)
+
+    def attempt():
+        return hedger.call(
+            key, lambda timeout: get_client().chat.completions.create(timeout=timeout, **kwargs),
+            on_discard=_hedge_loser_usage(op, kwargs),
+        )
+
+    try:
+        return _resilient_caller.call(attempt)
+    except Exception as e:
+        REGISTRY.inc("llm_errors_total", model=kwargs.get("model", ""), error=type(e).__name__)
+        raise
+
+
+async def acreate_completion(op: str = "", **kwargs):
+    """create_completion()의 asyncio 버전 (재시도/서킷 브레이커/지연시간 기록은 동기 호출과 공유)."""
+    hedger = get_hedger()
+    key = _hedge_key(op, kwargs)
+
+    async def attempt():
+        return await hedger.acall(
+            key, lambda timeout: get_async_client().chat.completions.create(timeout=timeout, **kwargs),
+            on_discard=_hedge_loser_usage(op, kwargs),
+        )
+
+    try:
+        return await _resilient_caller.acall(attempt)
+    except Exception as e:
+        REGISTRY.inc("llm_errors_total", model=kwargs.get("model", ""), error=type(e).__name__)
+        raise
+
+
+def get_scheduler() -> FairScheduler:
+    """OpenAI 호출 입장 스케줄러 (프로세스당 1개, 모든 세션/스레드/이벤트 루프가 공유)."""
+    global _scheduler
+    _ensure_configured()
+    with _state_lock:
+        if _scheduler is None:
+            _scheduler = FairScheduler(
+                rpm=SETTINGS.get("OPENAI_RPM", 0),
+                tpm=SETTINGS.get("OPENAI_TPM", 0),
+                burst_seconds=SETTINGS.get("SCHEDULER_BURST_SECONDS", 10.0),
+                max_queued_per_learner=SETTINGS.get("SCHEDULER_MAX_QUEUED", 3),
+                max_wait=SETTINGS.get("SCHEDULER_MAX_WAIT", 60.0),
+            )
+        return _scheduler
+
+
+# 입장할 때 TPM에서 미리 잡아 두는 예상 출력 토큰 수 (끝나면 실제 사용량과의 차이만큼 정산)
+ANALYSIS_OUTPUT_TOKENS = 1200
+FOLLOWUP_OUTPUT_TOKENS = 400
+
+# 지금 들어와 있는 입장 (scheduler, ticket): 그 안에서 보낸 요청(_charge_attempt)과 usage(_record_usage)를
+# 반납 때 정산하도록 적음 (입장 구간에서 띄운 스레드에는 contextvars.copy_context()로 넘김)
+_admission = contextvars.ContextVar("admission", default=None)
+
+
+def _admission_args(requester, priority: int, messages: list, output_tokens: int, requests: int):
+    requester = requester or Requester()
+    if requester.priority is not None:
+        priority = requester.priority
+    return requester, priority, estimate_tokens(messages) * requests + output_tokens, requests
+
+
+@contextmanager
+def _admitted(requester, priority: int, messages: list, output_tokens: int, requests: int = 1):
+    """모델 호출 구간을 스케줄러 입장으로 감쌈 (캐시 적중 / 합쳐진 요청은 입장하지 않음)."""
+    scheduler = get_scheduler()
+    ticket = scheduler.acquire(*_admission_args(requester, priority, messages, output_tokens, requests))
+    token = _admission.set((scheduler, ticket))
+    try:
+        yield
+    finally:
+        scheduler.release(ticket)
+        _leave_admission(token)
+
+
+@asynccontextmanager
+async def _aadmitted(requester, priority: int, messages: list, output_tokens: int, requests: int = 1):
+    """_admitted()의 asyncio 버전."""
+    scheduler = get_scheduler()
+    ticket = await scheduler.aacquire(
+        *_admission_args(requester, priority, messages, output_tokens, requests)
+    )
+    token = _admission.set((scheduler, ticket))
+    try:
+        yield
+    finally:
+        scheduler.release(ticket)
+        _leave_admission(token)
+
+
+def _leave_admission(token):
+    try:
+        _admission.reset(token)
+    except ValueError:
+        # 중간에 버려진 스트림 제너레이터가 다른 컨텍스트에서 닫힘: 남은 값은 이미 반납된 입장이라
+        # 그 뒤의 usage는 record()가 바로 뺌
+        pass
+
+
+def scheduler_stats() -> dict:
+    """입장/거절/시간 초과 횟수, 우선순위별 대기열 길이, 남은 RPM/TPM (모니터링용)."""
+    return get_scheduler().stats()
+
+
+def resilience_stats() -> dict:
+    """재시도 횟수, 서킷 열림 횟수 등 (모니터링용)."""
+    return _resilient_caller.stats()
+
+
+def hedging_stats() -> dict:
+    """헤지 횟수/이긴 횟수와 (작업, 모델)별 헤지 시점/타임아웃 (모니터링용)."""
+    hedger = get_hedger()
+    stats = hedger.stats()
+    stats["limits"] = hedger.tracker.snapshot()
+    return stats
+
+
+def get_near_dup_index() -> NearDuplicateIndex:
+    """이전에 분석한 문장의 near-duplicate 색인 (분석 캐시와 같은 SQLite 파일에 저장)."""
+    global _near_dup_index
+    _ensure_configured()
+    with _state_lock:
+        if _near_dup_index is None:
+            _near_dup_index = NearDuplicateIndex(
+                db_path=SETTINGS.get("ANALYSIS_CACHE_PATH", ""),
+                max_distance=SETTINGS.get("NEAR_DUP_MAX_DISTANCE", 0.0),
+                ttl_seconds=SETTINGS.get("ANALYSIS_CACHE_TTL", 7 * 24 * 3600),
+            )
+        return _near_dup_index
+
+
+def get_followup_cache() -> FollowupCache:
+    """추가 질문 답변 캐시 (분석 캐시와 같은 SQLite 파일에 저장)."""
+    global _followup_cache
+    _ensure_configured()
+    with _state_lock:
+        if _followup_cache is None:
+            _followup_cache = FollowupCache(
+                db_path=SETTINGS.get("ANALYSIS_CACHE_PATH", ""),
+                min_similarity=SETTINGS.get("FOLLOWUP_MIN_SIMILARITY", 1.0),
+                ttl_seconds=SETTINGS.get("ANALYSIS_CACHE_TTL", 7 * 24 * 3600),
+                max_entries=SETTINGS.get("FOLLOWUP_CACHE_MAX_ENTRIES", 20000),
+            )
+        return _followup_cache
+
+
+def get_quiz_bank() -> QuizBank:
+    """주제별 퀴즈 은행 (프로세스당 1개)."""
+    global _quiz_bank
+    _ensure_configured()
+    with _state_lock:
+        if _quiz_bank is None:
+            _quiz_bank = QuizBank(db_path=SETTINGS.get("QUIZ_BANK_PATH", ""))
+        return _quiz_bank
+
+
+def get_learner_store() -> LearnerStore:
+    """학습 기록 저장소 (프로세스당 1개)."""
+    global _learner_store
+    _ensure_configured()
+    with _state_lock:
+        if _learner_store is None:
+            _learner_store = LearnerStore(db_path=SETTINGS.get("LEARNER_DB_PATH", ""))
+        return _learner_store
+
+
+def get_result_store() -> ResultStore:
+    """세션들이 함께 쓰는 분석 결과 저장소 (프로세스당 1개)."""
+    global _result_store
+    _ensure_configured()
+    with _state_lock:
+        if _result_store is None:
+            _result_store = ResultStore(
+                db_path=SETTINGS.get("SESSION_DB_PATH", ""),
+                max_hot=SETTINGS.get("RESULT_CACHE_MAX_HOT", 2000),
+            )
+        return _result_store
+
+
+def get_session_store() -> SessionStore:
+    """세션 상태 저장소 (프로세스당 1개). 재시작해도 같은 세션 id면 복원된다."""
+    global _session_store
+    _ensure_configured()
+    with _state_lock:
+        if _session_store is None:
+            _session_store = SessionStore(
+                db_path=SETTINGS.get("SESSION_DB_PATH", ""),
+                max_hot=SETTINGS.get("SESSION_MAX_HOT", 500),
+                idle_seconds=SETTINGS.get("SESSION_IDLE_SECONDS", 900),
+            )
+        return _session_store
+
+
+def get_report_outbox() -> ReportOutbox:
+    """n8n 리포트 아웃박스 (프로세스당 1개, 처음 쓸 때 전송 스레드 시작)."""
+    global _report_outbox
+    _ensure_configured()
+    with _state_lock:
+        if _report_outbox is None:
+            _report_outbox = ReportOutbox(
+                db_path=SETTINGS.get("REPORT_OUTBOX_PATH", ".cache/report_outbox.sqlite3"),
+                webhook_url=SETTINGS.get("N8N_WEBHOOK_URL", ""),
+                session_factory=get_http_session,
+                batch_size=SETTINGS.get("N8N_BATCH_SIZE", 1),
+                use_gzip=SETTINGS.get("N8N_GZIP", False),
+            )
+            _report_outbox.start()
+        return _report_outbox
+
+
+def build_report_payload(session_id: str, learner_id: str, phone4: str, level_label: str,
+                         sentence: str, result: dict, score=None, details: list = None,
+                         followup_qa: list = None) -> dict:
+    """n8n으로 보내는 학습 리포트 1건 (app.py [리포트 보내기] / api_server.py POST /v1/report)."""
+    return {
+        "session_id": session_id,
+        "learner_id": learner_id or "anonymous",
+        "phone4": phone4 or "",
+        "level": level_label,
+        "ai_level": result.get("level", "intermediate"),
+        "input_sentence": sentence,
+        "corrected_sentence": result["corrected_sentence"],
+        "score": score,
+        "details": details,
+        "followup_qa": followup_qa or [],
+        "ts": int(time.time()),
+    }
+
+
+# 모델별 100만 토큰당 가격 (USD): (입력, 캐시된 입력, 출력). 없는 모델은 비용을 세지 않음
+MODEL_PRICES_USD_PER_1M = {
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+
+
+def usage_cost_usd(usage, model: str) -> float:
+    """chat.usage 1건의 추정 비용 (가격표에 없는 모델이면 0)."""
+    price = MODEL_PRICES_USD_PER_1M.get(model)
+    if usage is None or price is None:
+        return 0.0
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+    return ((prompt_tokens - cached_tokens) * price[0] + cached_tokens * price[1]
+            + completion_tokens * price[2]) / 1_000_000
+
+
+def _record_usage(usage, kind: str = "", model: str = "", explanation_level: str = "",
+                  started: float = None):
+    """
+    chat.usage (또는 스트림 마지막 chunk의 usage)를 누적하고, 호출 1건씩 기록.
+    - cached_tokens: 제공자 쪽 prefix 캐시에서 재사용된 입력 토큰 수
+    - started: 요청 직전 time.perf_counter() 값 (주면 응답 완료까지의 지연시간을 함께 기록)
+    """
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+    record = {
+        "ts": time.time(),
+        "kind": kind,
+        "model": model,
+        "explanation_level": explanation_level,
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+        "completion_tokens": completion_tokens,
+        "latency_ms": (time.perf_counter() - started) * 1000 if started is not None else None,
+    }
+    REGISTRY.inc("llm_requests_total", kind=kind, model=model, level=explanation_level)
+    REGISTRY.inc("llm_tokens_total", prompt_tokens - cached_tokens,
+                 model=model, level=explanation_level, type="prompt")
+    REGISTRY.inc("llm_tokens_total", cached_tokens, model=model, level=explanation_level, type="cached")
+    REGISTRY.inc("llm_tokens_total", completion_tokens,
+                 model=model, level=explanation_level, type="completion")
+    if model in MODEL_PRICES_USD_PER_1M:
+        REGISTRY.inc("llm_cost_usd_total", usage_cost_usd(usage, model),
+                     model=model, level=explanation_level)
+    if started is not None:
+        REGISTRY.observe("llm_request_seconds", record["latency_ms"] / 1000, kind=kind, model=model)
+    # 요청 수는 보낼 때 _charge_attempt()가 이미 셌으므로 토큰만
+    admission = _admission.get()
+    if admission is not None:
+        admission[0].record(admission[1], 0, prompt_tokens + completion_tokens)
+    elif _scheduler is not None:
+        _scheduler.consume(0, prompt_tokens + completion_tokens)
+    with _state_lock:
+        _usage_totals["calls"] += 1
+        _usage_totals["prompt_tokens"] += prompt_tokens
+        _usage_totals["cached_tokens"] += cached_tokens
+        _usage_totals["completion_tokens"] += completion_tokens
+        _usage_totals["total_tokens"] += getattr(usage, "total_tokens", 0) or 0
+        _usage_log.append(record)
+
+
+def usage_totals() -> dict:
+    """지금까지 이 프로세스에서 사용한 토큰 합계."""
+    with _state_lock:
+        return dict(_usage_totals)
+
+
+def usage_log(limit: int = 0) -> list:
+    """최근 호출별 토큰/지연시간 기록 (오래된 것부터). limit > 0이면 마지막 limit건만."""
+    with _state_lock:
+        records = list(_usage_log)
+    return records[-limit:] if limit > 0 else records
+
+
+def usage_breakdown() -> list:
+    """
+    최근 호출 기록을 (kind, model, explanation_level)별로 묶은 요약.
+    prefix 캐시 적중률(cached_tokens / prompt_tokens)과 지연시간을 난이도/모델별로 비교할 때 사용.
+    """
+    groups = {}
+    for rec in usage_log():
+        groups.setdefault((rec["kind"], rec["model"], rec["explanation_level"]), []).append(rec)
+
+    rows = []
+    for (kind, model, level), records in sorted(groups.items()):
+        prompt = sum(r["prompt_tokens"] for r in records)
+        cached = sum(r["cached_tokens"] for r in records)
+        latencies = sorted(r["latency_ms"] for r in records if r["latency_ms"] is not None)
+        rows.append({
+            "kind": kind,
+            "model": model,
+            "explanation_level": level,
+            "calls": len(records),
+            "prompt_tokens": prompt,
+            "cached_tokens": cached,
+            "completion_tokens": sum(r["completion_tokens"] for r in records),
+            "cache_hit_ratio": cached / prompt if prompt else 0.0,
+            "p50_latency_ms": percentile(latencies, 0.50),
+            "p95_latency_ms": percentile(latencies, 0.95),
+        })
+    return rows
+
+
+def _observe_op(op: str, source: str, started: float):
+    """
+    분석/추가 질문 1건의 전체 소요시간
+    (source: cache = 캐시 재사용, llm = 모델 호출, coalesced = 진행 중이던 같은 분석의 결과를 함께 받음)
+    """
+    REGISTRY.observe("operation_seconds", time.perf_counter() - started, op=op, source=source)
+
+
+def _collect_gauges() -> list:
+    """내보낼 때만 읽는 값들 (이미 만들어진 객체만; 지표 때문에 캐시/DB를 새로 열지 않음)."""
+    gauges = []
+    for name, obj in (("analysis_cache", _analysis_cache), ("followup_cache", _followup_cache)):
+        if obj is not None:
+            stats = obj.stats()
+            gauges.append((f"{name}_hit_ratio", {}, stats["hit_ratio"]))
+            gauges.append((f"{name}_entries", {}, stats.get("entries", stats.get("memory_items", 0))))
+    if _near_dup_index is not None:
+        stats = _near_dup_index.stats()
+        gauges.append(("near_dup_hits", {"kind": "exact"}, stats["exact_hits"]))
+        gauges.append(("near_dup_hits", {"kind": "near"}, stats["near_hits"]))
+        gauges.append(("near_dup_misses", {}, stats["misses"]))
+    if _report_outbox is not None:
+        stats = _report_outbox.stats()
+        gauges.append(("n8n_outbox_queue_depth", {}, stats["queue_depth"]))
+        gauges.append(("n8n_outbox_dead_letters", {}, stats["dead_letters"]))
+    if _scheduler is not None:
+        stats = _scheduler.stats()
+        for priority, depth in stats["queued"].items():
+            gauges.append(("scheduler_queue_depth", {"priority": priority}, depth))
+        for bucket in ("rpm", "tpm"):
+            if stats[f"{bucket}_available"] is not None:
+                gauges.append(("scheduler_bucket_available", {"bucket": bucket},
+                               stats[f"{bucket}_available"]))
+    res = _resilient_caller.stats()
+    gauges.append(("llm_retries", {}, res["retries"]))
+    gauges.append(("llm_breaker_trips", {}, res["breaker_trips"]))
+    gauges.append(("llm_breaker_open", {}, 1 if res["breaker_state"] != "closed" else 0))
+    return gauges
+
+
+REGISTRY.register_collector(_collect_gauges)
+REGISTRY.describe("llm_request_seconds", "LLM completion latency until the last token (seconds)")
+REGISTRY.describe("llm_tokens_total", "Tokens by model, explanation level and type (prompt/cached/completion)")
+REGISTRY.describe("llm_cost_usd_total", "Estimated LLM cost in USD")
+REGISTRY.describe("llm_errors_total", "Failed LLM calls by exception class (after retries)")
+REGISTRY.describe("operation_seconds",
+                  "End-to-end analysis/follow-up latency by source (cache/llm/coalesced)")
+REGISTRY.describe("scheduler_queue_depth", "Requests waiting for admission, by priority")
+REGISTRY.describe("scheduler_bucket_available", "Requests (rpm) / tokens (tpm) left in the admission buckets")
+REGISTRY.describe("quiz_bank_items_used_total", "Quiz items served from the quiz bank instead of generated")
+REGISTRY.describe("analysis_repairs_total",
+                  "Analyses fixed locally (section=local) or by regenerating one section (explain/quizzes)")
+
+
+def start_metrics_exporter():
+    """설정에 따라 Prometheus/JSONL 내보내기 스레드를 시작 (프로세스당 1개, 둘 다 꺼져 있으면 None)."""
+    global _metrics_exporter
+    _ensure_configured()
+    with _state_lock:
+        port = SETTINGS.get("METRICS_PORT", 0)
+        jsonl_path = SETTINGS.get("METRICS_JSONL_PATH", "")
+        if _metrics_exporter is None and (port or jsonl_path):
+            _metrics_exporter = MetricsExporter(
+                REGISTRY, port=port, jsonl_path=jsonl_path,
+                interval=SETTINGS.get("METRICS_JSONL_INTERVAL", 60.0),
+            )
+            _metrics_exporter.start()
+        return _metrics_exporter
+
+
+# ---------------------------
+# 2) 구조화 출력 스키마 (Responses API의 JSON 스키마)
+# ---------------------------
+schema = {
+  "name": "GrammarCoachOutput",
+  "schema": {
+    "type": "object",
+    "additionalProperties": False,
+    "properties": {
+      "corrected_sentence": {"type": "string"},
+      "level": {"type": "string", "enum": ["beginner", "intermediate", "advanced"]},
+      "explanations": {
+        "type": "array",
+        "minItems": 1,
+        "items": {
+          "type": "object",
+          "additionalProperties": False,
+          "properties": {
+            "step": {"type": "integer"},
+            "focus": {"type": "string"},
+            "what_is_wrong": {"type": "string"},
+            "why": {"type": "string"},
+            "better_alternatives": {
+              "type": "array",
+              "items": {"type": "string"},
+              "minItems": 0
+            },
+            "nuance": {"type": "string"}
+          },
+          # 🔴 strict 모드 규칙: properties에 있는 키 전부를 required에 포함
+          "required": [
+            "step",
+            "focus",
+            "what_is_wrong",
+            "why",
+            "better_alternatives",
+            "nuance"
+          ]
+        }
+      },
+      "quizzes": {
+        "type": "array",
+        "minItems": 5,
+        "items": {
+          "type": "object",
+          "additionalProperties": False,
+          "properties": {
+            "id": {"type": "string"},
+            "type": {"type": "string", "enum": ["mcq", "fill"]},
+            "difficulty": {"type": "string", "enum": ["beginner", "intermediate", "advanced"]},
+            "question": {"type": "string"},
+            "options": {
+              "type": "array",
+              "items": {"type": "string"},
+              "minItems": 0
+            },
+            "answer": {"type": "string"},
+            "rationale": {"type": "string"}
+          },
+          # 🔴 여기에서도 모든 키를 required에 포함
+          "required": [
+            "id",
+            "type",
+            "difficulty",
+            "question",
+            "options",
+            "answer",
+            "rationale"
+          ]
+        }
+      }
+    },
+    "required": ["corrected_sentence", "level", "explanations", "quizzes"]
+  }
+}
+
+# 응답마다 쓰는 검사 함수는 모듈 로드 시 한 번만 컴파일
+ANALYSIS_VALIDATORS = SectionValidators(schema["schema"])
+
+# ---------------------------
+# 3) OpenAI 호출 함수
+# ---------------------------
+ANALYSIS_TEMPERATURE = 0.2
+
+
+# 프롬프트 구성 원칙 (제공자 쪽 자동 prefix 캐시 활용)
+#   - system 프롬프트는 설명 난이도/모델과 무관하게 항상 바이트 단위로 같은 고정 텍스트
+#   - 매번 달라지는 값(설명 난이도, 학습자 문장 등)은 user 메시지 맨 뒤에만 넣음
+#   → 긴 고정 지시문 부분은 요청 간에 캐시되어 입력 토큰 비용/prefill 지연이 줄어듦
+ANALYSIS_SYSTEM_PROMPT = """
+    You are an expert English grammar tutor for Korean EFL learners.
+    Return JSON strictly conforming to the provided schema.
+
+    The learner chooses an *explanation level* (beginner / intermediate / advanced)
+    that controls how simple or detailed your explanations should be.
+    The explanation level is given at the end of each user message.
+
+    Independently from that, you must also:
+      - Estimate the difficulty of the learner's sentence itself
+        (beginner / intermediate / advanced),
+      - And store that judgment in the JSON field "level".
+        This "level" is **your own assessment of the sentence difficulty**.
+
+    Use the sentence difficulty in "level" as the main reference for:
+      - The overall difficulty of the quizzes you generate,
+      - And the "difficulty" field of each quiz item.
+
+    Explanation language:
+      * If explanation level = beginner:
+        - All explanation fields (what_is_wrong, why, better_alternatives, nuance, rationale)
+          must be written mainly in Korean.
+        - Use short, simple Korean sentences that Korean adult learners can easily understand.
+        - Include short English example sentences where helpful, but keep the explanation text in Korean.
+      * If explanation level = intermediate or advanced:
+        - Explanations can be primarily in English, but you may add short Korean glosses if helpful.
+
+    For explanations:
+      - step-by-step
+      - identify error spans exactly
+      - explain why it's wrong
+      - provide multiple better alternatives
+      - include nuance (meaning/register) where relevant
+
+    For quizzes (5–8 items):
+      - mix mcq and fill
+      - target the exact issues in the input
+      - Base difficulty primarily on your own sentence-difficulty judgment ("level").
+      - Mix quiz difficulties according to the sentence level:
+        * If sentence level = beginner:
+            - roughly half of the items should be beginner level
+            - the remaining items should be intermediate level
+        * If sentence level = intermediate:
+            - the majority of items should be intermediate level
+            - include some easier (beginner) and some harder (advanced) items
+        * If sentence level = advanced:
+            - the majority of items should be advanced level
+            - include some intermediate items
+      - Set each quiz item's "difficulty" field (beginner / intermediate / advanced)
+        to your estimate of that quiz item's difficulty.
+      - Include 1–2 transfer items (new sentences using the same rule).
+    """
+
+USER_PROMPT_TEMPLATE = """
+    Task:
+      1) Correct the sentence.
+      2) Provide layered explanations at the requested explanation level.
+      3) Generate quizzes (5-8) with immediate keys.
+      4) In the JSON output field "level", write **your assessment of the difficulty
+         of the learner's sentence** (beginner / intermediate / advanced).
+      5) Use that sentence difficulty to set the overall difficulty of the quizzes
+         and the "difficulty" field of each quiz item.
+
+    Output must be valid JSON only.
+
+    Requested explanation level (controls explanation style, NOT sentence level):
+      {explanation_level}
+
+    Learner sentence: {sentence}
+    """
+
+
+# 스키마 JSON 직렬화 + 해시는 프로세스당 한 번만 계산
+ANALYSIS_FINGERPRINT = prompt_fingerprint(schema, ANALYSIS_SYSTEM_PROMPT, USER_PROMPT_TEMPLATE)
+
+
+def _cache_slot(sentence: str, explanation_level: str, model: str, fingerprint: str):
+    """캐시 조회/저장에 쓰는 (정확 일치 키, near-duplicate 비교 범위)."""
+    return (
+        make_cache_key(sentence, explanation_level, model, ANALYSIS_TEMPERATURE, fingerprint),
+        make_cache_scope(explanation_level, model, ANALYSIS_TEMPERATURE, fingerprint),
+    )
+
+
+def lookup_cached_analysis(sentence: str, slot):
+    """
+    정확히 같은 키 → 거의 같은 문장 순서로 이전 분석 결과를 찾는다.
+    (재사용한 결과의 하이라이트는 화면에서 학습자의 실제 입력으로 다시 계산됨)
+    """
+    cache_key, scope = slot
+    cache = get_analysis_cache()
+    cached = cache.get(cache_key)
+    if cached is None:
+        similar_key = get_near_dup_index().lookup(scope, sentence)
+        if similar_key is not None and similar_key != cache_key:
+            cached = cache.get(similar_key)
+    return cached
+
+
+def store_cached_analysis(sentence: str, slot, result: dict):
+    cache_key, scope = slot
+    get_analysis_cache().set(cache_key, result)
+    get_near_dup_index().add(scope, sentence, cache_key)
+
+
+# ---------------------------
+# 모델 캐스케이드 (model_router.py)
+# ---------------------------
+_routing_log = RoutingLog()
+
+# 진행 중인 분석 (키: 분석 캐시 키 → 같은 문장/난이도/모델/프롬프트면 같은 키)
+# (기다린 쪽은 사본을 받음 → 한 세션이 결과를 고쳐도 다른 세션에 번지지 않음)
+_analysis_flights = SingleFlight("analyze", share=copy.deepcopy)
+_async_analysis_flights = AsyncSingleFlight("analyze_async", share=copy.deepcopy)
+
+
+def _flight_key(cache_slot):
+    return cache_slot[0] if cache_slot is not None else None
+
+
+def coalescing_stats() -> dict:
+    """합쳐진 분석 요청 수 {"sync": {...}, "async": {...}} (leaders / followers / retries ...)."""
+    return {"sync": _analysis_flights.stats(), "async": _async_analysis_flights.stats()}
+
+
+def analysis_tiers() -> list:
+    """[(단계 이름, 모델), ...] 싼 모델이 설정돼 있으면 2단계, 아니면 OPENAI_MODEL 1단계."""
+    strong = get_model()
+    cheap = SETTINGS.get("OPENAI_CHEAP_MODEL", "")
+    if cheap and cheap != strong:
+        return [("cheap", cheap), ("strong", strong)]
+    return [("strong", strong)]
+
+
+def _tiers_cache_model(tiers: list) -> str:
+    """캐시 키에 들어갈 모델 이름 (캐스케이드 구성이 바뀌면 다른 키)."""
+    return ">".join(model for _, model in tiers)
+
+
+def _route(tiers: list, tier_no: int, sentence: str, result, started: float, cost_usd: float,
+           check_quizzes: bool = True, problems: list = None) -> str:
+    """
+    tier_no 단계 결과를 검사하고 라우팅 결정을 기록. 다음 단계로 넘겨야 하면 그 이유를 반환.
+    마지막 단계 결과는 (문제가 있어도) 그대로 채택하고 문제만 기록한다.
+    """
+    if len(tiers) == 1:
+        return ""
+    tier, model = tiers[tier_no]
+    if problems is None:
+        problems = check_analysis(sentence, result, ANALYSIS_VALIDATORS.full, check_quizzes)
+    reason = ""
+    if tier_no < len(tiers) - 1:
+        reason = escalation_reason(
+            problems, result, SETTINGS.get("CASCADE_ESCALATE_LEVELS", ("advanced",))
+        )
+    _routing_log.record(tier, model, time.perf_counter() - started, cost_usd, reason, problems)
+    return reason
+
+
+def routing_stats() -> dict:
+    """캐스케이드 단계별 호출/채택/승격 수, 승격 사유, 지연시간, 비용."""
+    return _routing_log.stats()
+
+
+def routing_decisions(limit: int = 50) -> list:
+    """최근 라우팅 결정 기록 (임계값 조정용)."""
+    return _routing_log.decisions(limit)
+
+
+def _prepare_analysis(sentence: str, explanation_level_label: str, use_cache: bool):
+    """분석 요청에 필요한 모델/메시지/캐시 키를 한 번에 준비."""
+    level_map = {"초급": "beginner", "중급": "intermediate", "고급": "advanced"}
+    explanation_level = level_map.get(explanation_level_label, "intermediate")
+    tiers = analysis_tiers()
+
+    user_prompt = USER_PROMPT_TEMPLATE.format(
+        sentence=sentence, explanation_level=explanation_level
+    )
+
+    cache_slot = None
+    if use_cache:
+        cache_slot = _cache_slot(
+            sentence, explanation_level, _tiers_cache_model(tiers), ANALYSIS_FINGERPRINT
+        )
+
+    return {
+        "tiers": tiers,
+        "explanation_level": explanation_level,
+        "messages": [
+            {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ],
+        "cache_slot": cache_slot,
+    }
+
+
+# Chat Completions API + JSON Schema 강제
+ANALYSIS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "GrammarCoachOutput",
+        "schema": schema["schema"],
+        "strict": True,
+    },
+}
+_STREAM_ARGS = {"stream": True, "stream_options": {"include_usage": True}}
+
+
+def _analysis_request(req: dict, model: str, stream: bool = False) -> dict:
+    """전체 분석(교정 + 설명 + 퀴즈)을 한 번에 요청하는 인자."""
+    return dict(
+        model=model,
+        messages=req["messages"],
+        response_format=ANALYSIS_RESPONSE_FORMAT,
+        temperature=ANALYSIS_TEMPERATURE,
+        **(_STREAM_ARGS if stream else {}),
+    )
+
+
+def analyze_sentence(sentence: str, explanation_level_label: str, use_cache: bool = True,
+                     requester: Requester = None):
+    """
+    explanation_level_label:
+      - 사용자가 사이드바에서 고른 '설명 난이도' (초급/중급/고급)
+      - 문장 자체 난이도가 아니라, 설명/해설을 얼마나 쉽게/깊게 할지에 대한 옵션
+    use_cache:
+      - True면 같은 (문장, 난이도, 모델, 프롬프트) 조합의 이전 결과를 재사용
+    requester:
+      - 요청한 학습자/반 (입장 스케줄러의 공정 분배 단위, 없으면 익명 한 묶음)
+    """
+    op_started = time.perf_counter()
+    req = _prepare_analysis(sentence, explanation_level_label, use_cache)
+    cache_slot = req["cache_slot"]
+    if cache_slot is not None:
+        cached = lookup_cached_analysis(sentence, cache_slot)
+        if cached is not None:
+            _observe_op("analyze", "cache", op_started)
+            return cached
+
+    def run():
+        with _admitted(requester, PRIORITY_ANALYSIS, req["messages"], ANALYSIS_OUTPUT_TOKENS):
+            return _analyze_llm(sentence, req)
+
+    # 같은 분석이 이미 진행 중이면 그 결과를 함께 받음 (캐시를 쓰지 않는 요청은 합치지 않음)
+    result, shared = _analysis_flights.do(_flight_key(cache_slot), run)
+    _observe_op("analyze", "coalesced" if shared else "llm", op_started)
+    return result
+
+
+def _analyze_llm(sentence: str, req: dict) -> dict:
+    """캐시에 없을 때: 모델 캐스케이드로 분석하고 퀴즈 은행/캐시에 저장."""
+    cache_slot = req["cache_slot"]
+    tiers = req["tiers"]
+    bank_quizzes = _bank_quizzes(sentence, req["explanation_level"])
+    for tier_no, (_, model) in enumerate(tiers):
+        started = time.perf_counter()
+        costs = []
+        problems = None
+        try:
+            if bank_quizzes:
+                result = _drain(_analyze_with_bank(
+                    sentence, req["explanation_level"], model, bank_quizzes, costs
+                ))
+            else:
+                chat = create_completion("analyze", **_analysis_request(req, model))
+                _record_usage(chat.usage, "analyze", model, req["explanation_level"], started)
+                costs.append(usage_cost_usd(chat.usage, model))
+                result, _ = salvage_json(chat.choices[0].message.content)
+                result = repair_analysis(sentence, req["explanation_level"], model, result, costs)
+        except ValueError as e:
+            if tier_no == len(tiers) - 1:
+                raise
+            result, problems = None, [f"repair: {e}"]
+        if not _route(tiers, tier_no, sentence, result, started, sum(costs), problems=problems):
+            break
+
+    _store_in_bank(sentence, result, model)
+    if cache_slot is not None:
+        store_cached_analysis(sentence, cache_slot, result)
+    return result
+
+
+def analyze_sentence_stream(sentence: str, explanation_level_label: str, use_cache: bool = True,
+                            requester: Requester = None):
+    """
+    analyze_sentence()의 스트리밍 버전 (generator).
+    - ("field", key, value): 최상위 필드 완성 (예: corrected_sentence)
+    - ("item", key, index, value): explanations / quizzes 원소 하나 완성
+    - ("escalate", reason): 싼 모델 결과가 검사를 통과하지 못해 강한 모델로 처음부터 다시 생성
+      (화면은 지금까지 그린 부분을 지우고 이어지는 이벤트로 다시 그리면 됨)
+    - ("done", result): 전체 결과
+    캐시 적중 시에도 같은 순서로 이벤트를 흘려보낸다.
+    """
+    op_started = time.perf_counter()
+    req = _prepare_analysis(sentence, explanation_level_label, use_cache)
+    cache_slot = req["cache_slot"]
+    if cache_slot is not None:
+        cached = lookup_cached_analysis(sentence, cache_slot)
+        if cached is not None:
+            _observe_op("analyze_stream", "cache", op_started)
+            yield from _replay_events(cached)
+            return
+
+    # 같은 분석이 이미 진행 중이면 끝날 때까지 기다렸다가 캐시 적중처럼 흘려보냄
+    key = _flight_key(cache_slot)
+    while key is not None:
+        flight, leader = _analysis_flights.begin(key)
+        if leader:
+            break
+        try:
+            result = _analysis_flights.wait(flight)
+        except LeaderCancelled:
+            continue  # 먼저 요청한 세션이 중단됨 → 다시 시도 (이번에는 leader가 될 수 있음)
+        _observe_op("analyze_stream", "coalesced", op_started)
+        yield from _replay_events(result)
+        return
+
+    try:
+        with _admitted(requester, PRIORITY_ANALYSIS, req["messages"], ANALYSIS_OUTPUT_TOKENS):
+            result = yield from _analyze_stream_llm(sentence, req)
+    except BaseException as e:
+        # 실패는 기다리던 쪽에도 전달, 중단(generator 닫힘/rerun)이면 기다리던 쪽이 다시 시도
+        if key is not None:
+            _analysis_flights.end(key, flight, error=e)
+        raise
+    if key is not None:
+        _analysis_flights.end(key, flight, result=result)
+    _observe_op("analyze_stream", "llm", op_started)
+    yield ("done", result)
+
+
+def _replay_events(result: dict):
+    """이미 있는 결과를 스트리밍과 같은 이벤트 순서로 내보냄 (캐시 적중 / 합쳐진 요청)."""
+    for key, value in result.items():
+        if isinstance(value, list):
+            for idx, item in enumerate(value):
+                yield ("item", key, idx, item)
+        yield ("field", key, value)
+    yield ("done", result)
+
+
+def _analyze_stream_llm(sentence: str, req: dict):
+    """_analyze_llm()의 스트리밍 버전 (이벤트를 yield하고 최종 결과를 return)."""
+    cache_slot = req["cache_slot"]
+    tiers = req["tiers"]
+    bank_quizzes = _bank_quizzes(sentence, req["explanation_level"])
+    for tier_no, (_, model) in enumerate(tiers):
+        started = time.perf_counter()
+        costs = []
+        problems = None
+        try:
+            if bank_quizzes:
+                result = yield from _analyze_with_bank(
+                    sentence, req["explanation_level"], model, bank_quizzes, costs
+                )
+            else:
+                result = yield from _stream_analysis_once(sentence, req, model, costs)
+        except ValueError as e:
+            if tier_no == len(tiers) - 1:
+                raise
+            result, problems = None, [f"repair: {e}"]
+        reason = _route(tiers, tier_no, sentence, result, started, sum(costs), problems=problems)
+        if not reason:
+            break
+        yield ("escalate", reason)
+
+    _store_in_bank(sentence, result, model)
+    if cache_slot is not None:
+        store_cached_analysis(sentence, cache_slot, result)
+    return result
+
+
+def _stream_analysis_once(sentence: str, req: dict, model: str, costs: list):
+    """한 모델로 전체 분석을 스트리밍 (이벤트를 yield하고 복구까지 마친 결과를 return)."""
+    started = time.perf_counter()
+    stream = create_completion("analyze_stream", **_analysis_request(req, model, stream=True))
+
+    parser = StreamingObjectParser()
+    partial = {}  # 끊긴 응답에서도 살릴 수 있도록 완성된 배열 원소를 모아 둠
+    for chunk in stream:
+        if chunk.usage is not None:
+            _record_usage(chunk.usage, "analyze_stream", model, req["explanation_level"], started)
+            costs.append(usage_cost_usd(chunk.usage, model))
+        if not chunk.choices:
+            continue
+        for event in parser.feed(chunk.choices[0].delta.content):
+            if event[0] == "item":
+                partial.setdefault(event[1], []).append(event[3])
+            yield event
+
+    partial.update(parser.result)
+    # 빠진/망가진 구간만 다시 받아 채움 ("done" 결과로 화면 전체를 다시 그림)
+    return repair_analysis(sentence, req["explanation_level"], model, partial, costs)
+
+# ---------------------------
+# 3-1) 병렬 분석: (교정+설명) 가지와 퀴즈 가지를 동시에 생성
+# ---------------------------
+EXPLAIN_USER_PROMPT_TEMPLATE = """
+    Task:
+      1) Correct the sentence.
+      2) In the JSON output field "level", write **your assessment of the difficulty
+         of the learner's sentence** (beginner / intermediate / advanced).
+      3) Provide layered explanations at the requested explanation level.
+      Do NOT generate quizzes in this response.
+
+    Output must be valid JSON only.
+
+    Requested explanation level (controls explanation style, NOT sentence level):
+      {explanation_level}
+
+    Learner sentence: {sentence}
+    """
+
+QUIZ_USER_PROMPT_TEMPLATE = """
+    Task:
+      Generate exactly {count} quiz items that target the corrections below.
+      - Use ids "{id_prefix}1", "{id_prefix}2", ...
+      - {transfer_rule}
+
+    Output must be valid JSON only.
+
+    Requested explanation level (controls rationale style, NOT sentence level):
+      {explanation_level}
+
+    Learner sentence: {sentence}
+    Corrected sentence: {corrected_sentence}
+    Sentence difficulty ("level"): {sentence_level}
+    """
+
+# 전체 퀴즈 개수 (5~8) 와 퀴즈 요청을 몇 갈래로 나눌지
+PARALLEL_QUIZ_TOTAL = 6
+PARALLEL_QUIZ_BRANCHES = 2
+
+EXPLAIN_PART_SCHEMA = slice_object_schema(
+    schema["schema"], ["corrected_sentence", "level", "explanations"]
+)
+
+
+PARALLEL_FINGERPRINT = prompt_fingerprint(
+    schema, ANALYSIS_SYSTEM_PROMPT, EXPLAIN_USER_PROMPT_TEMPLATE, QUIZ_USER_PROMPT_TEMPLATE,
+    f"{PARALLEL_QUIZ_TOTAL}/{PARALLEL_QUIZ_BRANCHES}",
+)
+
+
+@lru_cache(maxsize=16)
+def _quiz_part_schema(count: int) -> dict:
+    return slice_object_schema(schema["schema"], ["quizzes"], {"quizzes": {"minItems": count}})
+
+
+def _json_schema_format(name: str, part_schema: dict) -> dict:
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "schema": part_schema, "strict": True},
+    }
+
+
+# 구간별 요청 인자 (동기 create_completion / asyncio acreate_completion 이 함께 사용)
+
+def _explain_part_request(sentence: str, explanation_level: str, model: str,
+                          stream: bool = False) -> dict:
+    """교정문 + 난이도 + 설명 구간만 요청하는 인자."""
+    return dict(
+        model=model,
+        messages=[
+            {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+            {"role": "user", "content": EXPLAIN_USER_PROMPT_TEMPLATE.format(
+                sentence=sentence, explanation_level=explanation_level)},
+        ],
+        response_format=_json_schema_format("GrammarCoachExplanations", EXPLAIN_PART_SCHEMA),
+        temperature=ANALYSIS_TEMPERATURE,
+        **(_STREAM_ARGS if stream else {}),
+    )
+
+
+def _quiz_part_request(sentence: str, explanation_level: str, model: str,
+                       corrected_sentence: str, sentence_level: str, count: int,
+                       id_prefix: str, transfer_rule: str) -> dict:
+    """퀴즈 count개만 요청하는 인자."""
+    return dict(
+        model=model,
+        messages=[
+            {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+            {"role": "user", "content": QUIZ_USER_PROMPT_TEMPLATE.format(
+                sentence=sentence,
+                corrected_sentence=corrected_sentence,
+                sentence_level=sentence_level,
+                explanation_level=explanation_level,
+                count=count,
+                id_prefix=id_prefix,
+                transfer_rule=transfer_rule,
+            )},
+        ],
+        response_format=_json_schema_format("GrammarCoachQuizzes", _quiz_part_schema(count)),
+        temperature=ANALYSIS_TEMPERATURE,
+    )
+
+
+def _quizzes_from_content(content: str) -> list:
+    """퀴즈 구간 응답에서 퀴즈 목록 (망가졌으면 살릴 수 있는 만큼, 없으면 빈 목록)."""
+    part, _ = salvage_json(content)
+    quizzes = part.get("quizzes") if isinstance(part, dict) else None
+    return quizzes if isinstance(quizzes, list) else []
+
+
+def analyze_sentence_parallel(sentence: str, explanation_level_label: str, use_cache: bool = True,
+                              requester: Requester = None):
+    """
+    analyze_sentence()와 같은 결과 dict를 돌려주지만, 한 번에 다 생성하지 않고
+      - 가지 A: corrected_sentence + level + explanations (스트리밍)
+      - 가지 B..: quizzes (가지 A에서 교정문/난이도가 나오는 즉시 병렬로 시작)
+    로 나눠서 요청한다. 전체 지연시간 ≈ 가장 긴 가지의 지연시간.
+    """
+    op_started = time.perf_counter()
+    level_map = {"초급": "beginner", "중급": "intermediate", "고급": "advanced"}
+    explanation_level = level_map.get(explanation_level_label, "intermediate")
+    tiers = analysis_tiers()
+
+    cache_slot = None
+    if use_cache:
+        cache_slot = _cache_slot(
+            sentence, explanation_level, _tiers_cache_model(tiers), PARALLEL_FINGERPRINT
+        )
+        cached = lookup_cached_analysis(sentence, cache_slot)
+        if cached is not None:
+            _observe_op("analyze_parallel", "cache", op_started)
+            return cached
+
+    def run():
+        # 가지마다 비슷한 프롬프트로 1 + PARALLEL_QUIZ_BRANCHES번 호출
+        messages = _explain_part_request(sentence, explanation_level, tiers[0][1])["messages"]
+        with _admitted(requester, PRIORITY_ANALYSIS, messages, ANALYSIS_OUTPUT_TOKENS,
+                       requests=1 + PARALLEL_QUIZ_BRANCHES):
+            return _analyze_parallel_llm(sentence, explanation_level, tiers, cache_slot)
+
+    result, shared = _analysis_flights.do(_flight_key(cache_slot), run)
+    _observe_op("analyze_parallel", "coalesced" if shared else "llm", op_started)
+    return result
+
+
+def _analyze_parallel_llm(sentence: str, explanation_level: str, tiers: list, cache_slot) -> dict:
+    for tier_no, (_, model) in enumerate(tiers):
+        started = time.perf_counter()
+        costs = []
+        try:
+            result = _analyze_parallel_once(sentence, explanation_level, model, costs)
+        except ValueError as e:
+            # 스키마/JSON 문제는 다음 단계 모델로 (마지막 단계면 그대로 실패)
+            if tier_no == len(tiers) - 1:
+                raise
+            _route(tiers, tier_no, sentence, None, started, sum(costs), problems=[f"schema: {e}"])
+            continue
+        if not _route(tiers, tier_no, sentence, result, started, sum(costs)):
+            break
+
+    _store_in_bank(sentence, result, model)
+    if cache_slot is not None:
+        store_cached_analysis(sentence, cache_slot, result)
+    return result
+
+
+def _analyze_parallel_once(sentence: str, explanation_level: str, model: str, costs: list) -> dict:
+    """한 모델로 병렬 분석 1회. 호출별 추정 비용을 costs에 덧붙인다."""
+    # 가지 A가 교정문/난이도를 알아내면 여기에 채워 넣음 -> 퀴즈 가지 시작 신호
+    seed = Future()
+
+    def explain_branch():
+        try:
+            started = time.perf_counter()
+            stream = create_completion(
+                "parallel_explain",
+                **_explain_part_request(sentence, explanation_level, model, stream=True),
+            )
+            parser = StreamingObjectParser()
+            part = {}
+            for chunk in stream:
+                if chunk.usage is not None:
+                    _record_usage(chunk.usage, "parallel_explain", model, explanation_level, started)
+                    costs.append(usage_cost_usd(chunk.usage, model))
+                if not chunk.choices:
+                    continue
+                for event in parser.feed(chunk.choices[0].delta.content):
+                    if event[0] == "item":
+                        part.setdefault(event[1], []).append(event[3])
+                if (not seed.done()
+                        and "corrected_sentence" in parser.result and "level" in parser.result):
+                    seed.set_result((parser.result["corrected_sentence"], parser.result["level"]))
+        except Exception as e:
+            if not seed.done():
+                seed.set_exception(e)
+            raise
+
+        if not seed.done():
+            seed.set_exception(ValueError("교정/설명 응답에 교정문/난이도가 없습니다."))
+        # 검사/복구는 병합한 뒤 repair_analysis()에서 구간별로
+        part.update(parser.result)
+        return part
+
+    def quiz_branch(count: int, branch_no: int, with_transfer: bool):
+        corrected_sentence, sentence_level = seed.result()
+        started = time.perf_counter()
+        chat = create_completion("parallel_quiz", **_quiz_part_request(
+            sentence, explanation_level, model, corrected_sentence, sentence_level, count,
+            id_prefix=f"b{branch_no}q",
+            transfer_rule=(
+                "Include 1 transfer item (a new sentence using the same rule)."
+                if with_transfer else
+                "Focus on the learner's own sentence (no transfer items)."
+            ),
+        ))
+        _record_usage(chat.usage, "parallel_quiz", model, explanation_level, started)
+        costs.append(usage_cost_usd(chat.usage, model))
+        return _quizzes_from_content(chat.choices[0].message.content)
+
+    # 퀴즈 개수를 가지별로 고르게 나눔 (예: 6개 / 2갈래 -> 3, 3)
+    base, extra = divmod(PARALLEL_QUIZ_TOTAL, PARALLEL_QUIZ_BRANCHES)
+    counts = [base + (1 if i < extra else 0) for i in range(PARALLEL_QUIZ_BRANCHES)]
+
+    with ThreadPoolExecutor(max_workers=1 + PARALLEL_QUIZ_BRANCHES) as pool:
+        # 가지의 usage도 이 입장으로 정산되도록 컨텍스트를 넘김
+        explain_future = pool.submit(contextvars.copy_context().run, explain_branch)
+        quiz_futures = [
+            pool.submit(contextvars.copy_context().run, quiz_branch, count, i + 1, i == len(counts) - 1)
+            for i, count in enumerate(counts) if count > 0
+        ]
+        explain_part = explain_future.result()
+        quizzes = [q for f in quiz_futures for q in f.result()]
+
+    # 가지별 id가 겹치지 않도록 번호를 다시 매기고, 망가진 구간만 다시 받아 채움
+    return repair_analysis(sentence, explanation_level, model,
+                           dict(explain_part, quizzes=quizzes), costs)
+
+
+# ---------------------------
+# 3-2) 추가 질문 답변 (캐시 + 스트리밍)
+# ---------------------------
+FOLLOWUP_TEMPERATURE = 0.4
+
+FOLLOWUP_SYSTEM_PROMPT = """
+    You are a friendly English grammar tutor for Korean adult learners.
+    - Always answer in Korean.
+    - Keep the explanation concise (약 3~6문장).
+    - Use clear, simple Korean.
+    - 필요하면 간단한 영어 예문 1~2개를 포함하세요.
+    """
+
+FOLLOWUP_USER_TEMPLATE = """
+    아래는 학습자의 추가 질문입니다. 한국어로 이해하기 쉽게 설명해 주세요.
+
+    학습자의 영어 문장: {sentence}
+    교정된 문장: {corrected}
+    설정된 설명 난이도 옵션: {lvl}
+
+    추가 질문:
+    {question}
+    """
+
+FOLLOWUP_FINGERPRINT = prompt_fingerprint(
+    {"temperature": FOLLOWUP_TEMPERATURE}, FOLLOWUP_SYSTEM_PROMPT, FOLLOWUP_USER_TEMPLATE
+)
+
+
+def _prepare_followup(question: str, sentence: str, corrected: str, level_label: str):
+    level_map = {"초급": "beginner", "중급": "intermediate", "고급": "advanced"}
+    lvl = level_map.get(level_label, "intermediate")
+    model = get_model()
+    user_prompt = FOLLOWUP_USER_TEMPLATE.format(
+        sentence=sentence, corrected=corrected, lvl=lvl, question=question
+    )
+    return {
+        "model": model,
+        "explanation_level": lvl,
+        "messages": [
+            {"role": "system", "content": FOLLOWUP_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ],
+        "scope": make_followup_scope(corrected, lvl, model, FOLLOWUP_FINGERPRINT),
+    }
+
+
+def answer_followup_stream(question: str, sentence: str, corrected: str, level_label: str,
+                           use_cache: bool = True, requester: Requester = None):
+    """
+    answer_followup()의 스트리밍 버전 (generator, 텍스트 조각을 차례로 yield).
+    (교정문, 난이도, 비슷한 질문)으로 캐시에 있으면 저장된 답변을 한 번에 내보낸다.
+    st.write_stream()에 그대로 넘길 수 있다.
+    """
+    op_started = time.perf_counter()
+    req = _prepare_followup(question, sentence, corrected, level_label)
+    cache = get_followup_cache() if use_cache else None
+    if cache is not None:
+        cached = cache.get(req["scope"], question)
+        if cached is not None:
+            _observe_op("followup_stream", "cache", op_started)
+            yield cached
+            return
+
+    parts = []
+    with _admitted(requester, PRIORITY_INTERACTIVE, req["messages"], FOLLOWUP_OUTPUT_TOKENS):
+        started = time.perf_counter()
+        stream = create_completion(
+            "followup_stream",
+            model=req["model"],
+            messages=req["messages"],
+            temperature=FOLLOWUP_TEMPERATURE,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        for chunk in stream:
+            if chunk.usage is not None:
+                _record_usage(chunk.usage, "followup_stream", req["model"], req["explanation_level"],
+                              started)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+
+    answer = "".join(parts).strip()
+    if cache is not None and answer:
+        cache.set(req["scope"], question, answer)
+    _observe_op("followup_stream", "llm", op_started)
+
+
+def answer_followup(question: str, sentence: str, corrected: str, level_label: str,
+                    use_cache: bool = True, requester: Requester = None) -> str:
+    """추가 질문에 대해 한국어로 짧게 답변."""
+    op_started = time.perf_counter()
+    req = _prepare_followup(question, sentence, corrected, level_label)
+    cache = get_followup_cache() if use_cache else None
+    if cache is not None:
+        cached = cache.get(req["scope"], question)
+        if cached is not None:
+            _observe_op("followup", "cache", op_started)
+            return cached
+
+    with _admitted(requester, PRIORITY_INTERACTIVE, req["messages"], FOLLOWUP_OUTPUT_TOKENS):
+        started = time.perf_counter()
+        chat = create_completion(
+            "followup",
+            model=req["model"],
+            messages=req["messages"],
+            temperature=FOLLOWUP_TEMPERATURE,
+        )
+        _record_usage(chat.usage, "followup", req["model"], req["explanation_level"], started)
+    answer = chat.choices[0].message.content.strip()
+    if cache is not None and answer:
+        cache.set(req["scope"], question, answer)
+    _observe_op("followup", "llm", op_started)
+    return answer
+
+
+# ---------------------------
+# 3-3) 구간별 부분 재생성 (section_repair.py)
+# ---------------------------
+# 모자란 퀴즈만 다시 받을 때 QUIZ_USER_PROMPT_TEMPLATE의 transfer_rule 자리에 넣는 지시
+REPAIR_QUIZ_RULE = "Do not repeat any of these existing questions: {existing}"
+
+
+def repair_analysis(sentence: str, explanation_level: str, model: str, result,
+                    costs: list = None) -> dict:
+    """
+    분석 결과를 구간별로 검사해 올바른 구간은 그대로 두고,
+    망가진 구간(교정/설명, 모자란 퀴즈)만 그 구간 스키마로 다시 요청해 채운다.
+    - 결과가 이미 올바르면 모델 호출 없이 (id/step만 정리해) 돌려줌
+    - 살릴 구간이 하나도 없거나 교정/설명을 복구하지 못하면 ValueError
+    호출별 추정 비용은 costs에 덧붙인다.
+    """
+    plan = RepairPlan(result, ANALYSIS_VALIDATORS)
+    if plan.fixes:
+        REGISTRY.inc("analysis_repairs_total", section="local")
+    if not plan.needs_model:
+        return plan.merge()
+    if not plan.salvageable:
+        raise ValueError(f"살릴 수 있는 구간이 없습니다: {plan.problems[:3]}")
+    costs = costs if costs is not None else []
+
+    explain = plan.explain
+    if explain is None:
+        REGISTRY.inc("analysis_repairs_total", section="explain")
+        explain = _regenerate_explain(sentence, explanation_level, model, costs)
+
+    shortfall = plan.quiz_shortfall
+    if shortfall:
+        REGISTRY.inc("analysis_repairs_total", section="quizzes")
+        plan.add_quizzes(_regenerate_quizzes(
+            sentence, explanation_level, model, explain, shortfall, plan.quizzes, costs
+        ))
+    return plan.merge(explain)
+
+
+def repair_stats() -> dict:
+    """구간별 복구 횟수 {"local": n, "explain": n, "quizzes": n}"""
+    return {
+        c["labels"]["section"]: int(c["value"])
+        for c in REGISTRY.snapshot()["counters"] if c["name"] == "analysis_repairs_total"
+    }
+
+
+def _explain_from_content(content: str) -> dict:
+    """다시 요청한 교정/설명 구간 응답 → 살린 explain 구간 (그래도 망가졌으면 ValueError)."""
+    part, _ = salvage_json(content)
+    explain = RepairPlan(dict(part, quizzes=[]) if isinstance(part, dict) else part,
+                         ANALYSIS_VALIDATORS).explain
+    if explain is None:
+        raise ValueError("다시 요청한 교정/설명 구간도 올바르지 않습니다.")
+    return explain
+
+
+def _regenerate_quizzes_request(sentence: str, explanation_level: str, model: str, explain: dict,
+                                count: int, existing: list, rule: str) -> dict:
+    return _quiz_part_request(
+        sentence, explanation_level, model, explain["corrected_sentence"], explain["level"], count,
+        id_prefix="r",
+        transfer_rule=rule.format(
+            existing=json.dumps([q["question"] for q in existing], ensure_ascii=False)
+        ),
+    )
+
+
+def _regenerate_explain(sentence: str, explanation_level: str, model: str, costs: list) -> dict:
+    started = time.perf_counter()
+    chat = create_completion("repair_explain",
+                             **_explain_part_request(sentence, explanation_level, model))
+    _record_usage(chat.usage, "repair_explain", model, explanation_level, started)
+    costs.append(usage_cost_usd(chat.usage, model))
+    return _explain_from_content(chat.choices[0].message.content)
+
+
+def _regenerate_quizzes(sentence: str, explanation_level: str, model: str, explain: dict,
+                        count: int, existing: list, costs: list, rule: str = REPAIR_QUIZ_RULE,
+                        kind: str = "repair_quizzes") -> list:
+    started = time.perf_counter()
+    chat = create_completion(kind, **_regenerate_quizzes_request(
+        sentence, explanation_level, model, explain, count, existing, rule
+    ))
+    _record_usage(chat.usage, kind, model, explanation_level, started)
+    costs.append(usage_cost_usd(chat.usage, model))
+    return _quizzes_from_content(chat.choices[0].message.content)
+
+
+# ---------------------------
+# 3-4) 퀴즈 은행 (quiz_bank.py)
+# ---------------------------
+# 은행 문항과 함께 쓸 때 모델에게는 학습자 문장 전용 문항 + 응용(transfer) 문항만 요청
+BANK_QUIZ_RULE = (
+    "Quiz on the learner's own sentence, and include 1 transfer item (a new sentence using "
+    "the same rule). Do not repeat any of these existing questions: {existing}"
+)
+
+
+def _bank_quizzes(sentence: str, explanation_level: str) -> list:
+    """
+    로컬 검사(precheck)로 예상한 문법 주제의 은행 문항을 꺼낸다.
+    QUIZ_BANK_MIN_ITEMS개 이상 모이지 않으면 빈 목록 (→ 평소처럼 모델이 퀴즈를 모두 생성).
+    """
+    min_items = SETTINGS.get("QUIZ_BANK_MIN_ITEMS", 4)
+    if min_items <= 0:
+        return []
+    tags = sorted({issue.rule for issue in precheck_sentence(sentence).issues})
+    if not tags:
+        return []
+    count = max(0, PARALLEL_QUIZ_TOTAL - SETTINGS.get("QUIZ_BANK_MODEL_ITEMS", 2))
+    return get_quiz_bank().pick(tags, explanation_level, count, min_count=min(min_items, count))
+
+
+def _store_in_bank(sentence: str, result: dict, model: str):
+    """
+    최종 채택한 결과의 퀴즈를 문항별 focus 태그로 색인해 은행에 저장.
+    학습자 문장을 인용한 문항(원문/교정문 그대로 묻는 문제)은 다른 학습자에게 보이면 안 되므로 넣지 않는다.
+    """
+    if not result.get("quizzes"):
+        return
+    get_quiz_bank().add(bank_items(result, sentence), model)
+
+
+def _drain(events):
+    """이벤트 generator를 끝까지 돌리고 return 값을 돌려줌."""
+    while True:
+        try:
+            next(events)
+        except StopIteration as stop:
+            return stop.value
+
+
+def _analyze_with_bank(sentence: str, explanation_level: str, model: str, bank_quizzes: list,
+                       costs: list):
+    """
+    교정/설명 구간만 스트리밍으로 받고, 퀴즈는 은행 문항 + 모델이 새로 쓴 몇 문항으로 채운다.
+    analyze_sentence_stream()과 같은 이벤트를 yield하고 최종 결과를 return.
+    """
+    started = time.perf_counter()
+    stream = create_completion(
+        "bank_explain", **_explain_part_request(sentence, explanation_level, model, stream=True)
+    )
+    parser = StreamingObjectParser()
+    part = {}
+    for chunk in stream:
+        if chunk.usage is not None:
+            _record_usage(chunk.usage, "bank_explain", model, explanation_level, started)
+            costs.append(usage_cost_usd(chunk.usage, model))
+        if not chunk.choices:
+            continue
+        for event in parser.feed(chunk.choices[0].delta.content):
+            if event[0] == "item":
+                part.setdefault(event[1], []).append(event[3])
+            yield event
+    part.update(parser.result)
+
+    plan = RepairPlan(dict(part, quizzes=bank_quizzes), ANALYSIS_VALIDATORS)
+    explain = plan.explain
+    if explain is None:
+        REGISTRY.inc("analysis_repairs_total", section="explain")
+        explain = _regenerate_explain(sentence, explanation_level, model, costs)
+    count = max(SETTINGS.get("QUIZ_BANK_MODEL_ITEMS", 2), plan.quiz_shortfall)
+    if count:
+        plan.add_quizzes(_regenerate_quizzes(
+            sentence, explanation_level, model, explain, count, plan.quizzes, costs,
+            rule=BANK_QUIZ_RULE, kind="bank_quizzes",
+        ))
+    REGISTRY.inc("quiz_bank_items_used_total", len(bank_quizzes))
+    result = plan.merge(explain)
+    for idx, quiz in enumerate(result["quizzes"]):
+        yield ("item", "quizzes", idx, quiz)
+    yield ("field", "quizzes", result["quizzes"])
+    return result
+
+
+def record_quiz_attempts(attempts: list):
+    """[(퀴즈 dict, 맞았는지), ...] 학습자 채점 결과를 은행 문항 품질 통계에 반영."""
+    get_quiz_bank().record_attempts(attempts)
+
+
+def quiz_bank_stats() -> dict:
+    return get_quiz_bank().stats()
+
+
+# ---------------------------
+# 3-5) asyncio 버전 (api_server.py)
+# ---------------------------
+# 요청 인자, 캐시, 캐스케이드 라우팅, 구간별 복구, 퀴즈 은행은 동기 버전과 같은 것을 쓰고
+# OpenAI 호출만 AsyncOpenAI로 한다. (캐시/은행은 로컬 SQLite라 이벤트 루프에서 바로 호출)
+async def _astream_parts(kwargs: dict, kind: str, explanation_level: str, costs: list):
+    """
+    스트리밍 JSON 응답을 받으며 StreamingObjectParser 이벤트를 yield하고,
+    마지막에 ("parts", 완성된 필드 + 완성된 배열 원소) 를 yield (끊긴 응답에서도 살리기 위함).
+    """
+    model = kwargs["model"]
+    started = time.perf_counter()
+    stream = await acreate_completion(kind, **kwargs)
+    parser = StreamingObjectParser()
+    partial = {}
+    # 클라이언트가 중간에 끊어 generator가 닫혀도 업스트림 연결은 바로 풀에 돌려줌
+    async with stream:
+        async for chunk in stream:
+            if chunk.usage is not None:
+                _record_usage(chunk.usage, kind, model, explanation_level, started)
+                costs.append(usage_cost_usd(chunk.usage, model))
+            if not chunk.choices:
+                continue
+            for event in parser.feed(chunk.choices[0].delta.content):
+                if event[0] == "item":
+                    partial.setdefault(event[1], []).append(event[3])
+                yield event
+    partial.update(parser.result)
+    yield ("parts", partial)
+
+
+async def _aregenerate_explain(sentence: str, explanation_level: str, model: str,
+                               costs: list) -> dict:
+    started = time.perf_counter()
+    chat = await acreate_completion("repair_explain",
+                                    **_explain_part_request(sentence, explanation_level, model))
+    _record_usage(chat.usage, "repair_explain", model, explanation_level, started)
+    costs.append(usage_cost_usd(chat.usage, model))
+    return _explain_from_content(chat.choices[0].message.content)
+
+
+async def _aregenerate_quizzes(sentence: str, explanation_level: str, model: str, explain: dict,
+                               count: int, existing: list, costs: list,
+                               rule: str = REPAIR_QUIZ_RULE, kind: str = "repair_quizzes") -> list:
+    started = time.perf_counter()
+    chat = await acreate_completion(kind, **_regenerate_quizzes_request(
+        sentence, explanation_level, model, explain, count, existing, rule
+    ))
+    _record_usage(chat.usage, kind, model, explanation_level, started)
+    costs.append(usage_cost_usd(chat.usage, model))
+    return _quizzes_from_content(chat.choices[0].message.content)
+
+
+async def repair_analysis_async(sentence: str, explanation_level: str, model: str, result,
+                                costs: list = None) -> dict:
+    """repair_analysis()의 asyncio 버전."""
+    plan = RepairPlan(result, ANALYSIS_VALIDATORS)
+    if plan.fixes:
+        REGISTRY.inc("analysis_repairs_total", section="local")
+    if not plan.needs_model:
+        return plan.merge()
+    if not plan.salvageable:
+        raise ValueError(f"살릴 수 있는 구간이 없습니다: {plan.problems[:3]}")
+    costs = costs if costs is not None else []
+
+    explain = plan.explain
+    if explain is None:
+        REGISTRY.inc("analysis_repairs_total", section="explain")
+        explain = await _aregenerate_explain(sentence, explanation_level, model, costs)
+
+    shortfall = plan.quiz_shortfall
+    if shortfall:
+        REGISTRY.inc("analysis_repairs_total", section="quizzes")
+        plan.add_quizzes(await _aregenerate_quizzes(
+            sentence, explanation_level, model, explain, shortfall, plan.quizzes, costs
+        ))
+    return plan.merge(explain)
+
+
+async def _aanalyze_once(sentence: str, req: dict, model: str, bank_quizzes: list, costs: list):
+    """
+    한 모델로 분석 1회 (async generator). analyze_sentence_stream()과 같은 이벤트를 yield하고
+    마지막에 ("done", 복구까지 마친 결과)를 yield.
+    """
+    explanation_level = req["explanation_level"]
+    if not bank_quizzes:
+        async for event in _astream_parts(_analysis_request(req, model, stream=True),
+                                          "analyze_stream", explanation_level, costs):
+            if event[0] == "parts":
+                yield ("done", await repair_analysis_async(
+                    sentence, explanation_level, model, event[1], costs
+                ))
+            else:
+                yield event
+        return
+
+    # 퀴즈 은행: 교정/설명 구간만 받고, 퀴즈는 은행 문항 + 모델이 새로 쓴 몇 문항
+    part = {}
+    async for event in _astream_parts(
+        _explain_part_request(sentence, explanation_level, model, stream=True),
+        "bank_explain", explanation_level, costs,
+    ):
+        if event[0] == "parts":
+            part = event[1]
+        else:
+            yield event
+    plan = RepairPlan(dict(part, quizzes=bank_quizzes), ANALYSIS_VALIDATORS)
+    explain = plan.explain
+    if explain is None:
+        REGISTRY.inc("analysis_repairs_total", section="explain")
+        explain = await _aregenerate_explain(sentence, explanation_level, model, costs)
+    count = max(SETTINGS.get("QUIZ_BANK_MODEL_ITEMS", 2), plan.quiz_shortfall)
+    if count:
+        plan.add_quizzes(await _aregenerate_quizzes(
+            sentence, explanation_level, model, explain, count, plan.quizzes, costs,
+            rule=BANK_QUIZ_RULE, kind="bank_quizzes",
+        ))
+    REGISTRY.inc("quiz_bank_items_used_total", len(bank_quizzes))
+    result = plan.merge(explain)
+    for idx, quiz in enumerate(result["quizzes"]):
+        yield ("item", "quizzes", idx, quiz)
+    yield ("field", "quizzes", result["quizzes"])
+    yield ("done", result)
+
+
+async def analyze_sentence_astream(sentence: str, explanation_level_label: str,
+                                   use_cache: bool = True, requester: Requester = None):
+    """analyze_sentence_stream()의 asyncio 버전 (async generator, 이벤트 형식도 같음)."""
+    op_started = time.perf_counter()
+    req = _prepare_analysis(sentence, explanation_level_label, use_cache)
+    cache_slot = req["cache_slot"]
+    if cache_slot is not None:
+        cached = lookup_cached_analysis(sentence, cache_slot)
+        if cached is not None:
+            _observe_op("analyze_async", "cache", op_started)
+            for event in _replay_events(cached):
+                yield event
+            return
+
+    # 분석은 별도 task에서 돌리고(같은 키의 요청들이 함께 기다림), 처음 요청한 쪽에만 이벤트를 흘려보냄.
+    # 처음 요청한 클라이언트가 끊겨도 기다리는 쪽이 남아 있으면 분석은 계속된다.
+    events = asyncio.Queue()
+
+    async def work():
+        async with _aadmitted(requester, PRIORITY_ANALYSIS, req["messages"], ANALYSIS_OUTPUT_TOKENS):
+            async for event in _aanalyze_llm(sentence, req):
+                if event[0] == "done":
+                    return event[1]
+                events.put_nowait(event)
+
+    flight = asyncio.ensure_future(_async_analysis_flights.do(_flight_key(cache_slot), work))
+    streamed = False
+    try:
+        while not flight.done() or not events.empty():
+            if events.empty():
+                getter = asyncio.ensure_future(events.get())
+                await asyncio.wait({getter, flight}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    continue
+                event = getter.result()
+            else:
+                event = events.get_nowait()
+            streamed = True
+            yield event
+        result, shared = flight.result()
+    finally:
+        flight.cancel()  # 이 요청이 중간에 끝나면 기다리기를 그만둠 (아무도 안 기다리면 분석도 취소)
+
+    _observe_op("analyze_async", "coalesced" if shared else "llm", op_started)
+    if shared and not streamed:
+        for event in _replay_events(result):
+            yield event
+        return
+    yield ("done", result)
+
+
+async def _aanalyze_llm(sentence: str, req: dict):
+    """_analyze_stream_llm()의 asyncio 버전 (마지막에 ("done", result))."""
+    cache_slot = req["cache_slot"]
+    tiers = req["tiers"]
+    bank_quizzes = _bank_quizzes(sentence, req["explanation_level"])
+    for tier_no, (_, model) in enumerate(tiers):
+        started = time.perf_counter()
+        costs = []
+        problems = None
+        result = None
+        try:
+            async for event in _aanalyze_once(sentence, req, model, bank_quizzes, costs):
+                if event[0] == "done":
+                    result = event[1]
+                else:
+                    yield event
+        except ValueError as e:
+            if tier_no == len(tiers) - 1:
+                raise
+            result, problems = None, [f"repair: {e}"]
+        reason = _route(tiers, tier_no, sentence, result, started, sum(costs), problems=problems)
+        if not reason:
+            break
+        yield ("escalate", reason)
+
+    _store_in_bank(sentence, result, model)
+    if cache_slot is not None:
+        store_cached_analysis(sentence, cache_slot, result)
+    yield ("done", result)
+
+
+async def analyze_sentence_async(sentence: str, explanation_level_label: str,
+                                 use_cache: bool = True, requester: Requester = None) -> dict:
+    """analyze_sentence()의 asyncio 버전 (스트리밍으로 받아 최종 결과만 돌려줌)."""
+    result = None
+    async for event in analyze_sentence_astream(sentence, explanation_level_label, use_cache,
+                                                requester):
+        if event[0] == "done":
+            result = event[1]
+    return result
+
+
+async def answer_followup_astream(question: str, sentence: str, corrected: str, level_label: str,
+                                  use_cache: bool = True, requester: Requester = None):
+    """answer_followup_stream()의 asyncio 버전 (텍스트 조각을 차례로 yield)."""
+    op_started = time.perf_counter()
+    req = _prepare_followup(question, sentence, corrected, level_label)
+    cache = get_followup_cache() if use_cache else None
+    if cache is not None:
+        cached = cache.get(req["scope"], question)
+        if cached is not None:
+            _observe_op("followup_async", "cache", op_started)
+            yield cached
+            return
+
+    parts = []
+    async with _aadmitted(requester, PRIORITY_INTERACTIVE, req["messages"], FOLLOWUP_OUTPUT_TOKENS):
+        started = time.perf_counter()
+        stream = await acreate_completion(
+            "followup_stream",
+            model=req["model"],
+            messages=req["messages"],
+            temperature=FOLLOWUP_TEMPERATURE,
+            **_STREAM_ARGS,
+        )
+        async with stream:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    _record_usage(chunk.usage, "followup_stream", req["model"],
+                                  req["explanation_level"], started)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+
+    answer = "".join(parts).strip()
+    if cache is not None and answer:
+        cache.set(req["scope"], question, answer)
+    _observe_op("followup_async", "llm", op_started)
+
+
+async def answer_followup_async(question: str, sentence: str, corrected: str, level_label: str,
+                                use_cache: bool = True, requester: Requester = None) -> str:
+    """answer_followup()의 asyncio 버전."""
+    op_started = time.perf_counter()
+    req = _prepare_followup(question, sentence, corrected, level_label)
+    cache = get_followup_cache() if use_cache else None
+    if cache is not None:
+        cached = cache.get(req["scope"], question)
+        if cached is not None:
+            _observe_op("followup_async", "cache", op_started)
+            return cached
+
+    async with _aadmitted(requester, PRIORITY_INTERACTIVE, req["messages"], FOLLOWUP_OUTPUT_TOKENS):
+        started = time.perf_counter()
+        chat = await acreate_completion(
+            "followup",
+            model=req["model"],
+            messages=req["messages"],
+            temperature=FOLLOWUP_TEMPERATURE,
+        )
+        _record_usage(chat.usage, "followup", req["model"], req["explanation_level"], started)
+    answer = chat.choices[0].message.content.strip()
+    if cache is not None and answer:
+        cache.set(req["scope"], question, answer)
+    _observe_op("followup_async", "llm", op_started)
+    return answer
@@ -0,0 +1,227 @@
+"""
+교정 전후 문장 하이라이트용 diff 엔진
+
+- 구두점 분리 토큰화: "yesterday." → "yesterday" + "." (마침표만 바뀌면 마침표만 표시)
+- Myers 선형 공간(middle snake) diff + 긴 글은 patience 방식의 고유 토큰 앵커로 먼저 분할
+- 연속으로 바뀐 토큰은 <span class="gc-del|gc-ins"> 하나로 묶음 (스타일은 DIFF_CSS)
+- 같은 (원문, 교정문) 쌍은 결과를 메모이즈
+- diff_panel_html(): 입력/교정 문장 2단 패널을 HTML 한 덩어리로 (화면에 markdown 1번만 보냄)
+"""
+import bisect
+import html
+import re
+from functools import lru_cache
+
+DIFF_CSS = (
+    "<style>"
+    ".gc-del{background-color:#ffe6e6;font-weight:bold;}"
+    ".gc-ins{background-color:#e6ffe6;font-weight:bold;}"
+    ".gc-panel{display:grid;grid-template-columns:1fr 1fr;gap:1rem;margin-bottom:1rem;}"
+    ".gc-box{padding:0.75rem;border-radius:0.5rem;line-height:1.6;}"
+    ".gc-orig{background-color:#f8f9fa;}"
+    ".gc-corr{background-color:#f0fff4;}"
+    "@media (max-width:640px){.gc-panel{grid-template-columns:1fr;}}"
+    "</style>"
+)
+
+# 앞 공백 + (단어[축약형 포함] | 숫자 | 구두점 1글자)
+_TOKEN_RE = re.compile(r"\s*(?:\w+(?:['’]\w+)*|[^\w\s])", re.UNICODE)
+
+# 이 토큰 수를 넘으면 patience 앵커로 먼저 잘라서 Myers 비용(O(ND))을 제한
+PATIENCE_THRESHOLD = 64
+
+
+def tokenize(text: str) -> list:
+    """앞 공백을 포함한 토큰 목록 (''.join(tokens) == text.rstrip())."""
+    return _TOKEN_RE.findall(text or "")
+
+
+# ---------------------------
+# 1) Myers 선형 공간 diff (변경 표시 배열을 채움)
+# ---------------------------
+def _middle_snake(a, alo, ahi, b, blo, bhi):
+    """a[alo:ahi], b[blo:bhi]의 최단 편집 경로 중간 snake (x0, y0, x1, y1) 반환 (절대 좌표)."""
+    n, m = ahi - alo, bhi - blo
+    delta = n - m
+    odd = delta & 1
+    max_d = (n + m + 1) // 2
+    off = max_d + 1
+    vf = [0] * (2 * off + 1)
+    vb = [0] * (2 * off + 1)
+
+    for d in range(max_d + 1):
+        # 앞에서부터
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and vf[off + k - 1] < vf[off + k + 1]):
+                x = vf[off + k + 1]
+            else:
+                x = vf[off + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            vf[off + k] = x
+            if odd and -(d - 1) <= delta - k <= d - 1:
+                if x + vb[off + delta - k] >= n:
+                    return alo + x0, blo + y0, alo + x, blo + y
+        # 뒤에서부터 (뒤집은 좌표)
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and vb[off + k - 1] < vb[off + k + 1]):
+                x = vb[off + k + 1]
+            else:
+                x = vb[off + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[ahi - 1 - x] == b[bhi - 1 - y]:
+                x += 1
+                y += 1
+            vb[off + k] = x
+            if not odd and -d <= delta - k <= d:
+                if x + vf[off + delta - k] >= n:
+                    return alo + n - x, blo + m - y, alo + n - x0, blo + m - y0
+    raise AssertionError("middle snake를 찾지 못했습니다.")
+
+
+def _myers(a, alo, ahi, b, blo, bhi, a_changed, b_changed):
+    # 공통 접두/접미 제거
+    while alo < ahi and blo < bhi and a[alo] == b[blo]:
+        alo += 1
+        blo += 1
+    while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+        ahi -= 1
+        bhi -= 1
+
+    if alo == ahi:
+        for j in range(blo, bhi):
+            b_changed[j] = True
+        return
+    if blo == bhi:
+        for i in range(alo, ahi):
+            a_changed[i] = True
+        return
+
+    x0, y0, x1, y1 = _middle_snake(a, alo, ahi, b, blo, bhi)
+    _myers(a, alo, x0, b, blo, y0, a_changed, b_changed)
+    _myers(a, x1, ahi, b, y1, bhi, a_changed, b_changed)
+
+
+# ---------------------------
+# 2) patience 앵커 (긴 글에서 고유 토큰끼리 먼저 맞춤)
+# ---------------------------
+def _unique_anchors(a, alo, ahi, b, blo, bhi, ngram: int = 1):
+    """
+    양쪽 구간에서 한 번씩만 나오는 토큰(ngram>1이면 그 위치에서 시작하는 n-gram) 쌍 중,
+    순서가 유지되는 최장 부분열(LIS).
+    """
+    def positions(seq, lo, hi):
+        counts = {}
+        for i in range(lo, hi - ngram + 1):
+            key = seq[i] if ngram == 1 else tuple(seq[i:i + ngram])
+            prev = counts.get(key)
+            counts[key] = (1, i) if prev is None else (prev[0] + 1, i)
+        return counts
+
+    count_a = positions(a, alo, ahi)
+    count_b = positions(b, blo, bhi)
+    pairs = sorted(
+        (ia, count_b[key][1])
+        for key, (ca, ia) in count_a.items()
+        if ca == 1 and count_b.get(key, (0,))[0] == 1
+    )
+
+    # patience sorting으로 b 인덱스의 LIS
+    piles, tops, back = [], [], []
+    for idx, (_, j) in enumerate(pairs):
+        pos = bisect.bisect_left(tops, j)
+        back.append(piles[pos - 1] if pos else -1)
+        if pos == len(tops):
+            tops.append(j)
+            piles.append(idx)
+        else:
+            tops[pos] = j
+            piles[pos] = idx
+    result = []
+    idx = piles[-1] if piles else -1
+    while idx != -1:
+        result.append(pairs[idx])
+        idx = back[idx]
+    result.reverse()
+    return result
+
+
+def _diff(a, alo, ahi, b, blo, bhi, a_changed, b_changed):
+    if (ahi - alo) + (bhi - blo) <= PATIENCE_THRESHOLD:
+        _myers(a, alo, ahi, b, blo, bhi, a_changed, b_changed)
+        return
+    anchors = _unique_anchors(a, alo, ahi, b, blo, bhi)
+    if len(anchors) * PATIENCE_THRESHOLD < (ahi - alo):
+        # 어휘가 적어 고유 토큰이 드문 글은 3-gram 기준으로 앵커를 다시 찾음
+        anchors = _unique_anchors(a, alo, ahi, b, blo, bhi, ngram=3) or anchors
+    if not anchors:
+        _myers(a, alo, ahi, b, blo, bhi, a_changed, b_changed)
+        return
+    pa, pb = alo, blo
+    for ia, jb in anchors:
+        _diff(a, pa, ia, b, pb, jb, a_changed, b_changed)
+        pa, pb = ia + 1, jb + 1
+    _diff(a, pa, ahi, b, pb, bhi, a_changed, b_changed)
+
+
+def diff_tokens(a: list, b: list):
+    """a, b 토큰(비교용 키) 목록에서 삭제/추가된 위치를 bool 배열 2개로 반환."""
+    a_changed = [False] * len(a)
+    b_changed = [False] * len(b)
+    _diff(a, 0, len(a), b, 0, len(b), a_changed, b_changed)
+    return a_changed, b_changed
+
+
+# ---------------------------
+# 3) HTML 렌더링
+# ---------------------------
+def _render(tokens: list, changed: list, css_class: str) -> str:
+    out = []
+    i = 0
+    n = len(tokens)
+    while i < n:
+        if not changed[i]:
+            out.append(html.escape(tokens[i]))
+            i += 1
+            continue
+        j = i
+        while j < n and changed[j]:
+            j += 1
+        run = "".join(tokens[i:j])
+        stripped = run.lstrip()
+        lead = run[:len(run) - len(stripped)]
+        out.append(f"{html.escape(lead)}<span class='{css_class}'>{html.escape(stripped)}</span>")
+        i = j
+    return "".join(out).strip()
+
+
+@lru_cache(maxsize=2048)
+def highlight_diff(orig: str, corrected: str):
+    """
+    원문(orig)과 교정문(corrected)을 구두점 단위까지 비교해
+    - 원문에서 삭제/바뀐 부분: <span class='gc-del'>
+    - 교정문에서 새로 추가/바뀐 부분: <span class='gc-ins'>
+    로 감싼 HTML 2개를 반환. (화면에는 DIFF_CSS를 한 번 넣어 줘야 색이 보임)
+    """
+    orig_tokens = tokenize(" ".join((orig or "").split()))
+    corr_tokens = tokenize(" ".join((corrected or "").split()))
+    a_changed, b_changed = diff_tokens(
+        [t.strip() for t in orig_tokens], [t.strip() for t in corr_tokens]
+    )
+    return _render(orig_tokens, a_changed, "gc-del"), _render(corr_tokens, b_changed, "gc-ins")
+
+
+@lru_cache(maxsize=2048)
+def diff_panel_html(orig: str, corrected: str) -> str:
+    """입력 문장 / 교정 문장 2단 패널 HTML (좁은 화면에서는 위아래로). 스타일은 DIFF_CSS."""
+    orig_html, corr_html = highlight_diff(orig, corrected)
+    return (
+        "<div class='gc-panel'>"
+        f"<div><strong>입력 문장</strong><div class='gc-box gc-orig'>{orig_html}</div></div>"
+        f"<div><strong>교정 문장</strong><div class='gc-box gc-corr'>{corr_html}</div></div>"
+        "</div>"
+    )
@@ -0,0 +1,179 @@
+"""
+에세이 모드: 여러 문장을 나눠서 병렬 분석한 뒤 문서 단위로 합치기
+
+1) 문장 분리 (Mr. / e.g. / 3.5 같은 마침표는 문장 끝으로 보지 않음)
+2) 같은 문장은 한 번만 분석
+3) 로컬 사전 검사(precheck)에서 "오류 없음"이 확실한 문장은 LLM 호출 생략
+4) 나머지는 스레드 풀(동시 실행 수 제한)로 analyze_sentence() 병렬 호출
+5) 결과를 화면 렌더링이 기대하는 결과 dict 형태로 합침
+   (+ "sentences" 키에 문장별 교정/출처 정보, "failed" 키에 분석하지 못한 문장 수)
+
+한 문장의 분석이 실패해도 나머지 결과는 버리지 않는다. 실패한 문장은 원문 그대로 두고
+source="error"로 표시한다. 모든 문장이 실패했을 때만 첫 예외를 그대로 올린다.
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from analysis_cache import normalize_sentence
+from precheck import precheck_sentence
+
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e",
+    "a.m", "p.m", "u.s", "u.k", "no", "fig", "approx", "dept", "jan", "feb", "mar",
+    "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+}
+_BOUNDARY_RE = re.compile(r"[.!?]+[\"')\]]*(\s+)")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+LEVEL_RANK = {"beginner": 0, "intermediate": 1, "advanced": 2}
+ESSAY_MAX_QUIZZES = 8
+
+
+def split_sentences(text: str) -> list:
+    """
+    글을 문장 단위로 나눈다. [(문장, 뒤따르는 구분자), ...]
+    구분자는 문단 사이면 "\\n\\n", 아니면 " " (교정문을 다시 이어 붙일 때 사용)
+    """
+    segments = []
+    paragraphs = [p.strip() for p in _PARAGRAPH_RE.split(text or "") if p.strip()]
+    for p_idx, paragraph in enumerate(paragraphs):
+        paragraph = " ".join(paragraph.split())
+        start = 0
+        for m in _BOUNDARY_RE.finditer(paragraph):
+            end = m.start(1)
+            candidate = paragraph[start:end]
+            last_word = candidate.rsplit(" ", 1)[-1].rstrip(".!?\"')]").lower()
+            next_char = paragraph[m.end():m.end() + 1]
+            if (
+                last_word in ABBREVIATIONS
+                or (len(last_word) == 1 and last_word.isalpha())   # 이니셜 (J. K. Rowling)
+                or (next_char and next_char.islower())             # 다음 글자가 소문자면 이어지는 문장
+            ):
+                continue
+            segments.append([candidate, " "])
+            start = m.end()
+        tail = paragraph[start:].strip()
+        if tail:
+            segments.append([tail, " "])
+        if segments and p_idx < len(paragraphs) - 1:
+            segments[-1][1] = "\n\n"
+    if segments:
+        segments[-1][1] = ""
+    return [tuple(s) for s in segments]
+
+
+def _merge_quizzes(per_sentence_quizzes: list, limit: int) -> list:
+    """문장마다 돌아가며 한 문제씩 골라 최대 limit개 (같은 질문은 제외), id는 새로 매김."""
+    merged, seen = [], set()
+    queues = [list(qs) for qs in per_sentence_quizzes if qs]
+    while queues and len(merged) < limit:
+        next_round = []
+        for q_list in queues:
+            while q_list:
+                q = q_list.pop(0)
+                key = normalize_sentence(q.get("question", "")).lower()
+                if key in seen:
+                    continue
+                seen.add(key)
+                merged.append(dict(q))
+                break
+            if q_list:
+                next_round.append(q_list)
+            if len(merged) >= limit:
+                break
+        queues = next_round
+    for idx, q in enumerate(merged, start=1):
+        q["id"] = f"q{idx}"
+    return merged
+
+
+def analyze_essay(text: str, explanation_level_label: str, analyze_fn,
+                  max_workers: int = 4, skip_confidence: float = 1.01,
+                  on_progress=None) -> dict:
+    """
+    analyze_fn: analyze_sentence(sentence, level_label) 와 같은 모양의 함수
+    on_progress(done, total): 호출한 스레드에서 불리므로 Streamlit 위젯을 갱신해도 안전
+    """
+    segments = split_sentences(text)
+    if not segments:
+        raise ValueError("분석할 문장이 없습니다.")
+
+    # 같은 문장은 한 번만
+    unique = {}
+    for sentence, _ in segments:
+        unique.setdefault(normalize_sentence(sentence), sentence)
+
+    results, sources = {}, {}
+    to_analyze = []
+    for key, sentence in unique.items():
+        pre = precheck_sentence(sentence)
+        if pre.no_errors and pre.confidence >= skip_confidence:
+            results[key] = pre.to_result()
+            sources[key] = "precheck"
+        else:
+            to_analyze.append((key, sentence))
+
+    total = len(to_analyze)
+    if on_progress:
+        on_progress(0, total)
+    if to_analyze:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total))) as pool:
+            futures = {
+                pool.submit(analyze_fn, sentence, explanation_level_label): key
+                for key, sentence in to_analyze
+            }
+            errors = []
+            for done, future in enumerate(as_completed(futures), start=1):
+                key = futures[future]
+                try:
+                    results[key] = future.result()
+                    sources[key] = "ai"
+                except Exception as e:
+                    errors.append(e)
+                    results[key] = {"corrected_sentence": unique[key], "error": str(e)}
+                    sources[key] = "error"
+                if on_progress:
+                    on_progress(done, total)
+            if len(errors) == len(unique):
+                raise errors[0]  # 건질 결과가 하나도 없음 → 평소처럼 화면에서 오류 안내
+
+    # ---- 문서 단위로 합치기 ----
+    sentences, explanations, quiz_lists = [], [], []
+    corrected_parts = []
+    seen_keys = set()
+    level = "beginner"
+    for idx, (sentence, sep) in enumerate(segments, start=1):
+        key = normalize_sentence(sentence)
+        res = results[key]
+        duplicate = key in seen_keys
+        seen_keys.add(key)
+        corrected_parts.append(res["corrected_sentence"] + sep)
+        sentences.append({
+            "index": idx,
+            "sentence": sentence,
+            "corrected_sentence": res["corrected_sentence"],
+            "source": "duplicate" if duplicate and sources[key] != "error" else sources[key],
+            "explanations": res.get("explanations", []),
+        })
+        if sources[key] == "error":
+            sentences[-1]["error"] = res["error"]
+        if duplicate or sources[key] == "error":
+            continue
+        if LEVEL_RANK.get(res.get("level"), 0) > LEVEL_RANK[level]:
+            level = res["level"]
+        if sources[key] == "ai":
+            for exp in res.get("explanations", []):
+                explanations.append(dict(exp, focus=f"[문장 {idx}] {exp.get('focus', '')}"))
+            quiz_lists.append(res.get("quizzes", []))
+
+    for step, exp in enumerate(explanations, start=1):
+        exp["step"] = step
+
+    return {
+        "corrected_sentence": "".join(corrected_parts),
+        "level": level,
+        "explanations": explanations,
+        "quizzes": _merge_quizzes(quiz_lists, ESSAY_MAX_QUIZZES),
+        "sentences": sentences,
+        "failed": sum(1 for src in sources.values() if src == "error"),
+    }
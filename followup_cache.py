@@ -0,0 +1,244 @@
+"""
+추가 질문(follow-up) 답변 캐시
+
+같은 교정문을 보는 학습자들은 거의 같은 질문을 한다.
+  "왜 go 대신 went를 쓰나요?" / "왜 go 대신에 went를 쓰는 건가요?"
+
+- 범위(scope): 교정문 + 설명 난이도 + 모델 + 프롬프트 해시 → 이 안에서만 비교
+- 질문 정규화 후 완전히 같으면 dict로 바로 찾음 (기본값: 이것만 사용)
+- min_similarity < 1이면 (영어를 뺀) 어절별 글자 1-gram + 2-gram 집합의 Dice 계수로 비슷한 질문도 찾음.
+  글자가 많이 겹쳐도 뜻이 반대인 질문("the를 넣으면?" / "the를 빼면?")이 있으므로 다음이 모두 같아야 한다.
+  · 질문 안의 영어 단어(go, went, have been ...)
+    → "go 대신 went?"와 "eat 대신 ate?"를 같은 질문으로 보지 않음
+  · 내용어: 어절에서 조사/어미를 뗀 나머지 (넣-/빼-, 과거형/과거분사, 안/못 같은 부정어 포함)
+    → 조사/어미/군말("건가요", "혹시")만 다른 질문만 같은 질문으로 봄
+- 항목은 SQLite에 저장해 두고 시작할 때 다시 읽어 온다.
+- 메모리/디스크 모두 max_entries개까지만 LRU로 들고 있고, 유효기간이 지난 항목은 읽을 때 지운다.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_LATIN_WORD_RE = re.compile(r"[a-z]+(?:'[a-z]+)*")
+_NON_WORD_RE = re.compile(r"[^\w']+", re.UNICODE)
+
+# 어절 끝에서 떼어 낼 조사/어미 (긴 것부터 하나만)
+_SUFFIXES = sorted({
+    "에서는", "에게는", "으로는", "에서", "에게", "으로", "에는", "까지", "부터", "보다", "처럼",
+    "이랑", "하고", "을", "를", "이", "가", "은", "는", "에", "로", "와", "과", "도", "만", "의", "랑",
+    "합니까", "하나요", "해요", "하죠", "하는", "하면",
+    "습니까", "는가요", "인가요", "나요", "가요", "까요", "어요", "아요", "지요", "죠", "요",
+    "으면", "면", "고", "서", "게", "지",
+}, key=len, reverse=True)
+# 뜻을 바꾸지 않는 군말 어절
+_FILLER_WORDS = {"건가요", "건지", "건가", "거예요", "건데", "것인가요", "혹시", "좀", "그럼", "그러면", "근데", "그런데"}
+
+
+def normalize_question(question: str) -> str:
+    """소문자 + 스마트 따옴표 통일 + 구두점/연속 공백 정리."""
+    text = (question or "").lower().replace("’", "'").replace("‘", "'")
+    return " ".join(_NON_WORD_RE.sub(" ", text).split())
+
+
+def _content_word(word: str) -> str:
+    """어절에서 조사/어미 하나를 뗀 내용어 (군말이면 빈 문자열)."""
+    if word in _FILLER_WORDS:
+        return ""
+    for suffix in _SUFFIXES:
+        if len(word) > len(suffix) and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word if len(word) > 1 or word in ("안", "못", "왜") else ""
+
+
+def question_features(normalized: str):
+    """(영어 단어 집합, 영어를 뺀 나머지 어절들의 글자 1-gram/2-gram 집합, 내용어 집합)"""
+    latin = frozenset(_LATIN_WORD_RE.findall(normalized))
+    grams, content = set(), set()
+    for word in _LATIN_WORD_RE.sub(" ", normalized).split():
+        grams.update(word)
+        grams.update(word[i:i + 2] for i in range(len(word) - 1))
+        stem = _content_word(word)
+        if stem:
+            content.add(stem)
+    return latin, frozenset(grams), frozenset(content)
+
+
+def make_followup_scope(corrected: str, explanation_level: str, model: str, fingerprint: str) -> str:
+    raw = json.dumps([" ".join((corrected or "").split()), explanation_level, model, fingerprint],
+                     ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class FollowupCache:
+    def __init__(self, db_path: str = "", min_similarity: float = 1.0,
+                 ttl_seconds: float = 7 * 24 * 3600, max_entries: int = 20000):
+        """
+        min_similarity: 1이면 정규화 후 완전 일치만 (기본값).
+                        1보다 작으면 영어 단어와 내용어가 같고 글자 n-gram Dice 계수가 이 값 이상인 질문도
+                        같은 질문으로 봄 (0.7 이상 권장)
+        max_entries: 이보다 많아지면 가장 오래 안 쓴 질문부터 지움 (0이면 제한 없음)
+        """
+        self.min_similarity = min_similarity
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (scope, normalized) -> (created_at, answer, latin, grams, content), LRU 순
+        self._by_scope = {}            # scope -> {gram: set(normalized)}  (역색인)
+        self._counters = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "sets": 0,
+                          "evictions": 0, "expired": 0}
+
+        self._db = None
+        if db_path:
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS followup_cache ("
+                "scope TEXT NOT NULL, question TEXT NOT NULL, answer TEXT NOT NULL, "
+                "created_at REAL NOT NULL, PRIMARY KEY (scope, question))"
+            )
+            if ttl_seconds:
+                self._db.execute(
+                    "DELETE FROM followup_cache WHERE created_at < ?", (time.time() - ttl_seconds,)
+                )
+            self._db.commit()
+            for scope, normalized, answer, created_at in self._db.execute(
+                "SELECT scope, question, answer, created_at FROM followup_cache ORDER BY created_at"
+            ).fetchall():
+                self._insert(scope, normalized, answer, created_at)
+            self._delete_rows(self._evict_over_limit())
+
+    # ---------------------------
+    # 항목 관리 (모두 lock을 잡은 상태에서 호출)
+    # ---------------------------
+    def _insert(self, scope: str, normalized: str, answer: str, created_at: float):
+        latin, grams, content = question_features(normalized)
+        self._entries[(scope, normalized)] = (created_at, answer, latin, grams, content)
+        self._entries.move_to_end((scope, normalized))
+        index = self._by_scope.setdefault(scope, {})
+        for gram in grams:
+            index.setdefault(gram, set()).add(normalized)
+
+    def _remove(self, key):
+        scope, normalized = key
+        grams = self._entries.pop(key)[3]
+        index = self._by_scope.get(scope, {})
+        for gram in grams:
+            others = index.get(gram)
+            if others is not None:
+                others.discard(normalized)
+                if not others:
+                    del index[gram]
+        if not index:
+            self._by_scope.pop(scope, None)
+
+    def _evict_over_limit(self) -> list:
+        """max_entries를 넘는 만큼 가장 오래 안 쓴 항목을 빼고, 뺀 키 목록을 반환."""
+        removed = []
+        while self.max_entries and len(self._entries) > self.max_entries:
+            key = next(iter(self._entries))
+            self._remove(key)
+            removed.append(key)
+            self._counters["evictions"] += 1
+        return removed
+
+    def _delete_rows(self, keys: list):
+        if self._db is None or not keys:
+            return
+        self._db.executemany("DELETE FROM followup_cache WHERE scope = ? AND question = ?", keys)
+        self._db.commit()
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and (now - created_at) > self.ttl_seconds
+
+    # ---------------------------
+    # 공개 API
+    # ---------------------------
+    def get(self, scope: str, question: str):
+        """저장된 답변 (비슷한 질문도 없으면 None)."""
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+        now = time.time()
+        with self._lock:
+            expired = []
+            try:
+                return self._get_locked(scope, normalized, now, expired)
+            finally:
+                expired = [key for key in dict.fromkeys(expired) if key in self._entries]
+                for key in expired:
+                    self._remove(key)
+                self._counters["expired"] += len(expired)
+                self._delete_rows(expired)
+
+    def _get_locked(self, scope: str, normalized: str, now: float, expired: list):
+        """get() 본체. 지나가다 만난 만료 항목은 expired에 모아 두면 get()이 지운다."""
+        item = self._entries.get((scope, normalized))
+        if item is not None:
+            if not self._is_expired(item[0], now):
+                self._entries.move_to_end((scope, normalized))
+                self._counters["exact_hits"] += 1
+                return item[1]
+            expired.append((scope, normalized))
+
+        if self.min_similarity < 1:
+            latin, grams, content = question_features(normalized)
+            index = self._by_scope.get(scope, {})
+            overlap = {}
+            for gram in grams:
+                for other in index.get(gram, ()):
+                    overlap[other] = overlap.get(other, 0) + 1
+
+            best_key, best_answer, best_score = None, None, self.min_similarity
+            for other, common in overlap.items():
+                created_at, answer, other_latin, other_grams, other_content = self._entries[(scope, other)]
+                if self._is_expired(created_at, now):
+                    expired.append((scope, other))
+                    continue
+                if other_latin != latin or other_content != content:
+                    continue
+                score = 2 * common / (len(grams) + len(other_grams))
+                if score >= best_score:
+                    best_key, best_answer, best_score = other, answer, score
+            if best_answer is not None:
+                self._entries.move_to_end((scope, best_key))
+                self._counters["similar_hits"] += 1
+                return best_answer
+
+        self._counters["misses"] += 1
+        return None
+
+    def set(self, scope: str, question: str, answer: str):
+        normalized = normalize_question(question)
+        if not normalized or not answer:
+            return
+        now = time.time()
+        with self._lock:
+            self._insert(scope, normalized, answer, now)
+            self._counters["sets"] += 1
+            self._delete_rows(self._evict_over_limit())
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO followup_cache (scope, question, answer, created_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (scope, normalized, answer, now),
+                )
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+        lookups = stats["exact_hits"] + stats["similar_hits"] + stats["misses"]
+        stats["hit_ratio"] = (
+            (stats["exact_hits"] + stats["similar_hits"]) / lookups if lookups else 0.0
+        )
+        return stats
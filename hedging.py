@@ -0,0 +1,290 @@
+"""
+꼬리 지연 줄이기: 적응형 타임아웃 + 헤지 요청(hedged request)
+
+OpenAI 호출은 대부분 금방 끝나지만 가끔 한 건이 한참 걸린다. 고정 timeout=30이면
+학습자는 그동안 스피너만 보다가 오류를 받는다.
+
+- LatencyTracker : (작업, 모델, 스트림 여부)별 최근 소요시간으로
+                   · 헤지 시점 = p95 (이만큼 기다려도 안 끝나면 같은 요청을 하나 더 보냄)
+                   · 타임아웃 = p99 × 배수 (최소/최대값 사이로)
+                   표본이 충분히 쌓이기 전에는 헤지하지 않고 기본 타임아웃을 씀
+                   시간 초과된 호출은 타임아웃 값을 표본으로 남김 (중도 절단 표본)
+                   → 업스트림이 타임아웃보다 느려지면 p99가 타임아웃까지 올라가 타임아웃도 따라 늘어남
+- HedgeBudget : 추가 요청 비용 상한 (token bucket: 호출마다 ratio만큼 적립, 헤지 1번에 1개 사용)
+                → 장애로 모두 느려져도 추가 요청은 전체의 ratio 정도를 넘지 않음
+- Hedger : 먼저 성공한 응답을 쓰고 나머지는 취소/정리 (스레드용 call, asyncio용 acall)
+
+스트리밍 호출은 create()가 응답 헤더를 받을 때(첫 바이트)까지만 헤지한다.
+이미 토큰이 오기 시작한 스트림은 바꾸지 않는다.
+"""
+import asyncio
+import inspect
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import REGISTRY, percentile
+
+# openai를 import 하지 않고 시간 초과 예외를 알아보기 위한 클래스 이름
+TIMEOUT_ERROR_NAMES = {"APITimeoutError", "ReadTimeout", "TimeoutException"}
+
+
+def _is_timeout(exc: BaseException) -> bool:
+    return isinstance(exc, TimeoutError) or any(cls.__name__ in TIMEOUT_ERROR_NAMES
+                                                for cls in type(exc).__mro__)
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200, min_samples: int = 20, hedge_quantile: float = 0.95,
+                 timeout_multiplier: float = 3.0, min_timeout: float = 5.0, max_timeout: float = 30.0,
+                 min_delay: float = 0.05, refresh_every: int = 10):
+        """
+        window: 키마다 기억할 최근 소요시간 수
+        min_samples: 이만큼 쌓여야 헤지/적응형 타임아웃을 씀
+        hedge_quantile: 헤지를 보내는 시점 분위수
+        timeout_multiplier: 타임아웃 = p99 × 이 값 (0이면 항상 max_timeout)
+        refresh_every: 분위수를 다시 계산하는 주기 (표본 수 기준, 호출마다 정렬하지 않도록)
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self.hedge_quantile = hedge_quantile
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.min_delay = min_delay
+        self.refresh_every = refresh_every
+        self._lock = threading.Lock()
+        self._samples = {}   # key -> deque(소요시간)
+        self._pending = {}   # key -> 마지막 계산 이후 추가된 표본 수
+        self._limits = {}    # key -> (헤지 시점, 타임아웃)
+
+    def observe(self, key, seconds: float):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+                self._pending[key] = 0
+            samples.append(seconds)
+            self._pending[key] += 1
+            if len(samples) >= self.min_samples and (
+                    key not in self._limits or self._pending[key] >= self.refresh_every):
+                self._pending[key] = 0
+                self._limits[key] = self._compute(sorted(samples))
+
+    def _compute(self, values: list):
+        delay = max(self.min_delay, percentile(values, self.hedge_quantile))
+        if self.timeout_multiplier:
+            timeout = percentile(values, 0.99) * self.timeout_multiplier
+            timeout = min(self.max_timeout, max(self.min_timeout, timeout))
+        else:
+            timeout = self.max_timeout
+        return delay, timeout
+
+    def hedge_delay(self, key):
+        """헤지를 보낼 때까지 기다릴 시간(초). 표본이 부족하면 None (헤지 안 함)."""
+        limits = self._limits.get(key)
+        return limits[0] if limits else None
+
+    def timeout(self, key) -> float:
+        limits = self._limits.get(key)
+        return limits[1] if limits else self.max_timeout
+
+    def snapshot(self) -> list:
+        """키별 표본 수 / 헤지 시점 / 타임아웃 (모니터링용)."""
+        with self._lock:
+            items = [(key, len(samples), self._limits.get(key)) for key, samples in self._samples.items()]
+        return [
+            {"key": key, "samples": count,
+             "hedge_delay": limits[0] if limits else None,
+             "timeout": limits[1] if limits else self.max_timeout}
+            for key, count, limits in items
+        ]
+
+
+class HedgeBudget:
+    """추가 요청 예산 (token bucket). ratio=0.05면 헤지는 전체 호출의 약 5% + burst를 넘지 않음."""
+
+    def __init__(self, ratio: float = 0.05, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._tokens = burst if ratio > 0 else 0.0
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            return True
+
+
+def _discard(result, on_discard=None):
+    """진 쪽 응답 정리: 사용량 기록 콜백 + 스트림이면 연결 닫기."""
+    if on_discard is not None:
+        on_discard(result)
+    close = getattr(result, "close", None)
+    if close is not None:
+        closing = close()
+        if inspect.isawaitable(closing):
+            asyncio.ensure_future(closing)
+
+
+class Hedger:
+    def __init__(self, tracker: LatencyTracker, budget: HedgeBudget, max_workers: int = 32,
+                 on_attempt=None):
+        """on_attempt(): 헤지 요청을 하나 더 보낼 때마다 부름 (호출한 스레드/태스크에서)"""
+        self.tracker = tracker
+        self.budget = budget
+        self.max_workers = max_workers
+        self.on_attempt = on_attempt
+        self._lock = threading.Lock()
+        self._pool = None
+        self._counters = {"calls": 0, "hedged": 0, "hedge_wins": 0, "denied": 0}
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="hedge")
+            return self._pool
+
+    def _count(self, counter: str, key=None, outcome: str = ""):
+        with self._lock:
+            self._counters[counter] += 1
+        if outcome:
+            REGISTRY.inc("llm_hedges_total", op=key[0], model=key[1], outcome=outcome)
+
+    def _start(self, key):
+        """(타임아웃, 헤지 시점). 호출 1건마다 예산을 적립. 예산이 0이면 헤지 시점 None."""
+        self._count("calls")
+        if self.budget.ratio <= 0:
+            return self.tracker.timeout(key), None
+        self.budget.deposit()
+        return self.tracker.timeout(key), self.tracker.hedge_delay(key)
+
+    def _timed(self, key, fn, timeout: float):
+        started = time.perf_counter()
+        try:
+            result = fn(timeout)
+        except Exception as e:
+            self._observe_failure(key, e, timeout)
+            raise
+        self.tracker.observe(key, time.perf_counter() - started)
+        return result
+
+    def _observe_failure(self, key, exc: Exception, timeout: float):
+        """시간 초과면 타임아웃 값을 표본으로 (안 남기면 느려진 업스트림에 맞춰 타임아웃이 늘어날 수 없음)."""
+        if _is_timeout(exc):
+            self.tracker.observe(key, timeout)
+
+    def call(self, key, fn, on_discard=None):
+        """
+        fn(timeout)을 호출. key의 p95가 지나도 끝나지 않으면(예산이 있으면) 같은 호출을 하나 더 보내고
+        먼저 성공한 결과를 돌려준다. 둘 다 실패하면 마지막 예외. 진 쪽 결과는 on_discard 후 close().
+        key: (작업, 모델, ...) 튜플
+        """
+        timeout, delay = self._start(key)
+        if delay is None:
+            return self._timed(key, fn, timeout)
+
+        pool = self._executor()
+        legs = [pool.submit(self._timed, key, fn, timeout)]
+        winner = None
+        try:
+            done, _ = wait(legs, timeout=delay)
+            if not done:
+                self._hedge(key, lambda: legs.append(pool.submit(self._timed, key, fn, timeout)))
+            pending, error = set(legs), None
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for leg in done:
+                    if leg.exception() is None:
+                        winner = leg
+                        self._record_winner(key, legs, leg)
+                        return leg.result()
+                    error = leg.exception()
+            raise error
+        finally:
+            for leg in legs:
+                if leg is not winner and not leg.cancel():
+                    leg.add_done_callback(
+                        lambda f: f.exception() is None and _discard(f.result(), on_discard))
+
+    async def acall(self, key, coro_fn, on_discard=None):
+        """call()의 asyncio 버전 (coro_fn(timeout)은 coroutine 함수). 진 쪽 task는 취소."""
+        timeout, delay = self._start(key)
+        if delay is None:
+            return await self._atimed(key, coro_fn, timeout)
+
+        legs = [asyncio.ensure_future(self._atimed(key, coro_fn, timeout))]
+        winner = None
+        try:
+            done, _ = await asyncio.wait(legs, timeout=delay)
+            if not done:
+                self._hedge(key, lambda: legs.append(
+                    asyncio.ensure_future(self._atimed(key, coro_fn, timeout))))
+            pending, error = set(legs), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for leg in done:
+                    if leg.exception() is None:
+                        winner = leg
+                        self._record_winner(key, legs, leg)
+                        return leg.result()
+                    error = leg.exception()
+            raise error
+        finally:
+            for leg in legs:
+                if leg is winner:
+                    continue
+                if not leg.done():
+                    leg.cancel()
+                elif not leg.cancelled() and leg.exception() is None:
+                    _discard(leg.result(), on_discard)
+
+    async def _atimed(self, key, coro_fn, timeout: float):
+        started = time.perf_counter()
+        try:
+            result = await coro_fn(timeout)
+        except Exception as e:
+            self._observe_failure(key, e, timeout)
+            raise
+        self.tracker.observe(key, time.perf_counter() - started)
+        return result
+
+    def _hedge(self, key, send):
+        if self.budget.withdraw():
+            self._count("hedged", key, "sent")
+            if self.on_attempt is not None:
+                self.on_attempt()
+            send()
+        else:
+            self._count("denied", key, "denied")
+
+    def _record_winner(self, key, legs: list, leg):
+        if len(legs) > 1:
+            if leg is legs[0]:
+                REGISTRY.inc("llm_hedges_total", op=key[0], model=key[1], outcome="wasted")
+            else:
+                self._count("hedge_wins", key, "won")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        stats["hedge_ratio"] = stats["hedged"] / stats["calls"] if stats["calls"] else 0.0
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+
+REGISTRY.describe("llm_hedges_total",
+                  "Hedged LLM requests: sent, won (hedge answered first), wasted (original answered first) "
+                  "or denied (over the extra-cost budget)")
@@ -0,0 +1,241 @@
+"""
+학습 기록 저장소 (SQLite, 로컬)
+
+학습자 정보/점수/채점 내역/추가 질문은 st.session_state에만 있어서 새로고침하면 사라지고,
+진도를 보려면 n8n 같은 외부 서비스를 거쳐야 했다. 여기서는 모든 분석/채점/질문을 로컬에 쌓는다.
+
+- events       : 원본 기록 (append-only, 나중에 집계를 다시 만들 때 사용)
+- learners     : 학습자 키 → 반(class), 표시 이름
+- rollup_daily : (범위, 범위 id, 날짜, 태그) 단위로 미리 더해 둔 집계
+                 기록할 때 같은 트랜잭션에서 UPSERT로 더하므로 조회할 때 원본을 다시 훑지 않는다.
+                 범위(scope)는 "learner" / "class", 태그 ""인 행은 날짜별 합계(분석 수, 점수 등)
+조회는 전부 rollup_daily의 기본 키(범위, id, 날짜, 태그) 앞부분 범위 검색이라
+원본 기록이 수백만 건이어도 (학습자 수 × 날짜 × 태그) 크기만큼만 읽는다.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from quiz_bank import result_tags
+
+DAY_SECONDS = 86400
+DEFAULT_CLASS = "default"
+
+# rollup_daily에서 더해 가는 값들 (태그 "" 행에만 쓰는 합계 / 태그별 행에만 쓰는 값)
+_TOTAL_COLUMNS = ("analyses", "gradings", "score", "score_total", "followups")
+_TAG_COLUMNS = ("errors", "attempts", "correct")
+_ROLLUP_COLUMNS = _TOTAL_COLUMNS + _TAG_COLUMNS
+
+
+def make_learner_key(learner_id: str, phone4: str) -> str:
+    """이름/ID + 휴대폰 뒤 4자리로 만든 학습자 키 (원문은 저장하지 않음)."""
+    raw = f"{' '.join((learner_id or '').lower().split())}|{(phone4 or '').strip()}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class LearnerStore:
+    def __init__(self, db_path: str = ""):
+        """db_path: SQLite 파일 경로 (비우면 메모리에만 보관)"""
+        if db_path:
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path or ":memory:", check_same_thread=False)
+        if db_path:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY,
+                ts REAL NOT NULL,
+                learner_key TEXT NOT NULL,
+                class_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS events_learner_ts ON events (learner_key, ts);
+            CREATE TABLE IF NOT EXISTS learners (
+                learner_key TEXT PRIMARY KEY,
+                class_id TEXT NOT NULL,
+                display_name TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS learners_class ON learners (class_id);
+            CREATE TABLE IF NOT EXISTS rollup_daily (
+                scope TEXT NOT NULL,
+                scope_id TEXT NOT NULL,
+                day INTEGER NOT NULL,
+                tag TEXT NOT NULL,
+                analyses INTEGER NOT NULL DEFAULT 0,
+                errors INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                correct INTEGER NOT NULL DEFAULT 0,
+                gradings INTEGER NOT NULL DEFAULT 0,
+                score INTEGER NOT NULL DEFAULT 0,
+                score_total INTEGER NOT NULL DEFAULT 0,
+                followups INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (scope, scope_id, day, tag)
+            ) WITHOUT ROWID;
+            """
+        )
+        self._db.commit()
+
+    # ---------------------------
+    # 기록
+    # ---------------------------
+    def record_analysis(self, learner_key: str, class_id: str, display_name: str, result: dict,
+                        source: str = "ai", ts: float = None):
+        """분석 1건: 설명 focus 태그별 오류 빈도."""
+        tags = result_tags(result)
+        payload = {"tags": tags, "level": result.get("level"), "source": source}
+        self._record(learner_key, class_id, display_name, "analysis", payload, ts)
+
+    def record_grading(self, learner_key: str, class_id: str, display_name: str, result: dict,
+                       details: list, ts: float = None):
+        """채점 1건: 점수 추이 + (분석 태그별) 문항 정답률."""
+        payload = {
+            "tags": result_tags(result),
+            "score": sum(1 for d in details if d.get("is_correct")),
+            "total": len(details),
+        }
+        self._record(learner_key, class_id, display_name, "grading", payload, ts)
+
+    def record_followup(self, learner_key: str, class_id: str, display_name: str, result: dict,
+                        ts: float = None):
+        self._record(learner_key, class_id, display_name, "followup",
+                     {"tags": result_tags(result)}, ts)
+
+    def _record(self, learner_key: str, class_id: str, display_name: str, kind: str,
+                payload: dict, ts: float = None):
+        ts = time.time() if ts is None else ts
+        class_id = class_id or DEFAULT_CLASS
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO events (ts, learner_key, class_id, kind, payload) VALUES (?, ?, ?, ?, ?)",
+                (ts, learner_key, class_id, kind, json.dumps(payload, ensure_ascii=False)),
+            )
+            self._db.execute(
+                "INSERT INTO learners (learner_key, class_id, display_name, first_seen, last_seen) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (learner_key) DO UPDATE SET "
+                "class_id = excluded.class_id, display_name = excluded.display_name, "
+                "last_seen = MAX(last_seen, excluded.last_seen)",
+                (learner_key, class_id, display_name or "", ts, ts),
+            )
+            self._apply_rollup(learner_key, class_id, kind, payload, ts)
+            self._db.commit()
+
+    def _apply_rollup(self, learner_key: str, class_id: str, kind: str, payload: dict, ts: float):
+        """기록 1건을 rollup_daily에 더함 (lock을 잡은 상태에서 호출)."""
+        day = int(ts // DAY_SECONDS)
+        tags = payload.get("tags") or []
+        if kind == "analysis":
+            total = {"analyses": 1}
+            per_tag = {"errors": 1}
+        elif kind == "grading":
+            total = {"gradings": 1, "score": payload["score"], "score_total": payload["total"]}
+            per_tag = {"attempts": payload["total"], "correct": payload["score"]}
+        else:
+            total = {"followups": 1}
+            per_tag = {}
+
+        rows = [("", total)] + ([(tag, per_tag) for tag in tags] if per_tag else [])
+        for scope, scope_id in (("learner", learner_key), ("class", class_id)):
+            for tag, values in rows:
+                cols = ", ".join(values)
+                updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in values)
+                self._db.execute(
+                    f"INSERT INTO rollup_daily (scope, scope_id, day, tag, {cols}) "
+                    f"VALUES (?, ?, ?, ?, {', '.join('?' * len(values))}) "
+                    f"ON CONFLICT (scope, scope_id, day, tag) DO UPDATE SET {updates}",
+                    (scope, scope_id, day, tag, *values.values()),
+                )
+
+    def rebuild_rollups(self):
+        """원본 기록(events)으로 집계를 처음부터 다시 만든다 (집계 방식을 바꿨을 때)."""
+        with self._lock:
+            self._db.execute("DELETE FROM rollup_daily")
+            for learner_key, class_id, kind, payload, ts in self._db.execute(
+                "SELECT learner_key, class_id, kind, payload, ts FROM events ORDER BY id"
+            ).fetchall():
+                self._apply_rollup(learner_key, class_id, kind, json.loads(payload), ts)
+            self._db.commit()
+
+    # ---------------------------
+    # 조회 (rollup_daily만 읽음)
+    # ---------------------------
+    def summary(self, scope: str, scope_id: str, days: int = 30, now: float = None) -> dict:
+        """
+        scope: "learner" / "class"
+        최근 days일의 합계, 태그별 오류 빈도 / 정답률(약한 규칙 순), 날짜별 점수 추이.
+        """
+        now = time.time() if now is None else now
+        since = int(now // DAY_SECONDS) - days + 1
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT day, tag, {', '.join(_ROLLUP_COLUMNS)} FROM rollup_daily "
+                f"WHERE scope = ? AND scope_id = ? AND day >= ?",
+                (scope, scope_id, since),
+            ).fetchall()
+            learners = None
+            if scope == "class":
+                learners = self._db.execute(
+                    "SELECT COUNT(*) FROM learners WHERE class_id = ?", (scope_id,)
+                ).fetchone()[0]
+
+        totals = dict.fromkeys(_TOTAL_COLUMNS, 0)
+        by_tag = {}
+        trend = []
+        for day, tag, *values in rows:
+            values = dict(zip(_ROLLUP_COLUMNS, values))
+            if tag == "":
+                for key in _TOTAL_COLUMNS:
+                    totals[key] += values[key]
+                if values["gradings"]:
+                    trend.append({"day": day * DAY_SECONDS, "gradings": values["gradings"],
+                                  "score_rate": values["score"] / values["score_total"]
+                                  if values["score_total"] else 0.0})
+                continue
+            t = by_tag.setdefault(tag, {"tag": tag, "errors": 0, "attempts": 0, "correct": 0})
+            t["errors"] += values["errors"]
+            t["attempts"] += values["attempts"]
+            t["correct"] += values["correct"]
+
+        for t in by_tag.values():
+            t["correct_rate"] = t["correct"] / t["attempts"] if t["attempts"] else None
+        focus = sorted(by_tag.values(), key=lambda t: (-t["errors"], t["tag"]))
+        # 약한 규칙: 채점된 문항이 있는 태그 중 정답률이 낮은 순 (같으면 자주 틀린 순)
+        weakest = sorted(
+            (t for t in by_tag.values() if t["attempts"]),
+            key=lambda t: (t["correct_rate"], -t["errors"]),
+        )
+        summary = {
+            "days": days,
+            "totals": totals,
+            "avg_score_rate": totals["score"] / totals["score_total"] if totals["score_total"] else None,
+            "focus": focus,
+            "weakest": weakest,
+            "trend": sorted(trend, key=lambda t: t["day"]),
+        }
+        if learners is not None:
+            summary["learners"] = learners
+        return summary
+
+    def learner_summary(self, learner_key: str, days: int = 30, now: float = None) -> dict:
+        return self.summary("learner", learner_key, days, now)
+
+    def class_summary(self, class_id: str, days: int = 30, now: float = None) -> dict:
+        return self.summary("class", class_id or DEFAULT_CLASS, days, now)
+
+    def stats(self) -> dict:
+        with self._lock:
+            events, learners, rollups = self._db.execute(
+                "SELECT (SELECT MAX(id) FROM events), (SELECT COUNT(*) FROM learners), "
+                "(SELECT COUNT(*) FROM rollup_daily)"
+            ).fetchone()
+        return {"events": events or 0, "learners": learners, "rollup_rows": rollups}
@@ -0,0 +1,327 @@
+"""
+가벼운 성능 측정 도구
+
+- LatencyWindow: 최근 N개 소요시간(초)을 보관하고 p50/p95/p99를 계산
+- MetricsRegistry: 라벨별 카운터 + 고정 버킷 히스토그램 (핫패스에서는 dict 갱신 1번)
+  · REGISTRY: 프로세스 전역 레지스트리 (LLM 호출 / rerun / 웹훅 전송이 여기에 기록)
+  · 캐시 적중률처럼 이미 다른 객체가 세고 있는 값은 collector로 읽을 때만 가져옴
+- MetricsExporter: Prometheus 텍스트(/metrics HTTP) 또는 JSONL 파일로 내보내는 백그라운드 스레드
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """이미 정렬된 리스트의 q 분위수 (0~1, nearest-rank)."""
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+class LatencyWindow:
+    """최근 maxlen개 측정값의 분위수를 내는 롤링 윈도 (스레드 안전)."""
+
+    def __init__(self, maxlen: int = 500):
+        self._values = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._values.append(seconds)
+            self.count += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            values = sorted(self._values)
+            count = self.count
+        return {
+            "count": count,
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+        }
+
+
+# ---------------------------
+# 라벨별 카운터 / 히스토그램
+# ---------------------------
+# 초 단위 지연시간 버킷 (LLM 호출 수 초 ~ rerun 수 ms를 모두 담을 수 있게)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+class Histogram:
+    """누적 버킷 히스토그램 (Prometheus histogram과 같은 구조). lock은 레지스트리가 잡음."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 마지막 칸은 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """버킷 안에서 선형 보간한 분위수 추정값 (histogram_quantile과 같은 방식)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for idx, c in enumerate(self.counts):
+            if seen + c >= rank and c:
+                lower = self.buckets[idx - 1] if idx > 0 else 0.0
+                if idx == len(self.buckets):
+                    return lower  # +Inf 버킷: 알 수 있는 최댓값은 마지막 경계
+                upper = self.buckets[idx]
+                return lower + (upper - lower) * (rank - seen) / c
+            seen += c
+        return self.buckets[-1]
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class MetricsRegistry:
+    """
+    카운터(inc) / 히스토그램(observe) 저장소 (스레드 안전).
+    이름과 라벨 조합마다 값 하나씩: ("llm_tokens_total", (("model", "gpt-4.1-mini"), ...)) -> 값
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}    # (name, label_key) -> float
+        self._histograms = {}  # (name, label_key) -> Histogram
+        self._help = {}
+        self._collectors = []
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+            hist.observe(seconds)
+
+    def timer(self, name: str, **labels):
+        """with REGISTRY.timer("op_seconds", op="x"): ...  (예외가 나도 소요시간은 기록)"""
+        return _Timer(self, name, labels)
+
+    def register_collector(self, fn):
+        """
+        fn() -> [(이름, 라벨 dict, 값), ...] 을 내보낼 때마다 호출해 gauge로 추가.
+        (캐시 적중률, 대기열 길이처럼 다른 객체가 이미 세고 있는 값을 핫패스 비용 없이 노출)
+        """
+        self._collectors.append(fn)
+
+    def _gauges(self) -> list:
+        gauges = []
+        for fn in list(self._collectors):
+            try:
+                gauges.extend(fn())
+            except Exception:
+                continue
+        return gauges
+
+    # ---------------------------
+    # 내보내기
+    # ---------------------------
+    def snapshot(self) -> dict:
+        """JSON으로 바로 직렬화할 수 있는 현재 값 (히스토그램은 p50/p95/p99 추정값 포함)."""
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = [
+                (key, hist.count, hist.sum, hist.quantile(0.50), hist.quantile(0.95), hist.quantile(0.99))
+                for key, hist in self._histograms.items()
+            ]
+        return {
+            "ts": time.time(),
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(counters)
+            ],
+            "histograms": [
+                {"name": name, "labels": dict(labels), "count": count, "sum": total,
+                 "p50_ms": p50 * 1000, "p95_ms": p95 * 1000, "p99_ms": p99 * 1000}
+                for (name, labels), count, total, p50, p95, p99 in sorted(histograms)
+            ],
+            "gauges": [
+                {"name": name, "labels": labels, "value": value}
+                for name, labels, value in self._gauges()
+            ],
+        }
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, list(h.buckets), list(h.counts), h.sum, h.count)
+                for key, h in self._histograms.items()
+            )
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            if name in typed:
+                return
+            typed.add(name)
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), buckets, counts, total, count in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, c in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += c
+                le = bound if bound == "+Inf" else _format_value(bound)
+                lines.append(
+                    f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}"
+                )
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for name, labels, value in sorted(self._gauges(), key=lambda g: g[0]):
+            header(name, "gauge")
+            lines.append(f"{name}{_format_labels(_label_key(labels))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "labels", "started")
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.name, time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for k, v in labels:
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+# 프로세스 전역 레지스트리 (Streamlit rerun과 무관하게 유지)
+REGISTRY = MetricsRegistry()
+
+
+# ---------------------------
+# 내보내기 스레드 (Prometheus HTTP / JSONL)
+# ---------------------------
+class MetricsExporter:
+    def __init__(self, registry: MetricsRegistry = None, port: int = 0, host: str = "127.0.0.1",
+                 jsonl_path: str = "", interval: float = 60.0):
+        """
+        port > 0: http://host:port/metrics 에서 Prometheus 텍스트 제공 (/metrics.json 은 JSON)
+        jsonl_path: interval초마다 snapshot()을 한 줄씩 덧붙임
+        둘 다 별도 데몬 스레드에서 동작하므로 Streamlit 스크립트 실행과 경쟁하지 않는다.
+        """
+        self.registry = registry or REGISTRY
+        self.port = port
+        self.host = host
+        self.jsonl_path = jsonl_path
+        self.interval = interval
+        self._server = None
+        self._threads = []
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        if self.port:
+            registry = self.registry
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.startswith("/metrics.json"):
+                        body = json.dumps(registry.snapshot(), ensure_ascii=False).encode("utf-8")
+                        ctype = "application/json; charset=utf-8"
+                    elif self.path.startswith("/metrics"):
+                        body = registry.to_prometheus().encode("utf-8")
+                        ctype = "text/plain; version=0.0.4; charset=utf-8"
+                    else:
+                        self.send_error(404)
+                        return
+                    self.send_response(200)
+                    self.send_header("Content-Type", ctype)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+            self._server.daemon_threads = True
+            self._spawn(self._server.serve_forever, "metrics-http")
+        if self.jsonl_path:
+            self._spawn(self._write_jsonl_loop, "metrics-jsonl")
+
+    def _spawn(self, target, name):
+        t = threading.Thread(target=target, name=name, daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def _write_jsonl_loop(self):
+        path_dir = os.path.dirname(self.jsonl_path)
+        if path_dir:
+            os.makedirs(path_dir, exist_ok=True)
+        while not self._stop.wait(self.interval):
+            self.write_jsonl()
+
+    def write_jsonl(self):
+        line = json.dumps(self.registry.snapshot(), ensure_ascii=False)
+        with open(self.jsonl_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
@@ -0,0 +1,117 @@
+"""
+모델 캐스케이드 (싼 모델 먼저, 필요할 때만 강한 모델로)
+
+1) 작은/빠른 모델로 먼저 분석
+2) 결과를 로컬에서 검사 (check_analysis)
+   - JSON 스키마 위반
+   - 퀴즈 개수 5~8 범위 밖, 객관식 정답이 보기 안에 없음
+   - 교정문이 비었거나, 원문과의 diff가 너무 커서(문장을 통째로 새로 씀) 교정으로 보기 어려움
+3) 문제가 있거나, 모델 스스로 문장 난이도를 "advanced"로 판단하면 강한 모델로 다시 요청
+
+RoutingLog: 단계(tier)별 호출 수 / 승격(escalation) 사유 / 지연시간 / 비용을 모아 임계값 조정에 사용
+"""
+import threading
+import time
+from collections import deque
+
+from diff_engine import diff_tokens, tokenize
+from metrics import REGISTRY, LatencyWindow
+
+QUIZ_MIN, QUIZ_MAX = 5, 8
+# 원문 토큰 중 이 비율 넘게 바뀌면 "교정"이 아니라 다시 쓴 것으로 봄
+MAX_REWRITE_RATIO = 0.6
+
+
+def check_analysis(sentence: str, result: dict, check_schema, check_quizzes: bool = True) -> list:
+    """
+    싼 모델 결과를 그대로 써도 되는지 검사. 문제 목록(문자열)을 반환 (비었으면 통과).
+    check_schema: schema_validate.compile_schema()로 미리 만든 검사 함수
+    """
+    problems = [f"schema: {e}" for e in check_schema(result)[:3]]
+    if not isinstance(result, dict):
+        return problems or ["schema: 결과가 object가 아닙니다."]
+
+    quizzes = result.get("quizzes")
+    if check_quizzes and isinstance(quizzes, list):
+        if not QUIZ_MIN <= len(quizzes) <= QUIZ_MAX:
+            problems.append(f"quiz_count: {len(quizzes)}개 (허용 {QUIZ_MIN}~{QUIZ_MAX})")
+        for q in quizzes:
+            if (isinstance(q, dict) and q.get("type") == "mcq"
+                    and q.get("answer") not in (q.get("options") or [])):
+                problems.append(f"quiz_answer: {q.get('id')} 정답이 보기에 없습니다.")
+                break
+
+    corrected = result.get("corrected_sentence")
+    if isinstance(corrected, str):
+        if not corrected.strip():
+            problems.append("corrected: 교정문이 비어 있습니다.")
+        else:
+            orig_tokens = [t.strip().lower() for t in tokenize(sentence)]
+            corr_tokens = [t.strip().lower() for t in tokenize(corrected)]
+            a_changed, _ = diff_tokens(orig_tokens, corr_tokens)
+            if orig_tokens and sum(a_changed) / len(orig_tokens) > MAX_REWRITE_RATIO:
+                problems.append(
+                    f"corrected: 원문 토큰의 {sum(a_changed) / len(orig_tokens):.0%}가 바뀜 (다시 쓴 문장으로 보임)"
+                )
+    return problems
+
+
+def escalation_reason(problems: list, result: dict, escalate_levels) -> str:
+    """강한 모델로 넘길 이유 (없으면 빈 문자열)."""
+    if problems:
+        return problems[0].split(":", 1)[0]
+    if isinstance(result, dict) and result.get("level") in escalate_levels:
+        return f"level={result.get('level')}"
+    return ""
+
+
+class RoutingLog:
+    """캐스케이드 라우팅 결정 기록 (스레드 안전)."""
+
+    def __init__(self, maxlen: int = 500):
+        self._lock = threading.Lock()
+        self._decisions = deque(maxlen=maxlen)
+        self._tiers = {}  # tier -> {"calls", "accepted", "escalated", "cost_usd", "latency"}
+        self._reasons = {}
+
+    def record(self, tier: str, model: str, seconds: float, cost_usd: float, reason: str,
+               problems: list = None):
+        """reason이 비어 있으면 이 단계 결과를 채택, 아니면 다음 단계로 승격."""
+        with self._lock:
+            t = self._tiers.get(tier)
+            if t is None:
+                t = self._tiers[tier] = {"calls": 0, "accepted": 0, "escalated": 0,
+                                         "cost_usd": 0.0, "latency": LatencyWindow()}
+            t["calls"] += 1
+            t["cost_usd"] += cost_usd
+            t["escalated" if reason else "accepted"] += 1
+            if reason:
+                self._reasons[reason] = self._reasons.get(reason, 0) + 1
+            self._decisions.append({
+                "ts": time.time(), "tier": tier, "model": model,
+                "latency_ms": seconds * 1000, "cost_usd": cost_usd,
+                "escalated": bool(reason), "reason": reason, "problems": (problems or [])[:3],
+            })
+        t["latency"].observe(seconds)
+        REGISTRY.inc("llm_routing_total", tier=tier, model=model,
+                     outcome="escalated" if reason else "accepted")
+        REGISTRY.observe("llm_routing_tier_seconds", seconds, tier=tier, model=model)
+
+    def decisions(self, limit: int = 50) -> list:
+        with self._lock:
+            return list(self._decisions)[-limit:]
+
+    def stats(self) -> dict:
+        with self._lock:
+            tiers = {
+                name: {
+                    "calls": t["calls"], "accepted": t["accepted"], "escalated": t["escalated"],
+                    "cost_usd": t["cost_usd"], "latency": t["latency"],
+                }
+                for name, t in self._tiers.items()
+            }
+            reasons = dict(self._reasons)
+        for t in tiers.values():
+            t["latency"] = t["latency"].summary()
+            t["escalation_rate"] = t["escalated"] / t["calls"] if t["calls"] else 0.0
+        return {"tiers": tiers, "escalation_reasons": reasons}
@@ -0,0 +1,294 @@
+"""
+거의 같은 문장(near-duplicate) 색인
+
+학습자가 같은 문장을 공백/대소문자/마침표/따옴표만 바꿔 다시 내는 경우가 많다.
+  1) 정규화(canonicalize)한 문장이 완전히 같으면 dict로 바로 찾고
+  2) 아니면 문자 n-gram MinHash + LSH 밴드로 후보만 추린 뒤
+  3) 정규화 편집거리(Levenshtein / 긴 문장 길이)가 max_distance 이하이고
+     단어(글자/숫자, 단어 안의 아포스트로피 포함)는 하나도 다르지 않은 것만 인정
+     → 문법 교정에서는 글자 하나(walk/walks, has/had)가 곧 오류이므로 글자 차이는 절대 합치지 않음.
+       쉼표/따옴표/하이픈/띄어쓰기 차이만 같은 문장으로 본다.
+
+수십만 문장이 쌓여도 조회는 후보 몇 개만 비교하므로 빠르다.
+색인 항목은 SQLite에 저장해 두고 시작할 때 다시 읽어 온다.
+분석 캐시처럼 유효기간(ttl_seconds)과 최대 개수(max_entries)를 넘은 오래된 항목은 지운다.
+"""
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+
+_QUOTE_MAP = str.maketrans({
+    "‘": "'", "’": "'", "‚": "'", "′": "'",
+    "“": '"', "”": '"', "„": '"', "″": '"',
+    "–": "-", "—": "-", " ": " ",
+})
+_TRAILING_PUNCT_RE = re.compile(r"[\s.!?]+$")
+_SPACE_BEFORE_PUNCT_RE = re.compile(r"\s+([,.!?;:])")
+_WORD_RE = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def canonicalize(sentence: str) -> str:
+    """공백/대소문자/스마트 따옴표/문장 끝 마침표 차이를 없앤 비교용 문자열."""
+    text = (sentence or "").translate(_QUOTE_MAP).lower()
+    text = " ".join(text.split())
+    text = _SPACE_BEFORE_PUNCT_RE.sub(r"\1", text)
+    return _TRAILING_PUNCT_RE.sub("", text)
+
+
+def words_of(canonical: str) -> list:
+    """비교용 단어 목록 (문장 부호/따옴표/띄어쓰기는 버리고 it's 같은 단어 안 아포스트로피는 유지)."""
+    return _WORD_RE.findall(canonical)
+
+
+def bounded_edit_distance(a: str, b: str, limit: int):
+    """편집거리가 limit 이하이면 그 값을, 넘으면 None (대각선 띠만 계산)."""
+    if abs(len(a) - len(b)) > limit:
+        return None
+    if len(a) > len(b):
+        a, b = b, a
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        lo = max(1, i - limit)
+        hi = min(len(b), i + limit)
+        cur = [limit + 1] * (len(b) + 1)
+        cur[0] = i
+        row_min = cur[0] if lo == 1 else limit + 1
+        ca = a[i - 1]
+        for j in range(lo, hi + 1):
+            cost = 0 if ca == b[j - 1] else 1
+            v = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            cur[j] = v
+            if v < row_min:
+                row_min = v
+        if row_min > limit:
+            return None
+        prev = cur
+    return prev[len(b)] if prev[len(b)] <= limit else None
+
+
+class NearDuplicateIndex:
+    def __init__(self, db_path: str = "", max_distance: float = 0.0,
+                 shingle_size: int = 4, bands: int = 8, rows_per_band: int = 4, seed: int = 1,
+                 max_entries: int = 50000, ttl_seconds: float = 7 * 24 * 3600):
+        """
+        max_distance: 허용할 정규화 편집거리 (0이면 정규화 후 완전히 같은 문장만).
+                      0보다 커도 단어가 다르면 합치지 않음 (문장 부호/띄어쓰기 차이만 허용)
+        bands × rows_per_band = MinHash 해시 개수
+        max_entries / ttl_seconds: 분석 캐시와 같은 기준으로 오래된 항목부터 지움
+                      (0이면 제한 없음) → 캐시에서 이미 빠진 키가 색인에만 계속 쌓이지 않게
+        """
+        self.max_distance = max_distance
+        self.shingle_size = shingle_size
+        self.bands = bands
+        self.rows_per_band = rows_per_band
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        rng = random.Random(seed)
+        num_perm = bands * rows_per_band
+        self._perms = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()               # id -> (scope, canonical, value, created_at, signature), 오래된 순
+        self._exact = {}                            # (scope, canonical) -> id
+        self._buckets = [dict() for _ in range(bands)]  # band -> {(scope, band_sig): [id, ...]}
+        self._next_id = 0
+        self._counters = {"exact_hits": 0, "near_hits": 0, "misses": 0, "candidates_checked": 0,
+                          "evictions": 0, "expired": 0}
+
+        self._db = None
+        if db_path:
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            # MinHash 서명도 함께 저장해서, 재시작 시 수십만 문장의 서명을 다시 계산하지 않음
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS near_dup_index ("
+                "scope TEXT NOT NULL, canonical TEXT NOT NULL, value TEXT NOT NULL, "
+                "signature BLOB, created_at REAL NOT NULL DEFAULT 0, PRIMARY KEY (scope, canonical))"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(near_dup_index)")}
+            if "created_at" not in columns:
+                # 예전 파일: 만든 시각이 없으니 지금 만든 것으로 보고 TTL을 새로 시작
+                self._db.execute("ALTER TABLE near_dup_index ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+                self._db.execute("UPDATE near_dup_index SET created_at = ?", (time.time(),))
+            if self.ttl_seconds:
+                self._db.execute(
+                    "DELETE FROM near_dup_index WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+                )
+            self._db.commit()
+            for scope, canonical, value, sig_blob, created_at in self._db.execute(
+                "SELECT scope, canonical, value, signature, created_at FROM near_dup_index "
+                "ORDER BY created_at"
+            ).fetchall():
+                signature = None
+                if sig_blob and len(sig_blob) == 8 * num_perm:
+                    signature = array("Q", sig_blob).tolist()
+                self._insert(scope, canonical, value, created_at, signature)
+            self._delete_rows(self._prune(time.time()))
+
+    # ---------------------------
+    # MinHash / LSH
+    # ---------------------------
+    def _signature(self, canonical: str) -> list:
+        k = self.shingle_size
+        text = f" {canonical} "
+        shingles = {text[i:i + k] for i in range(max(1, len(text) - k + 1))}
+        hashed = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+        return [min((a * h + b) % _MERSENNE_PRIME for h in hashed) for a, b in self._perms]
+
+    def _band_keys(self, scope: str, signature: list):
+        r = self.rows_per_band
+        for band in range(self.bands):
+            yield band, (scope, tuple(signature[band * r:(band + 1) * r]))
+
+    # ---------------------------
+    # 항목 관리 (모두 lock을 잡은 상태에서 호출)
+    # ---------------------------
+    def _insert(self, scope: str, canonical: str, value: str, created_at: float, signature: list = None):
+        """새로 계산한(또는 받은) 서명을 반환. 이미 있는 문장이면 값/시각만 바꾸고 가장 최근으로 옮김."""
+        existing = self._exact.get((scope, canonical))
+        if existing is not None:
+            signature = self._entries[existing][4]
+            self._entries[existing] = (scope, canonical, value, created_at, signature)
+            self._entries.move_to_end(existing)
+            return signature
+        entry_id = self._next_id
+        self._next_id += 1
+        if self.max_distance > 0:
+            if signature is None:
+                signature = self._signature(canonical)
+            for band, key in self._band_keys(scope, signature):
+                self._buckets[band].setdefault(key, []).append(entry_id)
+        self._entries[entry_id] = (scope, canonical, value, created_at, signature)
+        self._exact[(scope, canonical)] = entry_id
+        return signature
+
+    def _remove(self, entry_id: int):
+        """색인에서 항목을 빼고 (scope, canonical)을 반환 (디스크에서 지울 때 씀)."""
+        scope, canonical, _, _, signature = self._entries.pop(entry_id)
+        del self._exact[(scope, canonical)]
+        if signature is not None:
+            for band, key in self._band_keys(scope, signature):
+                ids = self._buckets[band].get(key)
+                if ids is None:
+                    continue
+                try:
+                    ids.remove(entry_id)
+                except ValueError:
+                    pass
+                if not ids:
+                    del self._buckets[band][key]
+        return scope, canonical
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and (now - created_at) > self.ttl_seconds
+
+    def _prune(self, now: float) -> list:
+        """유효기간이 지났거나 max_entries를 넘는 가장 오래된 항목들을 빼고, 뺀 (scope, canonical) 목록을 반환."""
+        removed = []
+        while self._entries:
+            oldest_id, oldest = next(iter(self._entries.items()))
+            if self._is_expired(oldest[3], now):
+                self._counters["expired"] += 1
+            elif self.max_entries and len(self._entries) > self.max_entries:
+                self._counters["evictions"] += 1
+            else:
+                break
+            removed.append(self._remove(oldest_id))
+        return removed
+
+    def _delete_rows(self, removed: list, commit: bool = True):
+        if self._db is None or not removed:
+            return
+        self._db.executemany(
+            "DELETE FROM near_dup_index WHERE scope = ? AND canonical = ?", removed
+        )
+        if commit:
+            self._db.commit()
+
+    # ---------------------------
+    # 공개 API
+    # ---------------------------
+    def add(self, scope: str, sentence: str, value: str):
+        """scope(난이도/모델/프롬프트 등) 안에서 sentence -> value(캐시 키 등)를 등록."""
+        canonical = canonicalize(sentence)
+        if not canonical:
+            return
+        now = time.time()
+        with self._lock:
+            signature = self._insert(scope, canonical, value, now)
+            removed = self._prune(now)
+            if self._db is not None:
+                sig_blob = array("Q", signature).tobytes() if signature else None
+                self._delete_rows(removed, commit=False)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO near_dup_index "
+                    "(scope, canonical, value, signature, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (scope, canonical, value, sig_blob, now),
+                )
+                self._db.commit()
+
+    def lookup(self, scope: str, sentence: str):
+        """가장 가까운 등록 문장의 value를 반환 (허용 거리 안에 없으면 None). 유효기간이 지난 항목은 무시."""
+        canonical = canonicalize(sentence)
+        if not canonical:
+            return None
+        now = time.time()
+        with self._lock:
+            # 오래된 순으로 정렬돼 있으므로 앞쪽의 만료 항목만 치우면 남은 것은 모두 유효
+            self._delete_rows(self._prune(now))
+
+            entry_id = self._exact.get((scope, canonical))
+            if entry_id is not None:
+                self._counters["exact_hits"] += 1
+                return self._entries[entry_id][2]
+
+            if self.max_distance <= 0:
+                self._counters["misses"] += 1
+                return None
+
+            candidates = set()
+            for band, key in self._band_keys(scope, self._signature(canonical)):
+                candidates.update(self._buckets[band].get(key, ()))
+            words = words_of(canonical)
+
+            best_value, best_dist = None, None
+            for cid in candidates:
+                _, other, value, _, _ = self._entries[cid]
+                limit = int(self.max_distance * max(len(canonical), len(other)))
+                if best_dist is not None:
+                    limit = min(limit, best_dist - 1)
+                if limit <= 0:
+                    continue  # 완전히 같은 문장은 위에서 이미 확인함
+                self._counters["candidates_checked"] += 1
+                dist = bounded_edit_distance(canonical, other, limit)
+                if dist is not None and words_of(other) == words:
+                    best_value, best_dist = value, dist
+
+            if best_value is None:
+                self._counters["misses"] += 1
+            else:
+                self._counters["near_hits"] += 1
+            return best_value
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+        return stats
@@ -0,0 +1,637 @@
+"""
+LLM 호출 전 로컬 문법 사전 검사 (규칙 기반, 수 ms)
+
+자주 나오는 오류만 빠르게 잡는다.
+  - 과거 시간 표현(yesterday, last week, ... ago)과 현재형 동사   → 과거형
+  - 3인칭 단수 주어 + 동사원형 (She go)                        → She goes
+  - 복수/1·2인칭 주어 + 3인칭 단수형 (They goes, I is)          → They go, I am
+  - 조동사/to 뒤 동사원형 (She can sings, He did went)          → can sing, did go
+  - 관사 a/an 혼동, 관사 누락 (I have car)                     → an apple, I have a car
+  - 한정사 중복 (a my friend, the a car)                      → my friend, a car
+  - 복수 한정사 + 단수 명사 (two car)                          → two cars
+  - be동사 누락 (He a teacher, She happy)                      → He is a teacher, She is happy
+  - be동사 보어의 수 (He is teachers, They are a teacher)       → He is a teacher, They are teachers
+  - 문장 첫 글자/대명사 i 대문자, 마침표 누락
+
+결과는 highlight_diff()에 넣어 바로 보여줄 수 있는 예비 교정문과,
+"오류 없음"을 얼마나 믿을 수 있는지 나타내는 confidence를 함께 돌려준다.
+confidence는 검증된 절에 속한 단어의 비율이다. 절(접속사/쉼표로 나눔)은 주어와 동사를 규칙이 확인했고
+보어/목적어의 모든 단어도 규칙이 확인했을 때만 검증된 것으로 본다. 대명사/한정사/부사 같은 닫힌 단어도
+그 절이 검증됐을 때만 센다. 전치사, 형용사, 완료형, 사전에 없는 단어가 있는 절은 검증되지 않은 것으로 본다.
+"""
+import re
+from dataclasses import dataclass, field
+
+# ---------------------------
+# 1) 어휘 사전 (POS lexicon)
+# ---------------------------
+# 불규칙 동사: 원형 -> (3인칭 단수, 과거형)
+IRREGULAR_VERBS = {
+    "be": ("is", "was"), "have": ("has", "had"), "do": ("does", "did"), "go": ("goes", "went"),
+    "come": ("comes", "came"), "get": ("gets", "got"), "make": ("makes", "made"),
+    "take": ("takes", "took"), "see": ("sees", "saw"), "eat": ("eats", "ate"),
+    "drink": ("drinks", "drank"), "buy": ("buys", "bought"), "bring": ("brings", "brought"),
+    "think": ("thinks", "thought"), "teach": ("teaches", "taught"), "catch": ("catches", "caught"),
+    "write": ("writes", "wrote"), "read": ("reads", "read"), "run": ("runs", "ran"),
+    "swim": ("swims", "swam"), "sing": ("sings", "sang"), "sit": ("sits", "sat"),
+    "stand": ("stands", "stood"), "speak": ("speaks", "spoke"), "tell": ("tells", "told"),
+    "say": ("says", "said"), "know": ("knows", "knew"), "give": ("gives", "gave"),
+    "find": ("finds", "found"), "leave": ("leaves", "left"), "meet": ("meets", "met"),
+    "feel": ("feels", "felt"), "sleep": ("sleeps", "slept"), "send": ("sends", "sent"),
+    "spend": ("spends", "spent"), "pay": ("pays", "paid"), "lose": ("loses", "lost"),
+    "win": ("wins", "won"), "begin": ("begins", "began"), "drive": ("drives", "drove"),
+    "ride": ("rides", "rode"), "fly": ("flies", "flew"), "forget": ("forgets", "forgot"),
+    "put": ("puts", "put"), "cut": ("cuts", "cut"), "hear": ("hears", "heard"),
+    "keep": ("keeps", "kept"), "wake": ("wakes", "woke"), "wear": ("wears", "wore"),
+    "grow": ("grows", "grew"), "draw": ("draws", "drew"), "break": ("breaks", "broke"),
+    "choose": ("chooses", "chose"), "sell": ("sells", "sold"), "understand": ("understands", "understood"),
+}
+
+# 규칙 동사 원형 (3인칭/과거형은 아래 규칙으로 생성)
+REGULAR_VERBS = {
+    "walk", "talk", "play", "study", "watch", "want", "need", "like", "love", "live", "work",
+    "visit", "call", "clean", "cook", "finish", "help", "listen", "look", "move", "open",
+    "close", "start", "stay", "stop", "travel", "try", "use", "wait", "wash", "arrive",
+    "learn", "enjoy", "plan", "carry", "dance", "jump", "climb", "ask", "answer", "change",
+    "miss", "pass", "rain", "snow", "smile", "laugh", "cry", "hope", "decide", "return",
+    "practice", "exercise", "order", "share", "join", "prepare", "happen", "remember",
+}
+
+# 자음 하나를 겹쳐 쓰는 과거형
+_DOUBLED_PAST = {"stop": "stopped", "plan": "planned", "travel": "traveled", "jog": "jogged"}
+
+# 과거형과 다른 불규칙 과거분사 (have + 과거분사 = 완료형 판별용, 교정은 하지 않음)
+IRREGULAR_PARTICIPLES = {
+    "been", "gone", "done", "seen", "eaten", "drunk", "taken", "written", "given", "known",
+    "spoken", "driven", "ridden", "flown", "forgotten", "begun", "swum", "sung", "broken",
+    "chosen", "worn", "grown", "drawn", "woken", "come", "run", "become", "fallen", "gotten",
+}
+
+
+def _third_person(base: str) -> str:
+    if base.endswith(("s", "sh", "ch", "x", "z", "o")):
+        return base + "es"
+    if base.endswith("y") and base[-2:-1] not in "aeiou":
+        return base[:-1] + "ies"
+    return base + "s"
+
+
+def _past(base: str) -> str:
+    if base in _DOUBLED_PAST:
+        return _DOUBLED_PAST[base]
+    if base.endswith("e"):
+        return base + "d"
+    if base.endswith("y") and base[-2:-1] not in "aeiou":
+        return base[:-1] + "ied"
+    return base + "ed"
+
+
+# 모든 동사형 -> (원형, 형태) 역색인. 형태: base / 3sg / past
+VERB_FORMS = {}
+VERB_TABLE = {}
+for _base, (_s3, _past_form) in IRREGULAR_VERBS.items():
+    VERB_TABLE[_base] = (_s3, _past_form)
+for _base in REGULAR_VERBS:
+    VERB_TABLE[_base] = (_third_person(_base), _past(_base))
+for _base, (_s3, _past_form) in VERB_TABLE.items():
+    VERB_FORMS.setdefault(_past_form, (_base, "past"))
+    VERB_FORMS[_s3] = (_base, "3sg")
+    VERB_FORMS[_base] = (_base, "base")
+# be 동사는 형태가 여러 개라 따로 처리
+VERB_FORMS.update({
+    "am": ("be", "base"), "are": ("be", "base"), "is": ("be", "3sg"),
+    "was": ("be", "past"), "were": ("be", "past"),
+})
+
+SUBJECT_PERSON = {
+    "i": "1sg", "you": "2", "we": "pl", "they": "pl",
+    "he": "3sg", "she": "3sg", "it": "3sg", "this": "3sg", "that": "3sg",
+    "everyone": "3sg", "everybody": "3sg", "someone": "3sg", "nobody": "3sg",
+}
+DETERMINERS = {
+    "a", "an", "the", "my", "your", "his", "her", "its", "our", "their", "this", "that",
+    "these", "those", "some", "any", "no", "every", "each", "one", "another",
+}
+PLURAL_DETERMINERS = {"these", "those", "many", "few", "several", "two", "three", "some"}
+
+# 관사 누락 검사에 쓰는 가산 단수 명사
+COUNTABLE_NOUNS = {
+    "car", "book", "pen", "dog", "cat", "house", "apple", "orange", "banana", "bag", "phone",
+    "computer", "teacher", "student", "doctor", "nurse", "engineer", "friend", "brother",
+    "sister", "bike", "bicycle", "idea", "question", "problem", "job", "umbrella", "ticket",
+    "cup", "table", "chair", "window", "movie", "song", "letter", "room", "apartment",
+    "girl", "boy", "man", "woman", "child", "city", "country", "day", "week", "month",
+    "year", "egg", "hour", "camera", "watch", "hat", "shirt", "dress", "picture", "photo",
+    "mother", "father", "parent",
+}
+# 복수형이 _third_person()과 같은 -s/-es 규칙을 따르지 않는 명사
+IRREGULAR_PLURALS = {"man": "men", "woman": "women", "child": "children", "photo": "photos"}
+# 복수형 -> 단수형 (be동사 보어의 수 검사용)
+PLURAL_NOUNS = {IRREGULAR_PLURALS.get(n, _third_person(n)): n for n in COUNTABLE_NOUNS}
+UNCOUNTABLE_NOUNS = {
+    "school", "home", "work", "water", "milk", "coffee", "tea", "rice", "bread", "music",
+    "money", "time", "homework", "information", "advice", "breakfast", "lunch", "dinner",
+    "english", "korean", "math", "science", "bed", "church", "class", "weather", "fun",
+}
+# 관사 누락을 검사할 동사 (이 동사 바로 뒤에 가산 단수 명사가 오면 a/an 필요)
+ARTICLE_VERBS = {
+    "have", "has", "had", "is", "was", "am", "buy", "buys", "bought", "want", "wants",
+    "wanted", "need", "needs", "needed", "get", "gets", "got", "see", "sees", "saw",
+}
+# be동사 누락 검사에 쓰는 형용사 (She happy → She is happy)
+ADJECTIVES = {"new", "old", "good", "bad", "big", "small", "happy", "sad", "tired", "busy", "hungry", "sick"}
+FUNCTION_WORDS = ADJECTIVES | {
+    "to", "at", "in", "on", "for", "with", "from", "by", "of", "about", "and", "but", "or",
+    "so", "because", "if", "when", "not", "very", "too", "also", "always", "often",
+    "usually", "sometimes", "never", "really", "there", "here", "me", "him", "us", "them",
+    "yesterday", "today", "tomorrow", "last", "next", "ago", "night", "morning", "evening",
+    "afternoon", "weekend", "will", "can", "could", "would", "should", "must", "did", "does",
+    "didn't", "don't", "doesn't", "isn't", "aren't", "wasn't", "weren't", "can't", "won't",
+    "what", "where", "who", "why", "how", "early", "late", "hard", "well", "much", "many",
+    "all", "two", "three", "park", "store", "library", "hospital", "office", "friends",
+    "parents", "mother", "father", "family", "people", "book", "books", "dogs", "cats",
+}
+ADVERBS_BEFORE_VERB = {"always", "often", "usually", "sometimes", "never", "also", "really"}
+MODALS = {"will", "can", "could", "would", "should", "must", "may", "might", "did", "does", "do",
+          "didn't", "don't", "doesn't", "to"}
+# 뒤에 오는 명사가 단수여도 되는 한정사 (관사 누락 검사에서 관사 역할)
+NOUN_DETERMINERS = DETERMINERS | {"last", "next"}
+ARTICLES = {"a", "an", "the"}
+# 한정사 중복 검사에서 앞에 올 수 있는 소유격 (her는 목적격일 수 있어서 뺌: I gave her my book)
+POSSESSIVES = {"my", "your", "his", "its", "our", "their"}
+# 절을 나누는 단어 (쉼표 등 문장 부호도 절을 나눔)
+CLAUSE_BREAKS = {"and", "but", "or", "so", "because", "when", "if"}
+# 절이 검증됐을 때만 검사된 것으로 보는 닫힌 단어 (빈도 부사, not, 시간 표현, 목적격 대명사)
+# 전치사는 학습자가 자주 틀리는데 규칙이 보지 않으므로 넣지 않음 (I arrived to school)
+CLOSED_WORDS = ADVERBS_BEFORE_VERB | CLAUSE_BREAKS | {
+    "not", "very", "yesterday", "today", "tomorrow", "ago", "me", "him", "her", "us", "them", "it", "you",
+}
+
+# a 대신 an을 쓰는 자음 소리 예외, an 대신 a를 쓰는 모음 글자 예외
+AN_EXCEPTIONS = {"hour", "honest", "honor", "heir"}
+A_EXCEPTIONS = {"university", "uniform", "user", "useful", "one", "european", "unicorn", "union"}
+
+KNOWN_WORDS = (
+    set(VERB_FORMS) | set(SUBJECT_PERSON) | DETERMINERS | PLURAL_DETERMINERS
+    | COUNTABLE_NOUNS | UNCOUNTABLE_NOUNS | FUNCTION_WORDS
+    | {n + "s" for n in COUNTABLE_NOUNS}
+)
+
+# ---------------------------
+# 2) 미리 컴파일한 정규식 인덱스
+# ---------------------------
+TOKEN_RE = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)?|\d+|[^\w\s]")
+PAST_MARKER_RE = re.compile(
+    r"\b(yesterday|last\s+(?:night|week|month|year|weekend|summer|winter|spring|fall|"
+    r"monday|tuesday|wednesday|thursday|friday|saturday|sunday|time)|"
+    r"(?:\d+|a|an|two|three|few|several)\s+(?:minutes?|hours?|days?|weeks?|months?|years?)\s+ago|"
+    r"in\s+(?:19|20)\d\d)\b",
+    re.IGNORECASE,
+)
+FUTURE_MARKER_RE = re.compile(r"\b(tomorrow|next\s+\w+|will|going\s+to)\b", re.IGNORECASE)
+
+
+# ---------------------------
+# 3) 결과 타입
+# ---------------------------
+@dataclass
+class Issue:
+    rule: str           # past_tense / agreement / modal / missing_verb / article / plural / capitalization / punctuation
+    focus: str          # 화면 표시용 (한국어)
+    original: str
+    replacement: str
+    message: str
+
+
+@dataclass
+class PrecheckResult:
+    sentence: str
+    corrected: str
+    issues: list = field(default_factory=list)
+    confidence: float = 0.0   # 예비 교정(또는 "오류 없음") 판단을 얼마나 믿을 수 있는지 (0~1)
+
+    @property
+    def no_errors(self) -> bool:
+        return not self.issues
+
+    def to_result(self, sentence_level: str = "beginner") -> dict:
+        """
+        "오류 없음"으로 LLM을 건너뛸 때 화면 렌더링이 기대하는 결과 dict 형태로 변환.
+        (퀴즈는 비워 둠 → 화면에서는 '퀴즈가 생성되지 않았습니다' 안내)
+        """
+        return {
+            "corrected_sentence": self.corrected,
+            "level": sentence_level,
+            "explanations": [{
+                "step": 1,
+                "focus": "빠른 검사",
+                "what_is_wrong": "자주 틀리는 문법(시제, 수 일치, 관사)에서 오류를 찾지 못했습니다.",
+                "why": "로컬 규칙 검사 결과입니다. 더 자세한 설명이 필요하면 AI 분석을 요청하세요.",
+                "better_alternatives": [],
+                "nuance": "",
+            }],
+            "quizzes": [],
+        }
+
+
+# ---------------------------
+# 4) 검사 로직
+# ---------------------------
+def _match_case(word: str, template: str) -> str:
+    if template[:1].isupper():
+        return word[:1].upper() + word[1:]
+    return word
+
+
+def _article_for(word: str) -> str:
+    w = word.lower()
+    if w in AN_EXCEPTIONS:
+        return "an"
+    if w in A_EXCEPTIONS:
+        return "a"
+    return "an" if w[:1] in "aeiou" else "a"
+
+
+def _subject(tokens: list, verb_idx: int):
+    """
+    동사 앞의 주어를 보고 (인칭/수, 주어가 시작하는 위치)를 추정. 모르면 (None, None).
+    주어와 동사 사이의 빈도 부사는 주어 구간에 포함된다.
+    """
+    i = verb_idx - 1
+    while i >= 0 and tokens[i].lower() in ADVERBS_BEFORE_VERB:
+        i -= 1
+    if i < 0:
+        return None, None
+    word = tokens[i].lower()
+    if word in SUBJECT_PERSON:
+        return SUBJECT_PERSON[word], i
+    prev = tokens[i - 1].lower() if i >= 1 else ""
+    if word in COUNTABLE_NOUNS or word in UNCOUNTABLE_NOUNS:
+        if prev in PLURAL_DETERMINERS:
+            return "pl", i - 1
+        if prev in DETERMINERS:
+            return "3sg", i - 1
+        if i == 0:
+            return "3sg", i
+    if word.endswith("s") and word[:-1] in COUNTABLE_NOUNS:
+        if prev in DETERMINERS:
+            return "pl", i - 1
+        if i == 0:
+            return "pl", i
+    # 문장 맨 앞의 사전에 없는 대문자 단어는 사람 이름으로 간주 (Tom go -> Tom goes)
+    if i == 0 and tokens[i][:1].isupper() and word not in KNOWN_WORDS:
+        return "3sg", i
+    return None, None
+
+
+def _be_form(person: str, is_past: bool) -> str:
+    if is_past:
+        return "was" if person in ("1sg", "3sg") else "were"
+    return {"1sg": "am", "2": "are", "pl": "are", "3sg": "is"}[person]
+
+
+def _clause_start(lowered: list, idx: int) -> bool:
+    return idx == 0 or lowered[idx - 1] in CLAUSE_BREAKS or not lowered[idx - 1][:1].isalpha()
+
+
+def _clause_has_verb(lowered: list, start: int) -> bool:
+    """start부터 절이 끝날 때까지 동사/조동사가 있는지."""
+    for word in lowered[start:]:
+        if word in CLAUSE_BREAKS or not word[:1].isalpha():
+            return False
+        if word in VERB_FORMS or word in MODALS:
+            return True
+    return False
+
+
+def _plural(noun: str) -> str:
+    if noun in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[noun]
+    return _third_person(noun)
+
+
+def _governing_modal(lowered: list, verb_idx: int):
+    """
+    동사 앞(not/빈도 부사 건너뜀)의 조동사 또는 to를 찾음. 없으면 None.
+    의문문 어순(Did you go, Can she swim)도 조동사 + 주어 대명사 + 동사로 본다.
+    """
+    i = verb_idx - 1
+    while i >= 0 and (lowered[i] == "not" or lowered[i] in ADVERBS_BEFORE_VERB):
+        i -= 1
+    if i >= 1 and lowered[i] in SUBJECT_PERSON and lowered[i - 1] in MODALS - {"to"}:
+        return i - 1
+    if i < 0 or lowered[i] not in MODALS:
+        return None
+    # to는 동사 뒤(want to, need to ...)일 때만 부정사의 to로 봄 (to school 같은 전치사와 구분)
+    if lowered[i] == "to" and not (i >= 1 and (lowered[i - 1] in VERB_FORMS or lowered[i - 1] == "going")):
+        return None
+    return i
+
+
+def _perfect_participle(lowered: list, verb_idx: int):
+    """
+    have/has/had 뒤에 과거분사가 오는 완료형이면 과거분사 위치 (I have seen, She has went).
+    아니면 None.
+    """
+    if lowered[verb_idx] not in ("have", "has", "had"):
+        return None
+    i = verb_idx + 1
+    while i < len(lowered) and (lowered[i] in ("not", "already", "just", "ever")
+                                or lowered[i] in ADVERBS_BEFORE_VERB):
+        i += 1
+    if i >= len(lowered):
+        return None
+    nxt = lowered[i]
+    if nxt in IRREGULAR_PARTICIPLES or nxt.endswith("ed") or VERB_FORMS.get(nxt, ("", ""))[1] == "past":
+        return i
+    return None
+
+
+def _agree(base: str, form: str, person: str, original: str):
+    """주어 인칭에 맞는 현재형을 반환 (바꿀 필요 없으면 None)."""
+    if base == "be":
+        want = _be_form(person, form == "past")
+        return want if want != original.lower() else None
+    if form == "past":
+        return None
+    s3, _ = VERB_TABLE[base]
+    if person == "3sg" and form == "base":
+        return s3
+    if person != "3sg" and form == "3sg":
+        return base
+    return None
+
+
+def precheck_sentence(sentence: str) -> PrecheckResult:
+    """문장 하나를 검사해 예비 교정문과 발견한 문제 목록을 반환."""
+    spans = [(m.group(0), m.start(), m.end()) for m in TOKEN_RE.finditer(sentence or "")]
+    tokens = [t for t, _, _ in spans]
+    replacements = {}   # token index -> 새 토큰
+    inserts = {}        # token index -> 그 앞에 끼워 넣을 단어
+    issues = []
+
+    lowered = [t.lower() for t in tokens]
+    text = " ".join(tokens)
+    is_past = bool(PAST_MARKER_RE.search(text)) and not FUTURE_MARKER_RE.search(text)
+    # 규칙이 실제로 확인한 토큰 / 주어까지 확인한 동사 (confidence 계산용)
+    checked = set()
+    verified_verbs = set()
+    perfect_participles = set()
+
+    for idx, word in enumerate(lowered):
+        # ---- 조동사/to 뒤 동사원형 (She can sings → can sing) ----
+        modal_idx = _governing_modal(lowered, idx) if word in VERB_FORMS else None
+        if modal_idx is not None:
+            base, form = VERB_FORMS[word]
+            checked.update(range(modal_idx, idx + 1))
+            if lowered[modal_idx] != "to":
+                # 주어: 의문문 어순이면 조동사 바로 뒤, 아니면 조동사 앞
+                if modal_idx + 1 < idx and lowered[modal_idx + 1] in SUBJECT_PERSON:
+                    verified_verbs.add(idx)
+                else:
+                    person, subject_start = _subject(tokens, modal_idx)
+                    if person is not None:
+                        checked.update(range(subject_start, modal_idx))
+                        verified_verbs.add(idx)
+            if form != "base" or base == "be" and word != "be":
+                replacements[idx] = _match_case(base, tokens[idx])
+                issues.append(Issue(
+                    "modal", "조동사 뒤 동사원형", tokens[idx], base,
+                    f"'{tokens[modal_idx]}' 뒤에는 동사원형을 쓰므로 '{tokens[idx]}' 대신 '{base}'을(를) 씁니다.",
+                ))
+
+        # ---- 완료형 (have + 과거분사): 시제 규칙으로 고치지 않고 LLM에 맡김 ----
+        elif _perfect_participle(lowered, idx) is not None:
+            perfect_participles.add(_perfect_participle(lowered, idx))
+
+        # ---- 동사 시제 / 수 일치 ----
+        elif word in VERB_FORMS and idx not in perfect_participles:
+            base, form = VERB_FORMS[word]
+            person, subject_start = _subject(tokens, idx)
+            if person is not None:
+                checked.update(range(subject_start, idx + 1))
+                verified_verbs.add(idx)
+            if person is None:
+                pass
+            elif is_past and form != "past":
+                new = _be_form(person, True) if base == "be" else VERB_TABLE[base][1]
+                replacements[idx] = _match_case(new, tokens[idx])
+                issues.append(Issue(
+                    "past_tense", "과거 시제", tokens[idx], new,
+                    f"과거를 나타내는 표현이 있으므로 '{tokens[idx]}' 대신 과거형 '{new}'을(를) 씁니다.",
+                ))
+            else:
+                new = _agree(base, form, person, word)
+                if new:
+                    replacements[idx] = _match_case(new, tokens[idx])
+                    issues.append(Issue(
+                        "agreement", "주어-동사 수 일치", tokens[idx], new,
+                        f"주어에 맞춰 '{tokens[idx]}'을(를) '{new}'(으)로 바꿉니다.",
+                    ))
+            if base == "be" and person is not None:
+                _check_complement_number(tokens, lowered, idx, person, replacements, inserts, issues,
+                                          checked)
+
+        # ---- be동사 누락 (He a teacher → He is a teacher) ----
+        if (
+            word in SUBJECT_PERSON and _clause_start(lowered, idx) and idx + 1 < len(lowered)
+            and (lowered[idx + 1] in ADJECTIVES
+                 or lowered[idx + 1] in (ARTICLES | POSSESSIVES | {"her"})
+                 and not (word in ("this", "that") and lowered[idx + 1] == "the"))
+            and not _clause_has_verb(lowered, idx + 1)
+        ):
+            be = _be_form(SUBJECT_PERSON[word], is_past)
+            inserts[idx + 1] = be
+            issues.append(Issue(
+                "missing_verb", "be동사 누락", tokens[idx + 1], f"{be} {tokens[idx + 1]}",
+                f"'{tokens[idx]}' 뒤에 동사가 없으므로 be동사 '{be}'을(를) 넣습니다.",
+            ))
+
+        # ---- don't/doesn't 수 일치 및 시제 ----
+        if word in ("don't", "doesn't"):
+            person, _ = _subject(tokens, idx)
+            new = None
+            if is_past:
+                new = "didn't"
+            elif person == "3sg" and word == "don't":
+                new = "doesn't"
+            elif person not in (None, "3sg") and word == "doesn't":
+                new = "don't"
+            if new:
+                replacements[idx] = _match_case(new, tokens[idx])
+                issues.append(Issue(
+                    "agreement", "조동사 do 일치", tokens[idx], new,
+                    f"주어와 시제에 맞춰 '{tokens[idx]}' 대신 '{new}'을(를) 씁니다.",
+                ))
+
+        # ---- 한정사 중복 (a my friend → my friend, the a car → a car): 관사를 뺌 ----
+        nxt = lowered[idx + 1] if idx + 1 < len(lowered) else ""
+        if (
+            word in ARTICLES | POSSESSIVES and nxt in DETERMINERS - {"one"}
+            and (word in ARTICLES or nxt in ARTICLES)
+        ):
+            drop = idx if word in ARTICLES else idx + 1
+            replacements[drop] = ""
+            if drop == 0:
+                replacements[1] = _match_case(tokens[1], tokens[0])
+            issues.append(Issue(
+                "article", "한정사 중복", tokens[drop], "",
+                f"'{tokens[idx]} {tokens[idx + 1]}'처럼 한정사를 겹쳐 쓰지 않으므로 '{tokens[drop]}'을(를) 뺍니다.",
+            ))
+
+        # ---- a / an ----
+        if (word in ("a", "an") and replacements.get(idx) != ""
+                and idx + 1 < len(tokens) and tokens[idx + 1][:1].isalpha()):
+            want = _article_for(tokens[idx + 1])
+            if want != word:
+                replacements[idx] = _match_case(want, tokens[idx])
+                issues.append(Issue(
+                    "article", "관사 a/an", tokens[idx], want,
+                    f"'{tokens[idx + 1]}'은(는) 발음이 {'모음' if want == 'an' else '자음'}으로 시작하므로 '{want}'을(를) 씁니다.",
+                ))
+
+        # ---- 복수 한정사 + 단수 명사 (two car → two cars) ----
+        prev = lowered[idx - 1] if idx >= 1 else ""
+        if word in COUNTABLE_NOUNS and prev in PLURAL_DETERMINERS - {"some"}:
+            new = _plural(word)
+            checked.update((idx - 1, idx))
+            replacements[idx] = _match_case(new, tokens[idx])
+            issues.append(Issue(
+                "plural", "명사의 수", tokens[idx], new,
+                f"'{tokens[idx - 1]}' 뒤에는 복수형을 쓰므로 '{tokens[idx]}' 대신 '{new}'을(를) 씁니다.",
+            ))
+
+        # ---- 관사 누락 (I have car) ----
+        elif (
+            word in COUNTABLE_NOUNS and idx >= 1
+            and prev in ARTICLE_VERBS
+            and not (idx + 1 < len(lowered) and lowered[idx + 1] in COUNTABLE_NOUNS)
+        ):
+            art = _article_for(word)
+            inserts[idx] = art
+            checked.add(idx)
+            issues.append(Issue(
+                "article", "관사 누락", tokens[idx], f"{art} {tokens[idx]}",
+                f"셀 수 있는 단수 명사 '{tokens[idx]}' 앞에는 관사 '{art}'이(가) 필요합니다.",
+            ))
+
+        # ---- 명사: 한정사가 하나만 앞에 있는 단수 / 복수형 / 관사 없는 불가산 명사만 검사된 것으로 봄 ----
+        elif idx not in checked and word not in VERB_FORMS:
+            single_determiner = (prev in NOUN_DETERMINERS
+                                 and not (idx >= 2 and lowered[idx - 2] in ARTICLES | POSSESSIVES))
+            if word in COUNTABLE_NOUNS:
+                if single_determiner:
+                    checked.update((idx - 1, idx))
+            elif word.endswith("s") and word[:-1] in COUNTABLE_NOUNS:
+                if prev not in ("a", "an"):
+                    checked.update((idx - 1, idx) if single_determiner else (idx,))
+            elif word in UNCOUNTABLE_NOUNS and prev not in ("a", "an"):
+                checked.update((idx - 1, idx) if single_determiner else (idx,))
+
+        # ---- 대명사 i ----
+        if tokens[idx] == "i":
+            replacements[idx] = "I"
+            issues.append(Issue("capitalization", "대문자", "i", "I", "대명사 I는 항상 대문자로 씁니다."))
+
+    # ---- 교정문 조립 (원문 띄어쓰기 유지) ----
+    out = []
+    last = 0
+    for idx, (tok, start, end) in enumerate(spans):
+        out.append(sentence[last:start])
+        if idx in inserts:
+            out.append(inserts[idx] + " ")
+        out.append(replacements.get(idx, tok))
+        last = end
+    out.append((sentence or "")[last:])
+    corrected = " ".join("".join(out).split())
+
+    if corrected and corrected[0].islower():
+        issues.append(Issue("capitalization", "대문자", corrected.split()[0],
+                            corrected[0].upper() + corrected.split()[0][1:],
+                            "문장의 첫 글자는 대문자로 씁니다."))
+        corrected = corrected[0].upper() + corrected[1:]
+    if corrected and corrected[-1] not in ".!?\"'":
+        issues.append(Issue("punctuation", "문장 부호", corrected.split()[-1],
+                            corrected.split()[-1] + ".", "문장 끝에는 마침표를 찍습니다."))
+        corrected += "."
+
+    return PrecheckResult(
+        sentence=sentence,
+        corrected=corrected,
+        issues=issues,
+        confidence=_confidence(lowered, checked, verified_verbs),
+    )
+
+
+def _check_complement_number(tokens: list, lowered: list, be_idx: int, person: str,
+                             replacements: dict, inserts: dict, issues: list, checked: set):
+    """
+    be동사 보어 명사의 수를 주어에 맞춤.
+    단수 주어 + 관사 없는 복수 명사 (He is teachers → He is a teacher)
+    복수 주어 + a/an + 단수 명사 또는 관사 없는 단수 명사 (They are a teacher → They are teachers)
+    형용사 보어 (She is very happy)는 수와 관계없으므로 검사된 것으로 본다.
+    """
+    c = be_idx + 1
+    while c < len(lowered) and lowered[c] in ADVERBS_BEFORE_VERB | {"not", "very"}:
+        c += 1
+    if c >= len(lowered):
+        return
+    word = lowered[c]
+    if word in ADJECTIVES:
+        checked.add(c)
+        return
+    if person in ("1sg", "3sg") and word in PLURAL_NOUNS:
+        noun = PLURAL_NOUNS[word]
+        art = _article_for(noun)
+        inserts[c] = art
+        replacements[c] = _match_case(noun, tokens[c])
+        checked.add(c)
+        issues.append(Issue(
+            "plural", "보어의 수", tokens[c], f"{art} {noun}",
+            f"주어가 하나이므로 '{tokens[c]}' 대신 '{art} {noun}'을(를) 씁니다.",
+        ))
+        return
+    if person != "pl":
+        return
+    if word in ("a", "an") and c + 1 < len(lowered) and lowered[c + 1] in COUNTABLE_NOUNS:
+        replacements[c] = ""
+        c += 1
+    elif word not in COUNTABLE_NOUNS:
+        return
+    if c + 1 < len(lowered) and lowered[c + 1] in COUNTABLE_NOUNS:
+        return  # 명사 + 명사 (a school teacher): 어느 쪽이 머리명사인지 모름
+    new = _plural(lowered[c])
+    replacements[c] = _match_case(new, tokens[c])
+    checked.update(range(be_idx + 1, c + 1))
+    issues.append(Issue(
+        "plural", "보어의 수", tokens[c], new,
+        f"주어가 여럿이므로 보어도 복수형 '{new}'(으)로 씁니다.",
+    ))
+
+
+def _confidence(lowered: list, checked: set, verified_verbs: set) -> float:
+    """
+    검증된 절에 속한 단어 비율 × 문장 길이 보정.
+    절은 주어까지 확인한 동사가 있고, 모든 단어가 규칙이 확인했거나 닫힌 단어일 때만 검증된 것으로 본다.
+    검증되지 않은 절이 하나라도 있으면 1.0이 되지 않는다 (그 절의 오류는 아무도 보지 않았으므로).
+    """
+    words = [idx for idx, w in enumerate(lowered) if w[:1].isalpha()]
+    if not words:
+        return 0.0
+    clauses, clause = [], []
+    for idx, w in enumerate(lowered):
+        if not w[:1].isalpha() or w in CLAUSE_BREAKS:
+            if clause:
+                clauses.append(clause)
+            clause = [idx] if w in CLAUSE_BREAKS else []
+        else:
+            clause.append(idx)
+    if clause:
+        clauses.append(clause)
+    covered = sum(
+        len(clause) for clause in clauses
+        if any(idx in verified_verbs for idx in clause)
+        and all(idx in checked or lowered[idx] in CLOSED_WORDS for idx in clause)
+    ) / len(words)
+    length_factor = max(0.3, 1.0 - 0.03 * max(0, len(words) - 6))
+    return round(covered * length_factor, 3)
@@ -0,0 +1,272 @@
+"""
+퀴즈 은행: 생성된 퀴즈를 문법 주제(focus) 태그별로 모아 두고 다시 쓰기
+
+분석마다 모델이 5~8개의 퀴즈를 새로 쓰면 출력 토큰/지연시간의 대부분이 퀴즈에 들어간다.
+그런데 설명의 focus(과거 시제, 주어-동사 수 일치, 관사 ...)는 계속 반복된다.
+
+- focus_tags(): 자유 형식 focus 문자열 → 정규화된 태그 (past_tense, agreement, article, ...)
+  (precheck.Issue.rule 과 같은 이름을 써서 모델 호출 전에 로컬 검사로 태그를 예측할 수 있음)
+- bank_items(): 결과에서 은행에 넣어도 되는 문항과 문항별 태그만 고름
+  · 학습자 문장(원문/교정문)을 인용한 문항은 넣지 않음 → 다른 학습자에게 남의 문장이 보이지 않도록
+  · 태그는 결과 전체가 아니라 문항 자신의 질문/해설에서 찾은 주제 (결과의 focus 중 하나여야 함)
+- QuizBank.add(): 고른 문항을 (태그, 난이도, 유형) 색인과 함께 저장 (같은 문항은 한 번만)
+- QuizBank.pick(): 태그가 맞고 품질 조건을 통과한 문항을 난이도가 가까운 것부터,
+  덜 쓰인 것부터, 유형(mcq/fill)을 섞어서 고름
+- QuizBank.record_attempts(): 학습자 채점 결과 → 정답률이 너무 높거나(변별력 없음)
+  너무 낮은(문항 오류 의심) 문항은 더 이상 고르지 않음
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# (태그, 이 중 하나라도 focus에 들어 있으면 해당) — 앞에 있는 것부터 검사
+FOCUS_KEYWORDS = (
+    ("past_tense", ("과거", "past")),
+    ("tense", ("시제", "tense", "현재완료", "perfect", "진행형", "progressive")),
+    ("agreement", ("수 일치", "수일치", "주어-동사", "주어와 동사", "3인칭", "agreement")),
+    ("missing_verb", ("동사 누락", "동사가 없", "missing verb")),
+    ("article", ("관사", "article", "a/an")),
+    ("preposition", ("전치사", "preposition")),
+    ("plural", ("복수", "단수", "셀 수", "plural", "countable")),
+    ("word_order", ("어순", "word order")),
+    ("pronoun", ("대명사", "pronoun")),
+    ("comparative", ("비교", "최상급", "comparative", "superlative")),
+    ("gerund_infinitive", ("동명사", "부정사", "gerund", "infinitive")),
+    ("modal", ("조동사", "modal")),
+    ("passive", ("수동", "passive")),
+    ("conditional", ("가정법", "조건", "conditional")),
+    ("relative_clause", ("관계대명사", "관계부사", "relative")),
+    ("word_choice", ("어휘", "단어 선택", "연어", "word choice", "collocation")),
+    ("spelling", ("철자", "spelling")),
+    ("capitalization", ("대문자", "capital")),
+    ("punctuation", ("문장 부호", "구두점", "쉼표", "마침표", "punctuation", "comma")),
+)
+# 태그를 붙이지 않는 focus (로컬 검사 결과 등)
+IGNORED_FOCUS = {"빠른 검사"}
+
+LEVEL_RANK = {"beginner": 0, "intermediate": 1, "advanced": 2}
+
+
+def focus_tags(focus: str) -> list:
+    """focus 문자열의 정규화된 태그 목록. 아는 주제가 없으면 "focus:<정규화된 문자열>" 하나."""
+    text = " ".join((focus or "").lower().split())
+    if not text or text in IGNORED_FOCUS:
+        return []
+    tags = [tag for tag, keywords in FOCUS_KEYWORDS if any(k in text for k in keywords)]
+    if "past_tense" in tags and "tense" in tags:
+        tags.remove("tense")
+    return tags or [f"focus:{text[:40]}"]
+
+
+def result_tags(result: dict) -> list:
+    """분석 결과의 모든 설명 focus에서 모은 태그 (중복 없이 순서 유지)."""
+    tags = []
+    for exp in result.get("explanations") or []:
+        for tag in focus_tags(exp.get("focus", "")):
+            if tag not in tags:
+                tags.append(tag)
+    return tags
+
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+def _word_windows(text: str, size: int) -> set:
+    words = _WORD_RE.findall((text or "").lower())
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def quotes_sentence(quiz: dict, sentences, window: int = 4) -> bool:
+    """문항(질문/보기/정답/해설)에 sentences 중 하나의 연속된 window단어가 그대로 들어 있는지."""
+    text = " ".join([quiz.get("question", ""), " ".join(quiz.get("options") or []),
+                     quiz.get("answer", ""), quiz.get("rationale", "")])
+    for sentence in sentences:
+        size = min(window, len(_WORD_RE.findall((sentence or "").lower())))
+        if size >= 3 and _word_windows(sentence, size) & _word_windows(text, size):
+            return True
+    return False
+
+
+def quiz_tags(quiz: dict, allowed: list) -> list:
+    """
+    문항 자신의 주제 태그 (질문/해설에서 찾은 것 중 allowed에 있는 것).
+    찾지 못했는데 allowed가 하나뿐이면 그것, 아니면 빈 목록 (어느 주제 문항인지 모름).
+    """
+    own = focus_tags(" ".join([quiz.get("question", ""), quiz.get("rationale", "")]))
+    tags = [tag for tag in own if tag in allowed]
+    if not tags and len(allowed) == 1:
+        return list(allowed)
+    return tags
+
+
+def bank_items(result: dict, sentence: str) -> list:
+    """[(퀴즈, 태그 목록), ...] 학습자 문장을 인용하지 않고 주제를 알 수 있는 문항만."""
+    allowed = result_tags(result)
+    sources = (sentence, result.get("corrected_sentence", ""))
+    items = []
+    for quiz in result.get("quizzes") or []:
+        if quotes_sentence(quiz, sources):
+            continue
+        tags = quiz_tags(quiz, allowed)
+        if tags:
+            items.append((quiz, tags))
+    return items
+
+
+def quiz_key(quiz: dict) -> str:
+    """문항 내용(질문/보기/정답)으로 만든 키. 같은 문항은 id가 달라도 같은 키."""
+    raw = json.dumps(
+        [" ".join(quiz.get("question", "").lower().split()), quiz.get("options") or [],
+         quiz.get("answer", "").strip().lower()],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:20]
+
+
+class QuizBank:
+    def __init__(self, db_path: str = "", min_attempts: int = 5,
+                 min_correct_rate: float = 0.15, max_correct_rate: float = 0.95):
+        """
+        db_path: SQLite 파일 경로 (비우면 메모리에만 보관)
+        min_attempts 번 이상 채점된 문항은 정답률이 [min_correct_rate, max_correct_rate] 안일 때만 고름
+        """
+        self.min_attempts = min_attempts
+        self.min_correct_rate = min_correct_rate
+        self.max_correct_rate = max_correct_rate
+
+        if db_path:
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path or ":memory:", check_same_thread=False)
+        if db_path:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS quiz_items (
+                item_key TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                question TEXT NOT NULL,
+                options TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                rationale TEXT NOT NULL,
+                source_model TEXT NOT NULL DEFAULT '',
+                created_at REAL NOT NULL,
+                served INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                correct INTEGER NOT NULL DEFAULT 0
+            );
+            -- 기본 키가 (태그, 난이도, 유형) 조회용 색인 역할
+            CREATE TABLE IF NOT EXISTS quiz_tags (
+                tag TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                type TEXT NOT NULL,
+                item_key TEXT NOT NULL,
+                PRIMARY KEY (tag, difficulty, type, item_key)
+            ) WITHOUT ROWID;
+            """
+        )
+        self._db.commit()
+        self._counters = {"picks": 0, "picked_items": 0, "misses": 0}
+
+    def add(self, items: list, source_model: str = "") -> int:
+        """[(퀴즈, 태그 목록), ...] 검증을 마친 퀴즈를 문항별 태그와 함께 저장. 새로 들어간 문항 수를 반환."""
+        if not items:
+            return 0
+        now = time.time()
+        added = 0
+        with self._lock:
+            for q, tags in items:
+                if not tags or not (q.get("rationale") or "").strip():
+                    continue  # 해설 없는 문항은 다시 쓰지 않음
+                key = quiz_key(q)
+                cur = self._db.execute(
+                    "INSERT OR IGNORE INTO quiz_items (item_key, type, difficulty, question, options, "
+                    "answer, rationale, source_model, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, q["type"], q["difficulty"], q["question"],
+                     json.dumps(q.get("options") or [], ensure_ascii=False), q["answer"],
+                     q["rationale"], source_model, now),
+                )
+                added += cur.rowcount
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO quiz_tags (tag, difficulty, type, item_key) VALUES (?, ?, ?, ?)",
+                    [(tag, q["difficulty"], q["type"], key) for tag in tags],
+                )
+            self._db.commit()
+        return added
+
+    def pick(self, tags: list, level: str, count: int, min_count: int = 1) -> list:
+        """
+        태그 중 하나라도 맞는 문항을 최대 count개. min_count개가 안 되면 빈 목록 (served도 올리지 않음).
+        난이도가 level에 가까운 것 → 덜 쓰인 것 순으로, mcq/fill을 번갈아 고른다.
+        """
+        if not tags or count <= 0:
+            return []
+        rank = LEVEL_RANK.get(level, 1)
+        marks = ",".join("?" * len(tags))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT i.item_key, i.type, i.difficulty, i.question, i.options, i.answer, i.rationale "
+                f"FROM quiz_items i JOIN (SELECT DISTINCT item_key FROM quiz_tags WHERE tag IN ({marks})) t "
+                f"ON t.item_key = i.item_key "
+                f"WHERE i.attempts < ? OR i.correct BETWEEN i.attempts * ? AND i.attempts * ? "
+                f"ORDER BY i.served, random() LIMIT ?",
+                (*tags, self.min_attempts, self.min_correct_rate, self.max_correct_rate, count * 4),
+            ).fetchall()
+
+            rows.sort(key=lambda r: abs(LEVEL_RANK.get(r[2], 1) - rank))  # 안정 정렬: served 순서 유지
+            by_type = {}
+            for row in rows:
+                by_type.setdefault(row[1], []).append(row)
+            picked = []
+            queues = [by_type[t] for t in sorted(by_type)]
+            while queues and len(picked) < count:
+                for queue in queues:
+                    if queue and len(picked) < count:
+                        picked.append(queue.pop(0))
+                queues = [q for q in queues if q]
+
+            if len(picked) < min_count:
+                self._counters["misses"] += 1
+                return []
+            self._db.executemany(
+                "UPDATE quiz_items SET served = served + 1 WHERE item_key = ?",
+                [(row[0],) for row in picked],
+            )
+            self._db.commit()
+            self._counters["picks"] += 1
+            self._counters["picked_items"] += len(picked)
+
+        return [
+            {"id": f"bank{idx}", "type": type_, "difficulty": difficulty, "question": question,
+             "options": json.loads(options), "answer": answer, "rationale": rationale}
+            for idx, (_, type_, difficulty, question, options, answer, rationale)
+            in enumerate(picked, start=1)
+        ]
+
+    def record_attempts(self, attempts: list):
+        """[(퀴즈 dict, 맞았는지), ...] 채점 결과 반영 (은행에 없는 문항은 무시)."""
+        if not attempts:
+            return
+        with self._lock:
+            self._db.executemany(
+                "UPDATE quiz_items SET attempts = attempts + 1, correct = correct + ? WHERE item_key = ?",
+                [(1 if is_correct else 0, quiz_key(q)) for q, is_correct in attempts],
+            )
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            items, tags = self._db.execute(
+                "SELECT (SELECT COUNT(*) FROM quiz_items), (SELECT COUNT(DISTINCT tag) FROM quiz_tags)"
+            ).fetchone()
+            stats = dict(self._counters)
+        stats["items"] = items
+        stats["tags"] = tags
+        return stats
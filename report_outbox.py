@@ -0,0 +1,243 @@
+"""
+n8n 리포트 전송용 내구성 아웃박스 (SQLite 스풀 + 백그라운드 전송 스레드)
+
+- enqueue(): 리포트를 로컬 SQLite에 저장하고 바로 반환 → UI가 웹훅 응답을 기다리지 않음
+- 백그라운드 워커: 쌓인 리포트를 묶어서(batch) 전송, 선택적으로 gzip 압축
+- 실패 시 지수 백오프로 재시도, 4xx(요청 자체 문제)나 재시도 한도 초과는 dead-letter 처리
+- stats(): 대기 중인 개수(queue depth), 전송 지연시간(p50/p95/p99) 등
+- 전송 시간/결과/전송 바이트 수는 metrics.REGISTRY에도 기록
+"""
+import gzip
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from metrics import REGISTRY, LatencyWindow
+
+PENDING = "pending"
+DEAD = "dead"
+
+
+class ReportOutbox:
+    def __init__(self, db_path: str, webhook_url: str, session_factory,
+                 batch_size: int = 1, use_gzip: bool = False, max_attempts: int = 8,
+                 base_delay: float = 2.0, max_delay: float = 300.0, timeout: float = 30.0):
+        """
+        session_factory: requests.Session 을 돌려주는 함수 (연결 풀 공유)
+        batch_size: 1이면 기존처럼 리포트 1개를 JSON object로, 2 이상이면 JSON 배열로 묶어 전송
+        """
+        self.webhook_url = webhook_url
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+        self.use_gzip = use_gzip
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS report_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                created_at REAL NOT NULL,
+                next_attempt_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            )
+            """
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_report_outbox_due "
+            "ON report_outbox(status, next_attempt_at)"
+        )
+        self._db.commit()
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._worker = None
+        self.delivery_latency = LatencyWindow()
+        self._counters = {"enqueued": 0, "delivered": 0, "failed_attempts": 0, "dead_lettered": 0}
+
+    # ---------------------------
+    # 생산자 쪽 (Streamlit 스크립트 스레드)
+    # ---------------------------
+    def enqueue(self, payload: dict) -> int:
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO report_outbox (payload, created_at, next_attempt_at) VALUES (?, ?, ?)",
+                (json.dumps(payload, ensure_ascii=False), now, now),
+            )
+            self._db.commit()
+            self._counters["enqueued"] += 1
+        self._wake.set()
+        return cur.lastrowid
+
+    # ---------------------------
+    # 백그라운드 워커
+    # ---------------------------
+    def start(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._run, name="report-outbox", daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                sent = self.drain_once()
+            except Exception:
+                sent = 0
+            if not sent:
+                # 새 리포트가 들어오거나, 다음 재시도 시각이 될 때까지 대기
+                self._wake.wait(timeout=self._seconds_until_next_due())
+                self._wake.clear()
+
+    def _seconds_until_next_due(self) -> float:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MIN(next_attempt_at) FROM report_outbox WHERE status = ?", (PENDING,)
+            ).fetchone()
+        if row is None or row[0] is None:
+            return 60.0
+        return min(60.0, max(0.05, row[0] - time.time()))
+
+    def drain_once(self) -> int:
+        """지금 보낼 차례인 리포트를 한 묶음 전송. 전송 성공 개수를 반환."""
+        if not self.webhook_url:
+            return 0
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, payload, created_at, attempts FROM report_outbox "
+                "WHERE status = ? AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (PENDING, now, self.batch_size),
+            ).fetchall()
+        if not rows:
+            return 0
+
+        status, error = self._post([json.loads(r[1]) for r in rows])
+        if status is not None and status < 300:
+            self._mark_delivered(rows)
+            return len(rows)
+
+        poison = status is not None and 400 <= status < 500 and status not in (408, 429)
+        if poison and len(rows) > 1:
+            # 묶음 중 어느 리포트가 문제인지 모르므로 하나씩 다시 보내 격리
+            delivered = 0
+            for row in rows:
+                s, e = self._post([json.loads(row[1])])
+                if s is not None and s < 300:
+                    self._mark_delivered([row])
+                    delivered += 1
+                else:
+                    self._mark_failed(row, e, dead=s is not None and 400 <= s < 500 and s not in (408, 429))
+            return delivered
+
+        for row in rows:
+            self._mark_failed(row, error, dead=poison)
+        return 0
+
+    def _post(self, payloads: list):
+        """(상태코드 또는 None, 오류 메시지)를 반환."""
+        body_obj = payloads[0] if self.batch_size == 1 else payloads
+        body = json.dumps(body_obj, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.use_gzip:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        REGISTRY.inc("n8n_payload_bytes_total", len(body))
+        started = time.perf_counter()
+        try:
+            r = self.session_factory().post(
+                self.webhook_url, data=body, headers=headers, timeout=self.timeout
+            )
+        except Exception as e:
+            REGISTRY.observe("n8n_post_seconds", time.perf_counter() - started, outcome="error")
+            REGISTRY.inc("n8n_posts_total", status=type(e).__name__)
+            return None, f"{type(e).__name__}: {e}"
+        REGISTRY.observe("n8n_post_seconds", time.perf_counter() - started,
+                         outcome="ok" if r.status_code < 300 else "http_error")
+        REGISTRY.inc("n8n_posts_total", status=f"{r.status_code // 100}xx")
+        return r.status_code, f"{r.status_code} {r.text[:200]}"
+
+    def _mark_delivered(self, rows: list):
+        now = time.time()
+        with self._lock:
+            self._db.executemany("DELETE FROM report_outbox WHERE id = ?", [(r[0],) for r in rows])
+            self._db.commit()
+            self._counters["delivered"] += len(rows)
+        for r in rows:
+            self.delivery_latency.observe(now - r[2])
+            REGISTRY.observe("n8n_delivery_seconds", now - r[2])
+
+    def _mark_failed(self, row, error: str, dead: bool):
+        attempts = row[3] + 1
+        dead = dead or attempts >= self.max_attempts
+        delay = random.uniform(0.5, 1.0) * min(self.max_delay, self.base_delay * (2 ** attempts))
+        with self._lock:
+            self._db.execute(
+                "UPDATE report_outbox SET attempts = ?, last_error = ?, status = ?, "
+                "next_attempt_at = ? WHERE id = ?",
+                (attempts, error, DEAD if dead else PENDING, time.time() + delay, row[0]),
+            )
+            self._db.commit()
+            self._counters["failed_attempts"] += 1
+            if dead:
+                self._counters["dead_lettered"] += 1
+
+    # ---------------------------
+    # 모니터링 / dead-letter 관리
+    # ---------------------------
+    def stats(self) -> dict:
+        with self._lock:
+            depth = dict(self._db.execute(
+                "SELECT status, COUNT(*) FROM report_outbox GROUP BY status"
+            ).fetchall())
+            stats = dict(self._counters)
+        stats["queue_depth"] = depth.get(PENDING, 0)
+        stats["dead_letters"] = depth.get(DEAD, 0)
+        stats["delivery_latency"] = self.delivery_latency.summary()
+        return stats
+
+    def dead_letters(self, limit: int = 50) -> list:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, payload, attempts, last_error FROM report_outbox "
+                "WHERE status = ? ORDER BY id LIMIT ?",
+                (DEAD, limit),
+            ).fetchall()
+        return [
+            {"id": r[0], "payload": json.loads(r[1]), "attempts": r[2], "last_error": r[3]}
+            for r in rows
+        ]
+
+    def requeue_dead(self) -> int:
+        """dead-letter 리포트를 다시 대기열로 (웹훅 수정 후 재전송할 때)."""
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE report_outbox SET status = ?, attempts = 0, next_attempt_at = ? "
+                "WHERE status = ?",
+                (PENDING, time.time(), DEAD),
+            )
+            self._db.commit()
+        self._wake.set()
+        return cur.rowcount
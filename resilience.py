@@ -0,0 +1,201 @@
+"""
+OpenAI 호출용 재시도 / 백오프 / 서킷 브레이커
+
+- 429, 5xx, 타임아웃, 연결 오류만 재시도 (지수 백오프 + full jitter, Retry-After 헤더 우선)
+- 최근 호출의 오류율이 임계값을 넘으면 서킷을 열어 일정 시간 즉시 실패(CircuitOpenError)
+  → 학습자들이 손으로 재시도하면서 폭주가 더 심해지는 것을 막음
+- 재시도 횟수, 서킷 열림 횟수 등을 카운터로 기록
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {"APITimeoutError", "APIConnectionError", "Timeout", "ConnectionError"}
+
+
+class CircuitOpenError(RuntimeError):
+    """서킷이 열려 있어 업스트림 호출을 하지 않고 바로 실패함."""
+
+    def __init__(self, retry_in: float):
+        super().__init__(f"AI 서버 오류가 많아 잠시 요청을 멈췄습니다. {retry_in:.0f}초 후 다시 시도해 주세요.")
+        self.retry_in = retry_in
+
+
+def is_retryable(exc: Exception) -> bool:
+    """openai 예외를 import 하지 않고 상태 코드/클래스 이름으로 재시도 여부를 판단."""
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(exc).__mro__)
+
+
+def retry_after_seconds(exc: Exception):
+    """응답 헤더의 Retry-After(초) 값을 읽는다. 없으면 None."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+class CircuitBreaker:
+    """
+    최근 window_seconds 동안의 호출 결과로 오류율을 계산하는 서킷 브레이커.
+    closed -> (오류율 >= threshold) -> open -> (cooldown 경과) -> half-open(시험 호출 1개) -> closed/open
+    """
+
+    def __init__(self, error_threshold: float = 0.5, min_calls: int = 10,
+                 window_seconds: float = 60.0, cooldown_seconds: float = 30.0):
+        self.error_threshold = error_threshold
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.cooldown_seconds = cooldown_seconds
+
+        self._lock = threading.Lock()
+        self._outcomes = deque()  # (ts, ok)
+        self._opened_at = None
+        self._probe_in_flight = False
+        self.trips = 0
+        self.short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if now - self._opened_at >= self.cooldown_seconds:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        """호출 직전에 불러서, 서킷이 열려 있으면 CircuitOpenError를 던진다."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(now)
+            if state == "open" or (state == "half-open" and self._probe_in_flight):
+                self.short_circuited += 1
+                remaining = max(self.cooldown_seconds - (now - self._opened_at), 1.0)
+                raise CircuitOpenError(remaining)
+            if state == "half-open":
+                self._probe_in_flight = True
+
+    def record(self, ok: bool):
+        now = time.monotonic()
+        with self._lock:
+            if self._opened_at is not None:
+                # half-open 시험 호출 결과로 닫거나 다시 연다
+                self._probe_in_flight = False
+                if ok:
+                    self._opened_at = None
+                    self._outcomes.clear()
+                else:
+                    self._opened_at = now
+                    self.trips += 1
+                return
+
+            self._outcomes.append((now, ok))
+            while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+                self._outcomes.popleft()
+            total = len(self._outcomes)
+            if not ok and total >= self.min_calls:
+                errors = sum(1 for _, o in self._outcomes if not o)
+                if errors / total >= self.error_threshold:
+                    self._opened_at = now
+                    self.trips += 1
+
+
+class ResilientCaller:
+    """재시도 정책 + 서킷 브레이커를 묶어서 함수 호출을 감싼다. (프로세스당 1개 공유)"""
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 0.5, max_delay: float = 20.0,
+                 breaker: CircuitBreaker = None, sleep=time.sleep, on_attempt=None):
+        """on_attempt(): 실제로 요청을 보내기 직전마다 (재시도 포함) 부름 — 입장 스케줄러 과금 등"""
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self._sleep = sleep
+        self.on_attempt = on_attempt
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "retries": 0, "failures": 0}
+
+    def backoff_delay(self, attempt: int, exc: Exception) -> float:
+        """attempt번째 실패 후 기다릴 시간 (Retry-After가 있으면 그 값을 존중)."""
+        hinted = retry_after_seconds(exc)
+        if hinted is not None:
+            return min(hinted, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, fn, *args, **kwargs):
+        with self._lock:
+            self._counters["calls"] += 1
+        for attempt in range(self.max_attempts):
+            self.breaker.before_call()
+            if self.on_attempt is not None:
+                self.on_attempt()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                retryable = is_retryable(e)
+                # 400 같은 요청 자체의 문제는 업스트림 장애로 보지 않음
+                self.breaker.record(ok=not retryable)
+                if not retryable or attempt == self.max_attempts - 1:
+                    with self._lock:
+                        self._counters["failures"] += 1
+                    raise
+                with self._lock:
+                    self._counters["retries"] += 1
+                self._sleep(self.backoff_delay(attempt, e))
+                continue
+            self.breaker.record(ok=True)
+            return result
+
+    async def acall(self, fn, *args, **kwargs):
+        """call()의 asyncio 버전 (fn은 coroutine 함수). 서킷 브레이커/카운터는 call()과 공유."""
+        with self._lock:
+            self._counters["calls"] += 1
+        for attempt in range(self.max_attempts):
+            self.breaker.before_call()
+            if self.on_attempt is not None:
+                self.on_attempt()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                retryable = is_retryable(e)
+                self.breaker.record(ok=not retryable)
+                if not retryable or attempt == self.max_attempts - 1:
+                    with self._lock:
+                        self._counters["failures"] += 1
+                    raise
+                with self._lock:
+                    self._counters["retries"] += 1
+                await asyncio.sleep(self.backoff_delay(attempt, e))
+                continue
+            self.breaker.record(ok=True)
+            return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        stats["breaker_state"] = self.breaker.state
+        stats["breaker_trips"] = self.breaker.trips
+        stats["short_circuited"] = self.breaker.short_circuited
+        return stats
@@ -0,0 +1,385 @@
+"""
+OpenAI 호출 입장 스케줄러 (프로세스 전역, 학습자/반 간 공정 분배)
+
+세션마다 아무 조율 없이 OpenAI를 부르면, 한 반이 한꺼번에 분석을 누를 때 분당 요청 수(RPM)/토큰 수(TPM)
+한도를 다 써서 다른 학습자가 모두 429를 받고, 한 학습자가 버튼을 연타해도 막을 방법이 없다.
+
+- TokenBucket : RPM / TPM 한도를 초당 채워지는 토큰 통으로 (0이면 제한 없음)
+- 입장(acquire) 때 예상 요청/토큰 수(프롬프트 길이 + 예상 출력)만큼 미리 잡아 두고, 입장 중 실제로 보낸 요청
+  (재시도/헤지 포함)과 응답의 usage는 record()로 표에 적어 두었다가 반납(release)할 때 (실제 − 예상)만큼만
+  더 빼거나 돌려준다. 보낸 요청은 실패해도 돌려주지 않는다 (429/5xx/시간 초과도 한도를 쓴다).
+  입장 없이 나간 호출은 consume()으로 바로 뺀다. → 예상이 틀려도 통은 실제 사용량을 따라간다.
+- 대기열 : 우선순위 단계 (추가 질문 > 화면 분석 > 일괄 작업) 안에서 가중 공정 큐
+  · 가상 종료 시각(finish = start + 토큰 수 / 가중치)이 이른 요청부터 입장 (WFQ)
+  · 가상 시간은 마지막으로 입장한 요청의 start (SFQ처럼 전체 흐름을 따로 시뮬레이션하지 않음)
+  · 흐름 = 학습자, 가중치 = 1 / (같은 반에서 지금 기다리는 학습자 수)
+    → 반끼리 먼저 나누고, 반 안에서 학습자끼리 나눔 (연타한 학습자는 자기 몫만 씀)
+- 한 학습자가 기다리는 요청이 너무 많거나 (학습자를 모르는 익명 흐름 "-"은 여러 사람이 섞여 있으므로 제외), 너무 오래 기다리면 SchedulerBusy (잠시 후 다시 시도)
+- 대기 시간 / 대기열 길이 / 대기 순서를 지표와 on_wait 콜백으로 알림
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+from metrics import REGISTRY
+from resilience import CircuitOpenError
+
+PRIORITY_INTERACTIVE = 0  # 추가 질문 (학습자가 답을 기다리는 중)
+PRIORITY_ANALYSIS = 1     # 화면의 문장 분석
+PRIORITY_BATCH = 2        # 에세이 문장별 분석, batch_analyze.py
+PRIORITY_NAMES = ("interactive", "analysis", "batch")
+
+# 학습자를 모르는 요청이 함께 쓰는 흐름 (여러 사람이 섞여 있어 학습자별 한도를 적용하지 않음)
+ANONYMOUS = "-"
+
+# 대기 중에 다른 요청이 끝났는지 다시 확인하는 최대 간격(초)
+POLL_SECONDS = 0.5
+
+
+class SchedulerBusy(CircuitOpenError):
+    """대기열이 넘치거나 너무 오래 기다려 요청을 받지 않음 (잠시 후 다시 시도)."""
+
+    def __init__(self, message: str, retry_in: float):
+        super().__init__(retry_in)
+        self.args = (f"{message} {retry_in:.0f}초 후 다시 시도해 주세요.",)
+
+
+def estimate_tokens(messages: list) -> int:
+    """
+    보내기 전에 프롬프트 토큰 수를 어림 (토크나이저 없이).
+    영문/기호는 약 4글자에 1토큰, 한글 등 그 밖의 글자는 1글자에 약 1토큰 + 메시지마다 4토큰.
+    """
+    total = 0
+    for message in messages:
+        text = message.get("content") or ""
+        ascii_chars = sum(1 for ch in text if ch < "\x80")
+        total += 4 + ascii_chars // 4 + (len(text) - ascii_chars)
+    return total
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0):
+        """per_minute: 분당 한도 (0이면 제한 없음) / burst_seconds: 한꺼번에 쓸 수 있는 양 (초 단위 분량)"""
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self, now: float) -> float:
+        self._refill(now)
+        return self.tokens
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """amount를 쓸 수 있을 때까지 남은 시간(초). 통보다 큰 요청은 통이 가득 차면 보냄."""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        need = min(amount, self.capacity) - self.tokens
+        return need / self.rate if need > 0 else 0.0
+
+    def take(self, amount: float, now: float):
+        """amount만큼 뺌 (모자라면 음수 = 빚, 채워질 때까지 다음 입장이 기다림)."""
+        if not self.unlimited:
+            self._refill(now)
+            self.tokens -= amount
+
+    def give(self, amount: float, now: float):
+        if not self.unlimited:
+            self._refill(now)
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class Requester:
+    """요청한 쪽. learner: 학습자 키 / group: 반 / on_wait(position): 기다리는 동안 대기 순서 알림."""
+    __slots__ = ("learner", "group", "priority", "on_wait")
+
+    def __init__(self, learner: str = "", group: str = "", priority: int = None, on_wait=None):
+        self.learner = learner
+        self.group = group
+        self.priority = priority  # None이면 작업별 기본 우선순위
+        self.on_wait = on_wait
+
+
+class Ticket:
+    __slots__ = ("flow", "group", "priority", "requests", "tokens", "used_requests", "used_tokens",
+                 "start", "finish", "seq", "enqueued_at", "state", "event", "future", "loop")
+
+    def __init__(self, flow: str, group: str, priority: int, requests: int, tokens: int, seq: int):
+        self.flow = flow
+        self.group = group
+        self.priority = priority
+        self.requests = requests
+        self.tokens = tokens
+        self.used_requests = 0   # 입장 중 실제로 보낸 요청 수 (record())
+        self.used_tokens = None  # 입장 중 응답 usage로 알게 된 토큰 수 (없으면 None)
+        self.start = self.finish = 0.0
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.state = "queued"  # queued → admitted → released / cancelled
+        self.event = None      # 스레드에서 기다릴 때
+        self.future = None     # 이벤트 루프에서 기다릴 때
+        self.loop = None
+
+
+class FairScheduler:
+    def __init__(self, rpm: float = 0, tpm: float = 0, burst_seconds: float = 10.0,
+                 max_queued_per_learner: int = 3, max_wait: float = 60.0):
+        """
+        rpm / tpm: 분당 요청 수 / 토큰 수 한도 (0이면 제한 없음)
+        max_queued_per_learner: 학습자 한 명이 동시에 기다릴 수 있는 요청 수
+            (일괄 작업 / 익명 흐름은 제외, 0이면 제한 없음)
+        max_wait: 이보다 오래 기다리면 SchedulerBusy
+        """
+        self.max_queued_per_learner = max_queued_per_learner
+        self.max_wait = max_wait
+        self._rpm = TokenBucket(rpm, burst_seconds)
+        self._tpm = TokenBucket(tpm, burst_seconds)
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._queues = [[] for _ in PRIORITY_NAMES]       # 우선순위별 heap of (finish, seq, Ticket)
+        self._vtime = [0.0 for _ in PRIORITY_NAMES]       # 우선순위별 가상 시간 (마지막 입장의 start)
+        self._last_finish = {}                            # (우선순위, 흐름) -> 마지막 finish
+        self._queued = {}                                 # 흐름 -> 기다리는 요청 수
+        self._group_flows = {}                            # 반 -> {기다리는 흐름}
+        self._counters = {"admitted": 0, "rejected": 0, "timeouts": 0, "cancelled": 0, "waited": 0}
+
+    # ---------------------------
+    # 입장 / 반납
+    # ---------------------------
+    def acquire(self, requester: Requester, priority: int, tokens: int, requests: int = 1) -> Ticket:
+        """입장할 때까지 기다림 (스레드용). 끝나면 반드시 release()."""
+        ticket = self._enqueue(requester, priority, tokens, requests, threading.Event())
+        try:
+            while True:
+                with self._lock:
+                    if ticket.state == "admitted":
+                        return ticket
+                    retry = self._dispatch(time.monotonic())
+                    if ticket.state == "admitted":
+                        return ticket
+                    position = self._position(ticket)
+                timeout = self._check_deadline(ticket, retry)
+                if requester.on_wait is not None:
+                    requester.on_wait(position)
+                ticket.event.wait(timeout)
+        except BaseException:
+            self._abandon(ticket)
+            raise
+
+    async def aacquire(self, requester: Requester, priority: int, tokens: int,
+                       requests: int = 1) -> Ticket:
+        """acquire()의 asyncio 버전 (이벤트 루프를 막지 않고 기다림)."""
+        loop = asyncio.get_running_loop()
+        ticket = self._enqueue(requester, priority, tokens, requests, loop.create_future(), loop)
+        try:
+            while True:
+                with self._lock:
+                    if ticket.state == "admitted":
+                        return ticket
+                    retry = self._dispatch(time.monotonic())
+                    if ticket.state == "admitted":
+                        return ticket
+                    position = self._position(ticket)
+                timeout = self._check_deadline(ticket, retry)
+                if requester.on_wait is not None:
+                    requester.on_wait(position)
+                await asyncio.wait({ticket.future}, timeout=timeout)
+        except BaseException:
+            self._abandon(ticket)
+            raise
+
+    def release(self, ticket: Ticket):
+        """
+        입장을 끝내고 잡아 둔 예상치를 실제 사용량으로 정산: (실제 − 예상)만큼 더 빼거나 돌려줌.
+        - 요청 수: 실제로 보낸 요청 수 (하나도 안 보냈으면 모두 돌려줌)
+        - 토큰 수: 응답 usage의 합. 요청은 보냈는데 usage를 하나도 못 받았으면 (실패 / 끊긴 스트림)
+          업스트림이 얼마나 셌는지 모르므로 예상치를 돌려주지 않음
+        """
+        with self._lock:
+            if ticket.state != "admitted":
+                return
+            ticket.state = "released"
+            now = time.monotonic()
+            if ticket.used_tokens is not None:
+                used_tokens = ticket.used_tokens
+            else:
+                used_tokens = ticket.tokens if ticket.used_requests else 0
+            _settle(self._rpm, ticket.used_requests - ticket.requests, now)
+            _settle(self._tpm, used_tokens - ticket.tokens, now)
+            self._dispatch(now)
+
+    def record(self, ticket: Ticket, requests: int = 1, tokens: int = None):
+        """
+        입장 중 실제 사용량: 요청을 하나 보낼 때마다 record(ticket), 응답 usage는 record(ticket, 0, tokens).
+        반납할 때 정산되고, 이미 반납했으면 바로 뺀다.
+        """
+        with self._lock:
+            if ticket.state == "admitted":
+                ticket.used_requests += requests
+                if tokens is not None:
+                    ticket.used_tokens = (ticket.used_tokens or 0) + tokens
+                return
+        self.consume(requests, tokens or 0)
+
+    def consume(self, requests: int = 1, tokens: int = 0):
+        """입장 없이 나간 호출의 실제 요청/토큰 (응답의 usage)."""
+        with self._lock:
+            now = time.monotonic()
+            self._rpm.take(requests, now)
+            self._tpm.take(tokens, now)
+
+    # ---------------------------
+    # 내부 (lock을 잡은 상태에서 호출)
+    # ---------------------------
+    def _enqueue(self, requester: Requester, priority: int, tokens: int, requests: int,
+                 waiter, loop=None) -> Ticket:
+        flow = requester.learner or ANONYMOUS
+        group = requester.group or flow
+        with self._lock:
+            queued = self._queued.get(flow, 0)
+            if (priority != PRIORITY_BATCH and flow != ANONYMOUS and self.max_queued_per_learner
+                    and queued >= self.max_queued_per_learner):
+                self._counters["rejected"] += 1
+                REGISTRY.inc("scheduler_requests_total", priority=PRIORITY_NAMES[priority],
+                             outcome="rejected")
+                raise SchedulerBusy("이미 처리 중인 요청이 많습니다.", 5.0)
+
+            ticket = Ticket(flow, group, priority, requests, tokens, next(self._seq))
+            if loop is None:
+                ticket.event = waiter
+            else:
+                ticket.future, ticket.loop = waiter, loop
+            flows = self._group_flows.setdefault(group, set())
+            flows.add(flow)
+            weight = 1.0 / len(flows)
+            ticket.start = max(self._vtime[priority], self._last_finish.get((priority, flow), 0.0))
+            ticket.finish = ticket.start + max(1, tokens) / weight
+            self._last_finish[(priority, flow)] = ticket.finish
+            self._queued[flow] = queued + 1
+            heapq.heappush(self._queues[priority], (ticket.finish, ticket.seq, ticket))
+            self._dispatch(time.monotonic())
+            if ticket.state == "queued":
+                self._counters["waited"] += 1
+            return ticket
+
+    def _head(self):
+        for queue in self._queues:
+            while queue and queue[0][2].state != "queued":
+                heapq.heappop(queue)  # 취소된 요청 (지연 삭제)
+            if queue:
+                return queue[0][2]
+        return None
+
+    def _dispatch(self, now: float) -> float:
+        """보낼 수 있는 만큼 입장시키고, 다음 입장이 가능해질 때까지의 시간을 돌려줌 (없으면 None)."""
+        while True:
+            ticket = self._head()
+            if ticket is None:
+                return None
+            wait = max(self._rpm.wait_time(ticket.requests, now),
+                       self._tpm.wait_time(ticket.tokens, now))
+            if wait > 0:
+                return wait
+            heapq.heappop(self._queues[ticket.priority])
+            self._rpm.take(ticket.requests, now)
+            self._tpm.take(ticket.tokens, now)
+            self._vtime[ticket.priority] = ticket.start
+            self._dequeue(ticket, "admitted")
+            self._counters["admitted"] += 1
+            waited = now - ticket.enqueued_at
+            name = PRIORITY_NAMES[ticket.priority]
+            REGISTRY.inc("scheduler_requests_total", priority=name, outcome="admitted")
+            REGISTRY.observe("scheduler_wait_seconds", waited, priority=name)
+            if ticket.event is not None:
+                ticket.event.set()
+            elif ticket.future is not None:
+                ticket.loop.call_soon_threadsafe(_resolve, ticket.future)
+
+    def _dequeue(self, ticket: Ticket, state: str):
+        ticket.state = state
+        remaining = self._queued.get(ticket.flow, 1) - 1
+        if remaining > 0:
+            self._queued[ticket.flow] = remaining
+            return
+        self._queued.pop(ticket.flow, None)
+        flows = self._group_flows.get(ticket.group)
+        if flows is not None:
+            flows.discard(ticket.flow)
+            if not flows:
+                del self._group_flows[ticket.group]
+        # 기다리는 요청이 없는 흐름은 가상 시간을 따라잡으면 잊음 (기록이 계속 늘지 않도록)
+        if len(self._last_finish) > 4096:
+            self._last_finish = {
+                key: finish for key, finish in self._last_finish.items()
+                if finish > self._vtime[key[0]] or key[1] in self._queued
+            }
+
+    def _position(self, ticket: Ticket) -> int:
+        """앞에서 기다리는 요청 수 + 1."""
+        ahead = sum(1 for queue in self._queues[:ticket.priority]
+                    for _, _, t in queue if t.state == "queued")
+        ahead += sum(1 for finish, seq, t in self._queues[ticket.priority]
+                     if t.state == "queued" and (finish, seq) < (ticket.finish, ticket.seq))
+        return ahead + 1
+
+    def _check_deadline(self, ticket: Ticket, retry) -> float:
+        """다음에 기다릴 시간. max_wait를 넘겼으면 SchedulerBusy."""
+        remaining = ticket.enqueued_at + self.max_wait - time.monotonic()
+        if remaining <= 0:
+            with self._lock:
+                self._counters["timeouts"] += 1
+            REGISTRY.inc("scheduler_requests_total", priority=PRIORITY_NAMES[ticket.priority],
+                         outcome="timeout")
+            raise SchedulerBusy("요청이 많아 차례가 오지 않았습니다.", min(30.0, retry or 5.0))
+        return min(POLL_SECONDS, remaining, retry if retry is not None else POLL_SECONDS)
+
+    def _abandon(self, ticket: Ticket):
+        """기다리다 중단됨 (시간 초과 / rerun / 연결 끊김). 그 사이 입장했으면 바로 반납."""
+        with self._lock:
+            if ticket.state == "queued":
+                self._dequeue(ticket, "cancelled")
+                self._counters["cancelled"] += 1
+                self._dispatch(time.monotonic())
+                return
+        self.release(ticket)
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            stats = dict(self._counters)
+            stats["queued"] = {
+                name: sum(1 for _, _, t in queue if t.state == "queued")
+                for name, queue in zip(PRIORITY_NAMES, self._queues)
+            }
+            stats["waiting_learners"] = len(self._queued)
+            stats["rpm_available"] = None if self._rpm.unlimited else self._rpm.available(now)
+            stats["tpm_available"] = None if self._tpm.unlimited else self._tpm.available(now)
+        return stats
+
+
+def _settle(bucket: TokenBucket, extra: float, now: float):
+    """예상보다 더 쓴 만큼(extra > 0) 빼고, 덜 쓴 만큼 돌려줌."""
+    if extra > 0:
+        bucket.take(extra, now)
+    elif extra < 0:
+        bucket.give(-extra, now)
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+REGISTRY.describe("scheduler_wait_seconds", "Time a request waited for admission, by priority")
+REGISTRY.describe("scheduler_requests_total",
+                  "Admission decisions by priority (admitted / rejected: too many queued / timeout)")
@@ -0,0 +1,138 @@
+"""
+GrammarCoachOutput 스키마용 가벼운 JSON Schema 검사기
+
+jsonschema 패키지 없이, 이 앱의 스키마에서 쓰는 키워드만 지원한다.
+(type / enum / properties / required / additionalProperties / items / minItems / maxItems)
+
+- validate(instance, schema): 스키마 dict를 매번 해석 (가끔 쓰는 부분 스키마용)
+- compile_schema(schema): 스키마를 한 번 분석해 검사 함수로 만들어 둠 (매 응답마다 쓰는 경로용)
+  통과 여부만 먼저 빠르게 보고, 실패했을 때만 validate()와 같은 메시지를 만든다.
+"""
+
+_TYPE_CHECKS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+}
+
+
+def validate(instance, schema: dict, path: str = "$") -> list:
+    """스키마 위반 내용을 문자열 목록으로 반환 (비어 있으면 통과)."""
+    errors = []
+    expected = schema.get("type")
+    if expected and not _TYPE_CHECKS[expected](instance):
+        errors.append(f"{path}: {expected} 타입이어야 합니다.")
+        return errors
+
+    if "enum" in schema and instance not in schema["enum"]:
+        errors.append(f"{path}: {schema['enum']} 중 하나여야 합니다. (받은 값: {instance!r})")
+
+    if expected == "object":
+        props = schema.get("properties", {})
+        for key in schema.get("required", []):
+            if key not in instance:
+                errors.append(f"{path}.{key}: 필수 필드가 없습니다.")
+        if schema.get("additionalProperties") is False:
+            for key in instance:
+                if key not in props:
+                    errors.append(f"{path}.{key}: 허용되지 않은 필드입니다.")
+        for key, sub in props.items():
+            if key in instance:
+                errors.extend(validate(instance[key], sub, f"{path}.{key}"))
+
+    elif expected == "array":
+        if len(instance) < schema.get("minItems", 0):
+            errors.append(f"{path}: 최소 {schema['minItems']}개 항목이 필요합니다.")
+        if "maxItems" in schema and len(instance) > schema["maxItems"]:
+            errors.append(f"{path}: 최대 {schema['maxItems']}개 항목까지 가능합니다.")
+        item_schema = schema.get("items")
+        if item_schema:
+            for idx, item in enumerate(instance):
+                errors.extend(validate(item, item_schema, f"{path}[{idx}]"))
+
+    return errors
+
+
+def _compile_is_valid(schema: dict):
+    """오류 메시지 없이 통과 여부만 보는 검사 함수 (경로 문자열을 만들지 않아 빠름)."""
+    expected = schema.get("type")
+    type_check = _TYPE_CHECKS[expected] if expected else (lambda v: True)
+    enum = schema.get("enum")
+
+    if expected == "object":
+        props = tuple(
+            (key, _compile_is_valid(sub)) for key, sub in schema.get("properties", {}).items()
+        )
+        required = tuple(schema.get("required", ()))
+        allowed = frozenset(key for key, _ in props)
+        closed = schema.get("additionalProperties") is False
+
+        def is_valid(value):
+            if not isinstance(value, dict):
+                return False
+            for key in required:
+                if key not in value:
+                    return False
+            if closed and not allowed.issuperset(value):
+                return False
+            for key, sub_ok in props:
+                if key in value and not sub_ok(value[key]):
+                    return False
+            return True
+
+        return is_valid
+
+    if expected == "array":
+        min_items = schema.get("minItems", 0)
+        max_items = schema.get("maxItems")
+        item_ok = _compile_is_valid(schema["items"]) if schema.get("items") else None
+
+        def is_valid(value):
+            if not isinstance(value, list) or len(value) < min_items:
+                return False
+            if max_items is not None and len(value) > max_items:
+                return False
+            return item_ok is None or all(map(item_ok, value))
+
+        return is_valid
+
+    if enum is not None:
+        return lambda value: type_check(value) and value in enum
+    return type_check
+
+
+def compile_schema(schema: dict):
+    """
+    스키마를 미리 분석해 check(instance, path="$") -> 오류 목록 함수를 만든다.
+    통과하는 경우(대부분)는 bool 검사만 하고, 실패했을 때만 validate()로 메시지를 만든다.
+    """
+    is_valid = _compile_is_valid(schema)
+
+    def check(instance, path: str = "$") -> list:
+        if is_valid(instance):
+            return []
+        return validate(instance, schema, path)
+
+    check.is_valid = is_valid
+    return check
+
+
+def slice_object_schema(object_schema: dict, keys: list, overrides: dict = None) -> dict:
+    """
+    object 스키마에서 일부 필드(keys)만 남긴 하위 스키마를 만든다.
+    overrides: {필드명: {키워드: 값}} 형태로 minItems 등을 덮어쓸 때 사용.
+    """
+    props = {}
+    for key in keys:
+        sub = dict(object_schema["properties"][key])
+        sub.update((overrides or {}).get(key, {}))
+        props[key] = sub
+    return {
+        "type": "object",
+        "additionalProperties": False,
+        "properties": props,
+        "required": list(keys),
+    }
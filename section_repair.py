@@ -0,0 +1,184 @@
+"""
+분석 결과 구간(section)별 검사 + 부분 복구
+
+모델 응답이 조금만 틀려도(퀴즈 하나에 보기가 없음, id 중복, 응답이 중간에 끊김 ...)
+전체를 다시 생성하면 시간/토큰이 한 번 더 든다. 여기서는 결과를 구간으로 나눠 본다.
+  - explain: corrected_sentence + level + explanations
+  - quizzes: 퀴즈 원소 하나하나
+로컬에서 고칠 수 있는 것은 바로 고치고
+  (모르는 필드 제거, 잘못된 설명/퀴즈 원소 버리기, 중복 질문 제거, step/id 다시 매기기)
+모델에게 다시 받아야 하는 구간만 RepairPlan에 남긴다. 실제 재요청은 coach_core가 한다.
+"""
+import json
+
+from model_router import QUIZ_MAX
+from schema_validate import compile_schema
+from stream_json import StreamingObjectParser
+
+EXPLAIN_KEYS = ("corrected_sentence", "level", "explanations")
+
+
+class SectionValidators:
+    """전체 스키마와 구간별 스키마를 미리 컴파일해 둔 묶음 (모듈 로드 시 한 번 생성)."""
+
+    def __init__(self, output_schema: dict):
+        props = output_schema["properties"]
+        self.full = compile_schema(output_schema)
+        self.fields = {key: compile_schema(props[key]) for key in EXPLAIN_KEYS}
+        self.explanation = compile_schema(props["explanations"]["items"])
+        self.quiz = compile_schema(props["quizzes"]["items"])
+        self.quiz_min = props["quizzes"].get("minItems", 0)
+
+
+def salvage_json(content: str):
+    """
+    (파싱 결과, 완전한 JSON이었는지)
+    중간에 끊긴 응답이면 그때까지 완성된 최상위 필드와 배열 원소만 모아서 돌려준다.
+    """
+    try:
+        return json.loads(content), True
+    except (TypeError, ValueError):
+        pass
+    parser = StreamingObjectParser()
+    partial = {}
+    try:
+        for event in parser.feed(content or ""):
+            if event[0] == "item":
+                partial.setdefault(event[1], []).append(event[3])
+    except ValueError:
+        pass
+    partial.update(parser.result)
+    return partial, False
+
+
+def quiz_problems(quiz, validators: SectionValidators) -> list:
+    """퀴즈 원소 하나의 문제 목록 (스키마 + 화면에서 풀 수 있는지)."""
+    errors = validators.quiz(quiz, "quiz")
+    if errors:
+        return errors
+    if not quiz["question"].strip():
+        return ["quiz.question: 질문이 비어 있습니다."]
+    if quiz["type"] == "mcq":
+        if len(quiz["options"]) < 2:
+            return ["quiz.options: 객관식 보기가 2개 미만입니다."]
+        if quiz["answer"] not in quiz["options"]:
+            return ["quiz.answer: 정답이 보기에 없습니다."]
+    elif not quiz["answer"].strip():
+        return ["quiz.answer: 빈칸 정답이 비어 있습니다."]
+    return []
+
+
+class RepairPlan:
+    """
+    결과 하나를 구간별로 나눠 살릴 수 있는 부분과 다시 받아야 하는 부분을 정리.
+      explain        : 살린 교정/설명 구간 (None이면 다시 요청해야 함)
+      quizzes        : 살린 퀴즈 목록 (중복 제거, 최대 QUIZ_MAX개)
+      quiz_shortfall : 스키마 최소 개수까지 모자라는 퀴즈 수
+      fixes          : 로컬에서 고친 내용
+      problems       : 다시 요청해야 하는 이유
+    """
+
+    def __init__(self, result, validators: SectionValidators):
+        self.validators = validators
+        self.fixes = []
+        self.problems = []
+        if not isinstance(result, dict):
+            self.problems.append("result: object가 아닙니다.")
+            result = {}
+
+        unknown = [key for key in result if key not in EXPLAIN_KEYS and key != "quizzes"]
+        if unknown:
+            self.fixes.append(f"unknown_fields: {unknown}")
+
+        self.explain = self._plan_explain(result)
+        self.quizzes = []
+        self._seen_questions = set()
+        raw_quizzes = result.get("quizzes")
+        if not isinstance(raw_quizzes, list):
+            self.problems.append("quizzes: 목록이 없습니다.")
+            raw_quizzes = []
+        self.add_quizzes(raw_quizzes)
+
+    @property
+    def quiz_shortfall(self) -> int:
+        return max(0, self.validators.quiz_min - len(self.quizzes))
+
+    @property
+    def needs_model(self) -> bool:
+        return self.explain is None or self.quiz_shortfall > 0
+
+    @property
+    def salvageable(self) -> bool:
+        """다시 받을 구간보다 살린 구간이 있어야 부분 복구가 의미 있음."""
+        return self.explain is not None or bool(self.quizzes)
+
+    def _plan_explain(self, result: dict):
+        for key in ("corrected_sentence", "level"):
+            if key not in result:
+                self.problems.append(f"$.{key}: 필수 필드가 없습니다.")
+                return None
+            errors = self.validators.fields[key](result[key], f"$.{key}")
+            if errors:
+                self.problems.extend(errors[:1])
+                return None
+        if not result["corrected_sentence"].strip():
+            self.problems.append("$.corrected_sentence: 교정문이 비어 있습니다.")
+            return None
+
+        raw = result.get("explanations")
+        if not isinstance(raw, list):
+            self.problems.append("$.explanations: 목록이 없습니다.")
+            return None
+        explanations = []
+        for idx, exp in enumerate(raw):
+            errors = self.validators.explanation(exp, f"$.explanations[{idx}]")
+            if errors:
+                self.fixes.append(f"explanations[{idx}] 버림: {errors[0]}")
+            else:
+                explanations.append(dict(exp))
+        if not explanations:
+            self.problems.append("$.explanations: 올바른 설명이 없습니다.")
+            return None
+        for step, exp in enumerate(explanations, start=1):
+            exp["step"] = step
+        return {
+            "corrected_sentence": result["corrected_sentence"],
+            "level": result["level"],
+            "explanations": explanations,
+        }
+
+    def add_quizzes(self, quizzes: list) -> int:
+        """올바르고 겹치지 않는 퀴즈만 추가 (QUIZ_MAX까지). 추가한 개수를 반환."""
+        added = 0
+        for idx, quiz in enumerate(quizzes):
+            if len(self.quizzes) >= QUIZ_MAX:
+                self.fixes.append(f"quizzes: {QUIZ_MAX}개 초과분 버림")
+                break
+            problems = quiz_problems(quiz, self.validators)
+            if problems:
+                self.fixes.append(f"quizzes[{idx}] 버림: {problems[0]}")
+                continue
+            # 같은 지시문("Choose the correct form.")에 보기만 다른 문제는 중복이 아님
+            key = (" ".join(quiz["question"].lower().split()), tuple(quiz["options"]), quiz["answer"])
+            if key in self._seen_questions:
+                self.fixes.append(f"quizzes[{idx}] 버림: 중복 질문")
+                continue
+            self._seen_questions.add(key)
+            self.quizzes.append(dict(quiz))
+            added += 1
+        return added
+
+    def merge(self, explain: dict = None) -> dict:
+        """살린 구간 + 새로 받은 explain 구간으로 최종 결과 (퀴즈 id는 q1, q2, ... 로 다시 매김)."""
+        explain = explain if explain is not None else self.explain
+        if explain is None:
+            raise ValueError(f"교정/설명 구간을 복구하지 못했습니다: {self.problems[:3]}")
+        quizzes = self.quizzes
+        for idx, quiz in enumerate(quizzes, start=1):
+            quiz["id"] = f"q{idx}"
+        return {
+            "corrected_sentence": explain["corrected_sentence"],
+            "level": explain["level"],
+            "explanations": explain["explanations"],
+            "quizzes": quizzes,
+        }
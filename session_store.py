@@ -0,0 +1,286 @@
+"""
+세션 상태를 작게 + 디스크로 내보내기
+
+Streamlit 세션마다 분석 결과 dict 전체, 채점 내역, 추가 질문 기록을 st.session_state에
+들고 있으면, 버려진 세션이 쌓일수록 서버 메모리가 선형으로 늘어난다.
+
+- ResultStore : 분석 결과를 내용 해시(result_id)로 한 번만 보관 (세션끼리 같은 객체를 공유)
+                메모리에는 최근 것만 (LRU), 전부 SQLite에 기록해 두고 필요하면 다시 읽음
+- SessionRecord : 세션 하나의 상태를 __slots__ 레코드로
+                  (result_id + 채점 결과는 (문항 번호, 내 답, 정답 여부)만, 질문/해설 문자열은 결과에서 다시 만듦)
+- SessionStore : 세션 레코드를 바뀔 때마다 SQLite에 기록(write-through)하고,
+                 메모리에는 최근에 쓴 세션만 둔다 (개수 상한 LRU + 유휴 시간 초과 시 내보냄)
+                 → 서버를 재시작해도 같은 세션 id로 다시 들어오면 복원
+                 (세션 id만으로는 복원하지 않도록 처음 기록한 학습자 키(owner)를 함께 저장)
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    if db_path:
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+    db = sqlite3.connect(db_path or ":memory:", check_same_thread=False)
+    if db_path:
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+def result_id_of(result: dict) -> str:
+    """결과 내용으로 만든 id (같은 결과는 어느 세션에서 만들어도 같은 id)."""
+    raw = json.dumps(result, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:20]
+
+
+class ResultStore:
+    """분석 결과 공유 저장소. 돌려받은 dict는 여러 세션이 함께 보므로 고치면 안 된다."""
+
+    def __init__(self, db_path: str = "", max_hot: int = 2000):
+        self.max_hot = max_hot
+        self._lock = threading.Lock()
+        self._hot = OrderedDict()  # result_id -> result (LRU)
+        self._counters = {"puts": 0, "shared": 0, "disk_loads": 0}
+        self._db = _connect(db_path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "result_id TEXT PRIMARY KEY, payload TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def put(self, result: dict) -> str:
+        result_id = result_id_of(result)
+        with self._lock:
+            self._counters["puts"] += 1
+            if result_id in self._hot:
+                self._counters["shared"] += 1
+                self._hot.move_to_end(result_id)
+                return result_id
+            self._remember(result_id, result)
+            self._db.execute(
+                "INSERT OR IGNORE INTO results (result_id, payload, created_at) VALUES (?, ?, ?)",
+                (result_id, json.dumps(result, ensure_ascii=False), time.time()),
+            )
+            self._db.commit()
+        return result_id
+
+    def get(self, result_id: str):
+        if not result_id:
+            return None
+        with self._lock:
+            result = self._hot.get(result_id)
+            if result is not None:
+                self._hot.move_to_end(result_id)
+                return result
+            row = self._db.execute(
+                "SELECT payload FROM results WHERE result_id = ?", (result_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._counters["disk_loads"] += 1
+            result = json.loads(row[0])
+            self._remember(result_id, result)
+            return result
+
+    def _remember(self, result_id: str, result: dict):
+        """lock을 잡은 상태에서 호출."""
+        self._hot[result_id] = result
+        while len(self._hot) > self.max_hot:
+            self._hot.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["hot"] = len(self._hot)
+        return stats
+
+
+class GradedAnswer:
+    __slots__ = ("quiz_index", "user_answer", "is_correct")
+
+    def __init__(self, quiz_index: int, user_answer: str, is_correct: bool):
+        self.quiz_index = quiz_index
+        self.user_answer = user_answer
+        self.is_correct = is_correct
+
+
+class QAItem:
+    __slots__ = ("question", "answer", "ts")
+
+    def __init__(self, question: str, answer: str, ts: int):
+        self.question = question
+        self.answer = answer
+        self.ts = ts
+
+    def to_dict(self) -> dict:
+        return {"question": self.question, "answer": self.answer, "ts": self.ts}
+
+
+class SessionRecord:
+    """세션 하나의 (화면 위젯을 뺀) 상태."""
+    __slots__ = ("session_id", "owner", "result_id", "result_source", "sentence", "graded", "qa",
+                 "updated_at")
+
+    def __init__(self, session_id: str, owner: str = "", result_id: str = "", result_source: str = "",
+                 sentence: str = "", graded: tuple = (), qa: tuple = (), updated_at: float = 0.0):
+        self.session_id = session_id
+        self.owner = owner    # 처음 기록한 학습자 키 (비어 있으면 아직 아무도 안 씀)
+        self.result_id = result_id
+        self.result_source = result_source
+        self.sentence = sentence
+        self.graded = graded  # GradedAnswer 튜플 (채점 전이면 빈 튜플)
+        self.qa = qa          # QAItem 튜플
+        self.updated_at = updated_at
+
+    def visible_to(self, learner_key: str) -> bool:
+        """이 학습자에게 보여 줘도 되는지: 그 학습자의 세션이거나, 아직 아무 기록도 없는 세션."""
+        if self.owner:
+            return bool(learner_key) and self.owner == learner_key
+        return not (self.result_id or self.graded or self.qa)
+
+    @property
+    def score(self):
+        return sum(1 for g in self.graded if g.is_correct) if self.graded else None
+
+    def details(self, result: dict) -> list:
+        """채점 내역을 화면/리포트용 dict 목록으로 (질문/정답/해설은 결과의 퀴즈에서)."""
+        quizzes = (result or {}).get("quizzes") or []
+        details = []
+        for g in self.graded:
+            q = quizzes[g.quiz_index] if g.quiz_index < len(quizzes) else {}
+            details.append({
+                "no": g.quiz_index + 1,
+                "id": q.get("id", ""),
+                "question": q.get("question", ""),
+                "user_answer": g.user_answer,
+                "correct_answer": (q.get("answer") or "").strip(),
+                "is_correct": g.is_correct,
+                "rationale": q.get("rationale", ""),
+            })
+        return details
+
+    def qa_history(self) -> list:
+        return [item.to_dict() for item in self.qa]
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "owner": self.owner,
+            "result_id": self.result_id,
+            "result_source": self.result_source,
+            "sentence": self.sentence,
+            "graded": [[g.quiz_index, g.user_answer, g.is_correct] for g in self.graded],
+            "qa": [[item.question, item.answer, item.ts] for item in self.qa],
+        }, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, session_id: str, raw: str, updated_at: float) -> "SessionRecord":
+        data = json.loads(raw)
+        return cls(
+            session_id,
+            owner=data.get("owner", ""),
+            result_id=data.get("result_id", ""),
+            result_source=data.get("result_source", ""),
+            sentence=data.get("sentence", ""),
+            graded=tuple(GradedAnswer(*g) for g in data.get("graded", ())),
+            qa=tuple(QAItem(*item) for item in data.get("qa", ())),
+            updated_at=updated_at,
+        )
+
+
+class SessionStore:
+    def __init__(self, db_path: str = "", max_hot: int = 1000, idle_seconds: float = 900,
+                 ttl_seconds: float = 7 * 24 * 3600):
+        """
+        max_hot: 메모리에 둘 최대 세션 수 (넘으면 가장 오래 안 쓴 세션부터 내보냄)
+        idle_seconds: 이 시간 동안 안 쓴 세션은 메모리에서 내보냄 (디스크에는 남음)
+        ttl_seconds: 디스크에서도 지우는 기간 (시작할 때 정리)
+        """
+        self.max_hot = max_hot
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._hot = OrderedDict()  # session_id -> (last_access, SessionRecord)
+        self._last_sweep = time.time()
+        self._counters = {"created": 0, "restored": 0, "evicted": 0, "writes": 0}
+        self._db = _connect(db_path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, payload TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        if ttl_seconds:
+            self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - ttl_seconds,))
+        self._db.commit()
+
+    def get(self, session_id: str) -> SessionRecord:
+        """메모리 → 디스크 순으로 찾고, 없으면 빈 레코드 (처음 update() 때 저장)."""
+        now = time.time()
+        with self._lock:
+            entry = self._hot.get(session_id)
+            if entry is not None:
+                record = entry[1]
+            else:
+                row = self._db.execute(
+                    "SELECT payload, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                if row is not None:
+                    record = SessionRecord.from_json(session_id, *row)
+                    self._counters["restored"] += 1
+                else:
+                    record = SessionRecord(session_id, updated_at=now)
+                    self._counters["created"] += 1
+            self._touch(session_id, record, now)
+            return record
+
+    def update(self, session_id: str, **fields) -> SessionRecord:
+        """필드를 바꾸고 바로 디스크에 기록."""
+        record = self.get(session_id)
+        now = time.time()
+        with self._lock:
+            for name, value in fields.items():
+                setattr(record, name, value)
+            record.updated_at = now
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, payload, updated_at) VALUES (?, ?, ?)",
+                (session_id, record.to_json(), now),
+            )
+            self._db.commit()
+            self._counters["writes"] += 1
+        return record
+
+    def _touch(self, session_id: str, record: SessionRecord, now: float):
+        """lock을 잡은 상태에서 호출. 최근 사용으로 표시하고, 가끔 유휴/초과 세션을 내보냄."""
+        self._hot[session_id] = (now, record)
+        self._hot.move_to_end(session_id)
+        if len(self._hot) > self.max_hot or now - self._last_sweep >= min(60.0, self.idle_seconds):
+            self._evict(now)
+
+    def _evict(self, now: float):
+        self._last_sweep = now
+        evicted = 0
+        # 앞쪽이 가장 오래 안 쓴 세션 (OrderedDict 순서 = 마지막 사용 순서)
+        while self._hot:
+            session_id, (last_access, _) = next(iter(self._hot.items()))
+            if len(self._hot) <= self.max_hot and now - last_access < self.idle_seconds:
+                break
+            del self._hot[session_id]
+            evicted += 1
+        self._counters["evicted"] += evicted
+
+    def evict_idle(self) -> int:
+        """유휴 세션을 지금 바로 내보냄. 내보낸 개수를 반환."""
+        with self._lock:
+            before = self._counters["evicted"]
+            self._evict(time.time())
+            return self._counters["evicted"] - before
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["hot"] = len(self._hot)
+        return stats
@@ -0,0 +1,169 @@
+"""
+같은 요청 합치기 (single-flight)
+
+선생님이 문장 하나를 띄우고 학생 30명이 몇 초 안에 똑같이 제출하면, 캐시가 채워지기 전이라
+세션마다 같은 (문장, 난이도) 분석을 따로 요청해 같은 비싼 호출이 30번 나가고 rate limit에 걸린다.
+
+- 같은 키로 진행 중인 호출이 있으면 새로 요청하지 않고 그 호출의 결과를 함께 받는다.
+  (처음 호출한 쪽 = leader, 기다리는 쪽 = follower)
+- leader가 실패하면 follower도 같은 예외를 받는다.
+- leader가 중간에 취소되면(Streamlit rerun/중단, generator 닫힘, asyncio 취소) follower는 실패하지 않고
+  그중 하나가 새 leader가 되어 다시 요청한다.
+- SingleFlight는 스레드용(Streamlit 세션들), AsyncSingleFlight는 이벤트 루프 하나용(api_server.py).
+  AsyncSingleFlight는 작업을 별도 task로 돌려서, 처음 요청한 쪽이 끊겨도 기다리는 쪽이 남아 있으면 계속한다.
+- share를 주면 follower는 결과를 share(result)로 받는다 (예: copy.deepcopy → 세션끼리 같은 객체를 고치지 않음).
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from metrics import REGISTRY
+
+
+class LeaderCancelled(Exception):
+    """기다리던 leader 호출이 결과 없이 취소됨 (follower가 다시 시도해야 함)."""
+
+
+class SingleFlight:
+    def __init__(self, name: str, share=None):
+        self.name = name
+        self.share = share
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> Future
+        self._counters = {"leaders": 0, "followers": 0, "retries": 0, "errors": 0}
+
+    def begin(self, key: str):
+        """(Future, leader인지). leader는 끝나면 반드시 end()를 불러야 한다."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is None:
+                future = Future()
+                self._calls[key] = future
+                self._count("leaders", "leader")
+                return future, True
+            self._count("followers", "follower")
+            return future, False
+
+    def end(self, key: str, future: Future, result=None, error: BaseException = None):
+        """leader 호출 결과를 기다리던 follower들에게 전달."""
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+            if error is not None:
+                self._counters["errors"] += 1
+        if error is None:
+            future.set_result(result)
+        elif isinstance(error, Exception):
+            future.set_exception(error)
+        else:
+            # GeneratorExit / KeyboardInterrupt / Streamlit 중단 등: 결과 없이 취소됨
+            future.set_exception(LeaderCancelled())
+
+    def wait(self, future: Future):
+        """follower: leader 결과를 기다림 (leader가 취소됐으면 LeaderCancelled)."""
+        try:
+            result = future.result()
+        except LeaderCancelled:
+            with self._lock:
+                self._count("retries", "retry")
+            raise
+        return self.share(result) if self.share is not None else result
+
+    def do(self, key, fn):
+        """
+        (fn() 결과, 다른 호출의 결과를 받았는지). key가 None이면 합치지 않고 그대로 호출.
+        """
+        if key is None:
+            return fn(), False
+        while True:
+            future, leader = self.begin(key)
+            if not leader:
+                try:
+                    return self.wait(future), True
+                except LeaderCancelled:
+                    continue
+            try:
+                result = fn()
+            except BaseException as e:
+                self.end(key, future, error=e)
+                raise
+            self.end(key, future, result=result)
+            return result, False
+
+    def _count(self, counter: str, role: str):
+        """lock을 잡은 상태에서 호출."""
+        self._counters[counter] += 1
+        REGISTRY.inc("singleflight_total", op=self.name, role=role)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight"] = len(self._calls)
+        return stats
+
+
+class _AsyncFlight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """SingleFlight의 asyncio 버전 (이벤트 루프 하나에서만 사용, lock 불필요)."""
+
+    def __init__(self, name: str, share=None):
+        self.name = name
+        self.share = share
+        self._flights = {}  # key -> _AsyncFlight
+        self._counters = {"leaders": 0, "followers": 0, "cancelled": 0}
+
+    async def do(self, key, coro_fn):
+        """
+        (await coro_fn() 결과, 다른 호출의 결과를 받았는지). key가 None이면 합치지 않음.
+        기다리는 쪽이 모두 취소되면 작업 task도 취소한다.
+        """
+        if key is None:
+            return await coro_fn(), False
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = _AsyncFlight(asyncio.ensure_future(coro_fn()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _task: self._forget(key, flight))
+            self._count("leaders", "leader")
+        else:
+            self._count("followers", "follower")
+
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+            if shared and self.share is not None:
+                result = self.share(result)
+            return result, shared
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # 취소 중인 task에 새 호출이 붙지 않도록 바로 목록에서 뺌
+                self._counters["cancelled"] += 1
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key, flight: _AsyncFlight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _count(self, counter: str, role: str):
+        self._counters[counter] += 1
+        REGISTRY.inc("singleflight_total", op=self.name, role=role)
+
+    def stats(self) -> dict:
+        stats = dict(self._counters)
+        stats["in_flight"] = len(self._flights)
+        return stats
+
+
+REGISTRY.describe("singleflight_total",
+                  "Calls that started an upstream request (leader), joined one in flight (follower) "
+                  "or retried after the leader was cancelled (retry)")
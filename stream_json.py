@@ -0,0 +1,144 @@
+"""
+스트리밍 JSON 점진 파서
+
+stream=True 로 받은 GrammarCoachOutput JSON 조각(chunk)을 순서대로 넣어 주면,
+- 최상위 필드가 완성될 때마다   ("field", key, value)
+- 최상위 배열의 원소가 닫힐 때마다 ("item", key, index, value)
+이벤트를 돌려준다. (예: corrected_sentence가 끝나는 즉시 화면에 표시 가능)
+"""
+import json
+
+
+class StreamingObjectParser:
+    """최상위가 JSON object 인 응답을 한 글자씩 스캔하는 점진 파서."""
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._key = None
+        self._key_start = None
+        self._value_start = None  # 깊이 1 값의 시작 위치
+        self._item_start = None   # 깊이 2 배열 원소의 시작 위치
+        self._item_index = 0
+        self.done = False
+        self.result = {}
+
+    def feed(self, chunk: str) -> list:
+        """새 조각을 넣고, 이번에 완성된 이벤트 목록을 반환."""
+        if not chunk:
+            return []
+        self._text += chunk
+        events = []
+        text = self._text
+        stack = self._stack
+
+        for i in range(self._pos, len(text)):
+            c = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    depth = len(stack)
+                    if depth == 1:
+                        if self._expect_key:
+                            self._key = json.loads(text[self._key_start:i + 1])
+                            self._expect_key = False
+                        elif self._value_start is not None:
+                            self._emit_field(text[self._value_start:i + 1], events)
+                    elif (
+                        depth == 2 and stack[1] == "["
+                        and self._item_start is not None and text[self._item_start] == '"'
+                    ):
+                        self._emit_item(text[self._item_start:i + 1], events)
+                continue
+
+            if c in " \t\r\n:":
+                continue
+
+            depth = len(stack)
+            in_top_array = depth == 2 and stack[1] == "["
+
+            if c == '"':
+                self._in_string = True
+                if depth == 1:
+                    if self._expect_key:
+                        self._key_start = i
+                    elif self._value_start is None:
+                        self._value_start = i
+                elif in_top_array and self._item_start is None:
+                    self._item_start = i
+                continue
+
+            if c in "{[":
+                if depth == 1 and not self._expect_key and self._value_start is None:
+                    self._value_start = i
+                elif in_top_array and self._item_start is None:
+                    self._item_start = i
+                stack.append(c)
+                if len(stack) == 1:
+                    self._expect_key = True
+                elif len(stack) == 2 and c == "[":
+                    self._item_index = 0
+                    self._item_start = None
+                continue
+
+            if c in "}]":
+                # 숫자/true/false/null 처럼 닫는 괄호로 끝나는 스칼라 값
+                if in_top_array and self._is_scalar(self._item_start):
+                    self._emit_item(text[self._item_start:i], events)
+                if depth == 1 and self._is_scalar(self._value_start):
+                    self._emit_field(text[self._value_start:i], events)
+
+                stack.pop()
+                depth = len(stack)
+                if depth == 2 and stack[1] == "[" and self._item_start is not None:
+                    self._emit_item(text[self._item_start:i + 1], events)
+                elif depth == 1 and self._value_start is not None:
+                    self._emit_field(text[self._value_start:i + 1], events)
+                elif depth == 0:
+                    self.done = True
+                continue
+
+            if c == ",":
+                if depth == 1:
+                    if self._is_scalar(self._value_start):
+                        self._emit_field(text[self._value_start:i], events)
+                    self._expect_key = True
+                elif in_top_array and self._is_scalar(self._item_start):
+                    self._emit_item(text[self._item_start:i], events)
+                continue
+
+            # 스칼라 값의 첫 글자
+            if depth == 1 and not self._expect_key and self._value_start is None:
+                self._value_start = i
+            elif in_top_array and self._item_start is None:
+                self._item_start = i
+
+        self._pos = len(text)
+        return events
+
+    # ---------------------------
+    # 내부 헬퍼
+    # ---------------------------
+    def _is_scalar(self, start) -> bool:
+        return start is not None and self._text[start] not in '{["'
+
+    def _emit_field(self, raw: str, events: list):
+        value = json.loads(raw)
+        self.result[self._key] = value
+        events.append(("field", self._key, value))
+        self._value_start = None
+
+    def _emit_item(self, raw: str, events: list):
+        value = json.loads(raw)
+        events.append(("item", self._key, self._item_index, value))
+        self._item_index += 1
+        self._item_start = None